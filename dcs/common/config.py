@@ -15,6 +15,11 @@ presets = {
 
 HOST = '147.135.8.169'  # Hoggit Gaw
 PORT = 42674
+
+# Live object state served by the tacview client to the coord server
+LIVE_HOST = '127.0.0.1'
+LIVE_PORT = 42675
+
 START_UNITS = [CLIENT, "CVN-74", "Stennis"]
 
 EXCLUDED_TYPES = [
@@ -1,4 +1,6 @@
 """Model definitions for database."""
+from typing import List, Optional
+
 from sqlalchemy import schema
 import sqlalchemy as sa
 from sqlalchemy.ext.declarative import declarative_base
@@ -37,7 +39,7 @@ Impact = sa.Table(
 Object = sa.Table(
     "object",
     metadata,
-    sa.Column('id', sa.INTEGER(), primary_key=True, unique=True),
+    sa.Column('id', sa.INTEGER()),
     sa.Column('session_id', sa.Integer(), sa.ForeignKey('session.session_id')),
     sa.Column('name', sa.String()),
     sa.Column('color', sa.String()),
@@ -67,13 +69,15 @@ Object = sa.Table(
 
     sa.Column('parent', sa.INTEGER()),
     sa.Column('parent_dist', sa.Float()),
-    sa.Column('updates', sa.Integer())
+    sa.Column('updates', sa.Integer()),
+    # Tacview ids are only unique within a recording.
+    sa.PrimaryKeyConstraint('session_id', 'id'),
 )
 
 Event = sa.Table(
     "event",
     metadata,
-    sa.Column('id', sa.INTEGER(), sa.ForeignKey('object.id')),
+    sa.Column('id', sa.INTEGER()),
     sa.Column('session_id', sa.INTEGER()),
     sa.Column('last_seen', sa.Float()),
     sa.Column('alive', sa.INTEGER()),
@@ -87,9 +91,83 @@ Event = sa.Table(
     sa.Column('v_coord', sa.Float()),
     sa.Column('heading', sa.Float()),
     sa.Column('velocity_kts', sa.Float()),
-    sa.Column('updates', sa.INTEGER())
+    sa.Column('updates', sa.INTEGER()),
+    sa.ForeignKeyConstraint(['session_id', 'id'],
+                            ['object.session_id', 'object.id']),
+    postgresql_partition_by='LIST (session_id)'
 )
 
+# Indexes are created on the partitioned event table, and so on every
+# partition.  Events are appended in time order, so a BRIN index on
+# last_seen stays tiny.
+EVENT_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS event_last_seen_brin ON event "
+    "USING BRIN (last_seen)",
+    "CREATE INDEX IF NOT EXISTS event_session_id_idx ON event (session_id, id)",
+]
+
+
+def event_partition_name(session_id: int) -> str:
+    return f"event_s{int(session_id)}"
+
+
+def event_partition_sql(session_id: int,
+                        range_secs: Optional[float] = None,
+                        ranges: int = 24) -> List[str]:
+    """Return statements creating the event partition of a session.
+
+    If range_secs is set, the partition is itself partitioned by ranges of
+    last_seen, each range_secs wide, with a default partition for events
+    after the last of them.
+    """
+    name = event_partition_name(session_id)
+    stmt = (f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF event "
+            f"FOR VALUES IN ({int(session_id)})")
+    if not range_secs:
+        return [stmt]
+
+    stmts = [stmt + " PARTITION BY RANGE (last_seen)"]
+    for i in range(ranges):
+        stmts.append(f"CREATE TABLE IF NOT EXISTS {name}_r{i} "
+                     f"PARTITION OF {name} FOR VALUES "
+                     f"FROM ({i * range_secs}) TO ({(i + 1) * range_secs})")
+    stmts.append(f"CREATE TABLE IF NOT EXISTS {name}_default "
+                 f"PARTITION OF {name} DEFAULT")
+    return stmts
+
+
+def detach_event_partition_sql(session_id: int, drop: bool = False,
+                               concurrently: bool = False) -> List[str]:
+    """Return statements detaching, and optionally dropping, a session.
+
+    Detaching only updates the catalog, so old sessions are removed from
+    event without deleting rows.  Use concurrently on Postgres 14 or later
+    to avoid locking event.
+    """
+    name = event_partition_name(session_id)
+    stmts = [f"ALTER TABLE event DETACH PARTITION {name}"
+             + (" CONCURRENTLY" if concurrently else "")]
+    if drop:
+        stmts.append(f"DROP TABLE {name}")
+    return stmts
+
+
+def create_event_partition(session_id: int,
+                           range_secs: Optional[float] = None) -> None:
+    """Create the event partition of a session."""
+    con = engine.connect()
+    for stmt in event_partition_sql(session_id, range_secs):
+        con.execute(stmt)
+    con.close()
+
+
+def detach_event_partition(session_id: int, drop: bool = False) -> None:
+    """Detach, and optionally drop, the event partition of a session."""
+    con = engine.connect()
+    for stmt in detach_event_partition_sql(session_id, drop):
+        con.execute(stmt)
+    con.close()
+
 
 def drop_and_recreate_tables():
     """Initialize the database and execute create table statements."""
@@ -100,6 +178,10 @@ def drop_and_recreate_tables():
 
     metadata.create_all()
 
+    # Events of sessions without a partition are kept, rather than failing.
+    con.execute("CREATE TABLE event_default PARTITION OF event DEFAULT")
+    for stmt in EVENT_INDEXES:
+        con.execute(stmt)
 
     con.execute(
         """
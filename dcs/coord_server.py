@@ -5,7 +5,7 @@ import sqlite3
 
 from flask import Flask, Response
 
-from dcs.coords.processor import construct_enemy_set
+from dcs.coords.processor import LIVE_STATE, construct_enemy_set
 from dcs.coords.wp_ctrl import lookup_coords, update_coord
 
 logFormatter = logging.Formatter(
@@ -48,21 +48,38 @@ class CoordApp(Flask):
 
     def get_targets(self):
         try:
-            conn = self.connect_to_db()
-        except sqlite3.Error:
-            return "Could Not Connect To Database!"
+            found = LIVE_STATE.status(self.targets)
+        except OSError:
+            try:
+                found = self.read_targets()
+            except sqlite3.Error:
+                return "Could Not Connect To Database!"
 
         resp = ""
         for tar in self.targets:
-            req = conn.execute("""SELECT alive, name
-                               FROM object WHERE id = ?""", [tar])
-            val = req.fetchone()
-            status = "alive" if val[0] == 1 else "dead"
-            resp += f"{tar}-{val[1]}: {status}\r\n"
+            if tar not in found:
+                continue
+            alive, name = found[tar]
+            status = "alive" if alive == 1 else "dead"
+            resp += f"{tar}-{name}: {status}\r\n"
         if resp == "":
             return "No Targets Designated!"
         return resp
 
+    def read_targets(self):
+        """Return (alive, name) of each target found in the database."""
+        conn = self.connect_to_db()
+        found = {}
+        for tar in self.targets:
+            req = conn.execute("""SELECT alive, name
+                               FROM object WHERE id = ?
+                               ORDER BY session_id DESC LIMIT 1""", [tar])
+            val = req.fetchone()
+            if val:
+                found[tar] = val
+        conn.close()
+        return found
+
     def connect_to_db(self):
         return sqlite3.connect("data/dcs.db")
 
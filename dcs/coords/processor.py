@@ -7,6 +7,7 @@ from geopy.distance import geodesic
 
 from dcs.common import get_logger
 from dcs.common import config
+from dcs.tacview.live import LiveStateClient
 
 DEBUG = False
 
@@ -15,6 +16,8 @@ LOG.setLevel(logging.DEBUG if DEBUG else logging.INFO)
 
 LAST_RUN_CACHE = 'data/last_extract.json'
 
+LIVE_STATE = LiveStateClient()
+
 
 def dms2dd(degrees, minutes, seconds, direction):
     """Convert dms coord to dd."""
@@ -244,7 +247,45 @@ def construct_enemy_set(start_unit=None, result_as_string=True,
     return results.encode('UTF-8')
 
 
+def select_coords(objects, start_units=config.START_UNITS,
+                  coalition='Enemies'):
+    """Select Enemy Dictionaries, and the start coord, from alive objects."""
+    enemies = [obj for obj in objects
+               if obj['coalition'] != coalition and obj['lat'] is not None]
+    if start_units is None:
+        start_units = config.START_UNITS
+    if isinstance(start_units, str):
+        start_units = [start_units]
+    start = None
+    for unit in start_units:
+        LOG.info('Searching for start unit %s...', unit)
+        for obj in objects:
+            if obj['coalition'] == coalition and obj['pilot'] == unit:
+                start = {key: obj[key] for key in
+                         ['lat', 'lon', 'alt', 'name', 'pilot', 'last_seen']}
+                break
+        if start:
+            break
+    if not start:
+        raise ValueError("No record found for start_unit %s..." % start_units)
+    LOG.info('Start coord found: %s...', start)
+    return enemies, start
+
+
 def read_coords(start_units=config.START_UNITS, coalition='Enemies'):
+    """Collect a list of Enemy Dictionaries from the live state of the
+    tacview client, or the database if it is not serving live state.
+    """
+    try:
+        objects = LIVE_STATE.objects()
+    except OSError as err:
+        LOG.info('Live state unavailable: %r...querying database...', err)
+        return read_db_coords(start_units, coalition)
+    LOG.info('Live state version %s read...', LIVE_STATE.version)
+    return select_coords(objects, start_units, coalition)
+
+
+def read_db_coords(start_units=config.START_UNITS, coalition='Enemies'):
     """Collect a list of Enemy Dictionaries from the database."""
     conn = sqlite3.connect(config.DB_LOC,
                            detect_types=sqlite3.PARSE_DECLTYPES)
@@ -0,0 +1,300 @@
+"""
+Compressed archive of the raw Tacview stream, with a frame offset index.
+
+The archive is a series of independently compressed gzip members, or zstd
+frames, so the whole file is still readable by gunzip, zstd or `ingest`.
+Each stream starts a segment, whose header lines, up to the first time
+marker, are a chunk of their own.  Frames follow in chunks that start at a
+time marker and hold at least chunk_secs of stream time, or chunk_bytes of
+raw data.
+
+A sidecar index, at path + '.idx', has a tab separated line per chunk, of
+segment, time offset of its first frame ('header' for header chunks), byte
+offset, compressed length and raw length.  Index lines are only written
+once their chunk is, so an archive reopened after a crash is truncated to
+its last indexed chunk and appended to.  A file without an index is never
+truncated, but moved aside.  Any time offset can then be found in the index,
+and read by decompressing a single chunk.
+"""
+import asyncio
+from asyncio.log import logging
+import bisect
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import gzip
+import os
+import time
+from typing import Deque, Iterator, List, Optional, Tuple
+
+LOG = logging.getLogger('tacview-archive')
+
+INDEX_SUFFIX = '.idx'
+HEADER = 'header'
+
+# segment, time offset (None for headers), offset, length, raw length
+Entry = Tuple[int, Optional[float], int, int, int]
+
+
+def codec_of(path: str) -> str:
+    return 'zstd' if path.endswith('.zst') else 'gzip'
+
+
+def compressor(codec: str, level: Optional[int] = None):
+    """Return a function compressing bytes into one member of codec."""
+    if codec == 'zstd':
+        import zstandard  # pylint: disable=import-outside-toplevel
+        return zstandard.ZstdCompressor(level=level or 3).compress
+    if codec == 'gzip':
+        return lambda data: gzip.compress(data, compresslevel=level or 6)
+    raise ValueError(f"Unknown archive codec: {codec}!")
+
+
+def decompressor(codec: str):
+    if codec == 'zstd':
+        import zstandard  # pylint: disable=import-outside-toplevel
+        return zstandard.ZstdDecompressor().decompress
+    if codec == 'gzip':
+        return gzip.decompress
+    raise ValueError(f"Unknown archive codec: {codec}!")
+
+
+def read_index(path: str) -> List[Entry]:
+    """Return the index entries of an archive, in file order."""
+    entries = []
+    index_path = path + INDEX_SUFFIX
+    if not os.path.exists(index_path):
+        return entries
+    with open(index_path) as fp_:
+        for line in fp_:
+            fields = line.split('\t')
+            if len(fields) != 5:
+                continue
+            segment, time_offset, offset, length, raw = fields
+            entries.append((int(segment),
+                            None if time_offset == HEADER
+                            else float(time_offset),
+                            int(offset), int(length), int(raw)))
+    return entries
+
+
+def has_index(path: str) -> bool:
+    return os.path.exists(path + INDEX_SUFFIX)
+
+
+def read_chunk(path: str, entry: Entry) -> bytes:
+    """Return the raw data of an indexed chunk of an archive."""
+    with open(path, 'rb') as fp_:
+        fp_.seek(entry[2])
+        return decompressor(codec_of(path))(fp_.read(entry[3]))
+
+
+class ArchiveWriter:
+    """Append raw stream lines to a compressed archive and its index.
+
+    The codec is zstd for paths ending in .zst, and gzip otherwise.  Chunks
+    are compressed as they are completed, on the calling thread, unless
+    threaded is set.  Then they are compressed and written in order on a
+    thread of their own, and writing lines never waits for them.  An event
+    loop should await drain after writing, which yields to other tasks
+    while max_pending or more chunks are waiting, rather than let the
+    backlog grow.  Only close blocks, until every chunk is written.
+    """
+    def __init__(self, path: str, chunk_secs: float = 60.0,
+                 chunk_bytes: int = 4 * 1024 * 1024,
+                 level: Optional[int] = None, threaded: bool = False,
+                 max_pending: int = 4):
+        self.path = path
+        self.codec = codec_of(path)
+        self.compress = compressor(self.codec, level)
+        self.chunk_secs = chunk_secs
+        self.chunk_bytes = chunk_bytes
+        if not has_index(path) and os.path.exists(path):
+            root, ext = os.path.splitext(path)
+            aside = f"{root}-{time.strftime('%Y%m%d%H%M%S')}{ext}"
+            LOG.warning("Archive %s has no index...moving it to %s...",
+                        path, aside)
+            os.replace(path, aside)
+        entries = read_index(path)
+        self.segment = entries[-1][0] if entries else -1
+        offset = entries[-1][2] + entries[-1][3] if entries else 0
+        if os.path.exists(path) and os.path.getsize(path) != offset:
+            LOG.warning("Truncating archive %s to its last indexed chunk at "
+                        "%d bytes...", path, offset)
+            with open(path, 'r+b') as fp_:
+                fp_.truncate(offset)
+        self.executor = ThreadPoolExecutor(1) if threaded else None
+        self.max_pending = max_pending
+        self.pending: Deque[Future] = deque()
+        self.fp_ = open(path, 'ab')
+        self.index = open(path + INDEX_SUFFIX, 'a')
+        self.offset = offset
+        self.buffer = bytearray()
+        self.chunk_time: Optional[float] = None
+        self.last_time: Optional[float] = None
+        self.in_header = False
+        self.chunks = 0
+        self.raw_bytes = 0
+
+    def new_segment(self) -> None:
+        """Start a segment, for a new stream, whose lines up to the first
+        time marker are its header.
+        """
+        self.flush()
+        self.segment += 1
+        self.in_header = True
+        self.last_time = None
+
+    def write_line(self, line: bytes) -> None:
+        """Append a line, without its newline, to the archive."""
+        if line[0:1] == b"#":
+            time_offset = float(line[1:])
+            if self.in_header:
+                self.flush()
+                self.in_header = False
+            elif self.last_time is not None and time_offset < self.last_time:
+                # A stream restarted without a new connection.
+                self.flush()
+                self.segment += 1
+            elif self.chunk_time is not None and (
+                    time_offset - self.chunk_time >= self.chunk_secs
+                    or len(self.buffer) >= self.chunk_bytes):
+                self.flush()
+            if self.chunk_time is None:
+                self.chunk_time = time_offset
+            self.last_time = time_offset
+        elif self.segment < 0:
+            self.new_segment()
+        self.buffer += line
+        self.buffer += b"\n"
+
+    def flush(self) -> None:
+        """Compress and write the buffered chunk, then its index line."""
+        if not self.buffer:
+            return
+        time_offset = HEADER if self.in_header else repr(self.chunk_time)
+        args = (bytes(self.buffer), self.segment, time_offset)
+        self.buffer = bytearray()
+        self.chunk_time = None
+        if self.executor is None:
+            self.write_chunk(*args)
+            return
+        while self.pending and self.pending[0].done():
+            self.pending.popleft().result()
+        self.pending.append(self.executor.submit(self.write_chunk, *args))
+
+    @property
+    def backlogged(self) -> bool:
+        return len(self.pending) >= self.max_pending
+
+    async def drain(self) -> None:
+        """Wait, without blocking the event loop, until fewer than
+        max_pending chunks are waiting to be written.
+        """
+        while self.backlogged:
+            await asyncio.wrap_future(self.pending.popleft())
+
+    def write_chunk(self, raw: bytes, segment: int, time_offset: str) -> None:
+        data = self.compress(raw)
+        self.fp_.write(data)
+        self.fp_.flush()
+        self.index.write(f"{segment}\t{time_offset}\t"
+                         f"{self.offset}\t{len(data)}\t{len(raw)}\n")
+        self.index.flush()
+        self.offset += len(data)
+        self.raw_bytes += len(raw)
+        self.chunks += 1
+
+    def close(self) -> None:
+        self.flush()
+        if self.executor is not None:
+            self.executor.shutdown()
+            while self.pending:
+                self.pending.popleft().result()
+        self.fp_.close()
+        self.index.close()
+
+
+def split_frames(data: bytes) -> Iterator[Tuple[bytes, List[bytes]]]:
+    """Yield (time marker, lines) of each frame of raw data."""
+    marker, lines = None, []
+    for line in data.split(b"\n"):
+        if line[0:1] == b"#":
+            if marker is not None:
+                yield marker, lines
+            marker, lines = line, []
+        elif line:
+            lines.append(line)
+    if marker is not None:
+        yield marker, lines
+
+
+class ArchiveReader:
+    """Read an archive by time offset, through its index."""
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = read_index(path)
+        if not self.entries:
+            raise FileNotFoundError(f"No archive index for {path}!")
+
+    @property
+    def segments(self) -> List[int]:
+        return sorted({entry[0] for entry in self.entries})
+
+    def chunks(self, segment: int = 0) -> List[Entry]:
+        """Return the frame chunks of a segment, in time order."""
+        return [entry for entry in self.entries
+                if entry[0] == segment and entry[1] is not None]
+
+    def read_chunk(self, entry: Entry) -> bytes:
+        return read_chunk(self.path, entry)
+
+    def header(self, segment: int = 0) -> List[bytes]:
+        """Return the header lines of a segment."""
+        for entry in self.entries:
+            if entry[0] == segment and entry[1] is None:
+                return [line for line in self.read_chunk(entry).split(b"\n")
+                        if line]
+        return []
+
+    def seek(self, time_offset: float, segment: int = 0) -> List[Entry]:
+        """Return the chunks of a segment from the one holding time_offset."""
+        chunks = self.chunks(segment)
+        idx = bisect.bisect_right([entry[1] for entry in chunks], time_offset)
+        return chunks[max(idx - 1, 0):]
+
+    def frames(self, start: Optional[float] = None,
+               end: Optional[float] = None,
+               segment: int = 0) -> Iterator[Tuple[bytes, List[bytes]]]:
+        """Yield (time marker, lines) of each frame of a segment, with time
+        offset in [start, end).
+        """
+        chunks = self.chunks(segment) if start is None else self.seek(
+            start, segment)
+        for entry in chunks:
+            if end is not None and entry[1] >= end:
+                return
+            for marker, lines in split_frames(self.read_chunk(entry)):
+                time_offset = float(marker[1:])
+                if start is not None and time_offset < start:
+                    continue
+                if end is not None and time_offset >= end:
+                    return
+                yield marker, lines
+
+    def lines(self, start: Optional[float] = None,
+              end: Optional[float] = None,
+              segment: int = 0) -> Iterator[bytes]:
+        """Yield the header of a segment, then the lines of its frames in
+        [start, end), as a stream that may be replayed or ingested.
+        """
+        yield from self.header(segment)
+        for marker, lines in self.frames(start, end, segment):
+            yield marker
+            yield from lines
+
+    def extract(self, path: str, start: Optional[float] = None,
+                end: Optional[float] = None, segment: int = 0) -> None:
+        """Write lines of a segment in [start, end) as a plain ACMI file."""
+        with open(path, 'wb') as fp_:
+            for line in self.lines(start, end, segment):
+                fp_.write(line + b"\n")
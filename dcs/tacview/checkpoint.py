@@ -0,0 +1,79 @@
+"""
+Checkpoints of a Ref and its ObjectStore.
+
+A checkpoint holds the session references, the time offset and the filled
+portion of every column of the store, in one .npz file.  A restarted
+consumer loads it before connecting, and resumes the session, without
+writing a new session or any object already written, if the server is still
+in the same mission.  Files are written to a temporary path and renamed, so
+a checkpoint is never left half written.
+"""
+from datetime import datetime
+import json
+import os
+
+import numpy as np
+
+from dcs.tacview.spatial import SpatialIndex
+from dcs.tacview.store import ObjectStore
+
+REF_FIELDS = ('session_id', 'lat', 'lon', 'title', 'datasource', 'author',
+              'time_offset')
+
+
+def store_arrays(store: ObjectStore) -> dict:
+    """Return the filled portion of every array of a store, by name."""
+    arrays = {f'col_{name}': col[:store.size]
+              for name, col in store.cols.items()}
+    arrays['written'] = store.written[:store.size]
+    arrays['cart_coords'] = store.cart_coords[:store.size]
+    arrays['strings'] = np.array(store.strings.values, dtype=str)
+    return arrays
+
+
+def restore_store(store: ObjectStore, arrays) -> None:
+    """Replace the contents of a store with arrays from `store_arrays`."""
+    size = arrays['written'].shape[0]
+    store.grow(size)
+    for name, col in store.cols.items():
+        col[:size] = arrays[f'col_{name}']
+    store.written[:size] = arrays['written']
+    store.cart_coords[:size] = arrays['cart_coords']
+    store.size = size
+    store.index = {id_: row
+                   for row, id_ in enumerate(store.col('id').tolist())}
+    store.strings.values = arrays['strings'].tolist()
+    store.strings.codes = {value: code for code, value
+                           in enumerate(store.strings.values)}
+
+
+def save_checkpoint(ref, path: str) -> None:
+    """Write the state of a Ref to path."""
+    refs = {field: getattr(ref, field) for field in REF_FIELDS}
+    refs['start_time'] = (ref.start_time.isoformat()
+                          if ref.start_time else None)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fp_:
+        np.savez(fp_, refs=np.array(json.dumps(refs)),
+                 **store_arrays(ref.obj_store))
+    os.replace(tmp, path)
+
+
+def load_checkpoint(ref, path: str) -> bool:
+    """Restore the state of a Ref from path, if it exists.
+
+    Returns True if a checkpoint was loaded.
+    """
+    if not os.path.exists(path):
+        return False
+    with np.load(path) as data:
+        refs = json.loads(str(data['refs']))
+        restore_store(ref.obj_store, data)
+    for field in REF_FIELDS:
+        setattr(ref, field, refs[field])
+    if refs['start_time']:
+        ref.start_time = datetime.fromisoformat(refs['start_time'])
+    ref.all_refs = bool(ref.lat and ref.lon and ref.start_time)
+    ref.written = ref.session_id is not None
+    ref.spatial = SpatialIndex(ref.obj_store, ref.spatial.cell_size)
+    return True
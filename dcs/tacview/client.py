@@ -3,21 +3,36 @@ Tacview client methods.
 
 Results are parsed into usable format, and then written to a postgres database.
 """
-from io import BytesIO
 import asyncio
 from asyncio.log import logging
+from collections import deque
+from contextlib import nullcontext
 from datetime import datetime
 from functools import lru_cache
 from math import sqrt, cos, sin, radians
 from pathlib import Path
-from typing import Optional, Any, Dict, List, Tuple
+from typing import Optional, Any, Deque, Dict, List, Tuple
 import time
-import struct
 
+import numpy as np
 import pandas as pd
 import psycopg2 as pg
 import sqlalchemy as sa
-from dcs.common.db import Object, Event, Impact, PG_URL
+from dcs.common.db import (Object, Event, Impact, PG_URL,
+                           event_partition_sql)
+from dcs.tacview.archive import ArchiveWriter
+from dcs.tacview.checkpoint import load_checkpoint, save_checkpoint
+from dcs.tacview.compress import EventCompressor
+from dcs.tacview.export import event_exporter
+from dcs.tacview.flush import FlushPolicy
+from dcs.tacview.frame import FrameColumns, parse_frame
+from dcs.tacview.live import LiveState, serve_live_state
+from dcs.tacview.metrics import ConsumerStats, Metrics, serve_metrics
+from dcs.tacview.pgcopy import COPY_HEADER, COPY_TRAILER, CopyBuffer
+from dcs.tacview.sinks import Sink, open_sink
+from dcs.tacview import spatial
+from dcs.tacview.store import NULL_INT, ObjectStore, view_properties
+from dcs.tacview.stream import ChunkedStreamReader
 import asyncpg
 
 DB = None
@@ -69,10 +84,16 @@ class Ref:  # pylint: disable=too-many-instance-attributes
         self.all_refs: bool = False
         self.time_since_last: float = 0.0
         self.diff_since_last: float = 0.0
-        self.obj_store: Dict[int, ObjectRec] = {}
+        self.obj_store: ObjectStore = ObjectStore(ObjectView)
+        self.spatial: spatial.SpatialIndex = spatial.SpatialIndex(
+            self.obj_store)
         self.all_refs: bool = False
         self.written: bool = False
         self.time_since_last_events: float = 0.0
+        self.attribution: Optional['AttributionQueue'] = None
+        self.pending: PendingWrites = PendingWrites()
+        self.sink: Sink = PostgresSink()
+        self.event_range_secs: Optional[float] = None
 
     def update_time(self, offset):
         """Update the refence time attribute with a new offset."""
@@ -81,6 +102,7 @@ class Ref:  # pylint: disable=too-many-instance-attributes
         self.time_since_last += self.diff_since_last
         self.time_since_last_events += self.diff_since_last
         self.time_offset = offset
+        self.spatial.stale = True
 
     def update_db(self):
         self.time_since_last = 0.0
@@ -88,10 +110,28 @@ class Ref:  # pylint: disable=too-many-instance-attributes
     def write_events_db(self):
         self.time_since_last_events = 0.0
 
-    async def parse_ref_obj(self, line):
+    def same_mission(self, other: 'Ref', time_offset: float) -> bool:
+        """Return True if other, read from a server at time_offset, holds
+        the references of this mission, and time has not gone backwards.
+        """
+        return (self.lat == other.lat and self.lon == other.lon
+                and self.start_time == other.start_time
+                and self.title == other.title
+                and time_offset >= self.time_offset - 1.0)
+
+    async def write_session(self):
+        """Write the session to the sink."""
+        LOG.info("All Refs found...writing session data to db...")
+        self.session_id = await self.sink.write_session(self)
+        self.written = True
+        LOG.info("Session session data saved...")
+
+    async def parse_ref_obj(self, line, write=True):
         """
         Attempt to extract ReferenceLatitude, ReferenceLongitude or
         ReferenceTime from a line object.
+
+        Once all are found, the session is written, unless write is False.
         """
         try:
             val = line.split(b',')[-1].split(b'=')
@@ -123,16 +163,8 @@ class Ref:  # pylint: disable=too-many-instance-attributes
 
             self.all_refs = all(f
                                 for f in [self.lat and self.lon and self.start_time])
-            if self.all_refs and not self.written:
-                LOG.info("All Refs found...writing session data to db...")
-                sess_ser = self.ser()
-                sql = f"""INSERT into session ({','.join(sess_ser.keys())})
-                        VALUES({','.join(["$"+str(i+1) for i, _ in enumerate(sess_ser.keys())])})
-                        RETURNING session_id
-                """
-                self.session_id = await DB.fetchval(sql, *sess_ser.values())
-                self.written = True
-                LOG.info("Session session data saved...")
+            if self.all_refs and not self.written and write:
+                await self.write_session()
         except IndexError:
             pass
 
@@ -213,6 +245,13 @@ class ObjectRec:
                                  self.secs_since_last_seen) / 1.94384
         self.cart_coords = new_cart_coords
 
+    def snapshot(self) -> 'ObjectRec':
+        """Return a standalone copy of every field of this record."""
+        rec = ObjectRec.__new__(ObjectRec)
+        for key in ObjectRec.__slots__:
+            setattr(rec, key, getattr(self, key))
+        return rec
+
     def should_have_parent(self):
         tval = self.Type.lower()
         return any([
@@ -224,13 +263,26 @@ class ObjectRec:
         ])
 
 
+@view_properties
+class ObjectView(ObjectRec):
+    """A single row of an ObjectStore, exposing the ObjectRec API."""
+    __slots__ = ['store', 'row']
+
+    def __init__(self, store: ObjectStore, row: int):  # pylint: disable=super-init-not-called
+        self.store = store
+        self.row = row
+
+    def __repr__(self):
+        return f"ObjectView(id={self.id}, row={self.row})"
+
+
 def get_cartesian_coord(lat, lon, h):
     """Convert coords from geodesic to cartesian."""
     a = 6378137.0
     rf = 298.257223563
     lat_rad = radians(lat)
     lon_rad = radians(lon)
-    N = sqrt(a / (1 - (1 - (1 - 1 / rf) ** 2) * (sin(lat_rad)) ** 2))
+    N = a / sqrt(1 - (1 - (1 - 1 / rf) ** 2) * (sin(lat_rad)) ** 2)
     X = (N + h) * cos(lat_rad) * cos(lon_rad)
     Y = (N + h) * cos(lat_rad) * sin(lon_rad)
     Z = ((1 - 1 / rf) ** 2 * N + h) * sin(lat_rad)
@@ -243,78 +295,129 @@ def compute_dist(p_1, p_2):
                 (p_2[2] - p_1[2])**2)
 
 
-async def determine_contact(rec, ref: Ref, type='parent'):
-    """Determine the parent of missiles, rockets, and bombs."""
+def get_cartesian_coords(lat: np.ndarray, lon: np.ndarray,
+                         h: np.ndarray) -> np.ndarray:
+    """Convert arrays of coords from geodesic to cartesian, returning an
+    (n, 3) array.  Vectorized equivalent of get_cartesian_coord.
+    """
+    a = 6378137.0
+    rf = 298.257223563
+    lat_rad = np.radians(lat)
+    lon_rad = np.radians(lon)
+    sin_lat = np.sin(lat_rad)
+    cos_lat = np.cos(lat_rad)
+    N = a / np.sqrt(1 - (1 - (1 - 1 / rf) ** 2) * sin_lat ** 2)
+    out = np.empty((lat_rad.shape[0], 3), dtype=np.float64)
+    out[:, 0] = (N + h) * cos_lat * np.cos(lon_rad)
+    out[:, 1] = (N + h) * cos_lat * np.sin(lon_rad)
+    out[:, 2] = ((1 - 1 / rf) ** 2 * N + h) * sin_lat
+    return out
+
+
+def compute_velocities(store: ObjectStore, rows: np.ndarray) -> None:
+    """Update cart_coords and velocity_kts for many rows of a store at once.
+
+    Vectorized equivalent of calling ObjectRec.compute_velocity on each row.
+    """
+    cols = store.cols
+    new_cart_coords = get_cartesian_coords(cols['lat'][rows], cols['lon'][rows],
+                                           cols['alt'][rows])
+    old_cart_coords = store.cart_coords[rows]
+    secs = cols['secs_since_last_seen'][rows]
+    valid = ~np.isnan(old_cart_coords[:, 0]) & (secs > 0)
+    true_dist = np.sqrt(
+        np.square(new_cart_coords[valid] - old_cart_coords[valid]).sum(axis=1))
+    cols['velocity_kts'][rows[valid]] = (true_dist / secs[valid]) / 1.94384
+    store.cart_coords[rows] = new_cart_coords
+
+
+# Columns of candidate contacts copied by contact_candidates.
+CANDIDATE_COLUMNS = ('id', 'last_seen', 'alive', 'alt', 'lat', 'lon', 'Name',
+                     'Pilot', 'Type')
+
+
+def contact_candidates(rec, ref: Ref,
+                       type='parent') -> Optional[Dict[str, np.ndarray]]:
+    """Return columns of the candidate contacts of a record, as of now.
+
+    Candidates are found in the in-memory spatial index of ref, so this
+    never touches the database.  Their columns are copies, so they are
+    unchanged by frames parsed while a contact is chosen.
+    """
     if type not in ['parent', 'impacted']:
         raise ValueError("Type must be impacted or parent!")
 
-    LOG.debug(f"Determing {type} for object id: %s -- %s-%s...", rec.id,
-              rec.Name, rec.Type)
-    offset_min = rec.last_seen - 2.5
-
     if type == "parent":
         accpt_colors = ['Blue', 'Red'
                         ] if rec.Color == 'Violet' else [rec.Color]
-
-        # query_filter = (
-        #     ~(Object.type.startswith('Decoy'))
-        #     & ~(Object.c.type.startswith('Misc'))
-        #     & ~(Object.c.type.startswith('Projectile'))
-        #     & ~(Object.c.type.startswith('Weapon'))
-        #     &
-        #     ~(Object.c.type.startswith("Ground+Light+Human+Air+Parachutist")))
-        query_filter = " (type not like ('%Decoy%')"\
-            " AND type not like ('%Misc%')"\
-            " AND type not like ('%Weapon%')"\
-            " AND type not like ('%Projectile%')"\
-            " AND type not like ('%Ground+Light+Human+Air+Parachutist%'))"
+        kind = spatial.PARENT
 
     elif type == 'impacted':
         accpt_colors = ['Red'] if rec.Color == 'Blue' else ['Red']
-        # query_filter = (Object.c.type.startswith('Air+'))
-        query_filter = " type like ('%Air+%')"
+        kind = spatial.AIR
 
     else:
         raise NotImplementedError
 
-    color_query = f""" color in ('{"','".join(accpt_colors)}')"""
-    id_query = f" id != {rec.id} "
-    query = f""" SELECT id FROM object
-    WHERE {query_filter} AND {color_query} AND {id_query}
-    """
+    if rec.cart_coords is None:
+        return None
 
-    nearby_objs = await DB.fetch(query)
+    store = ref.obj_store
+    cols = store.cols
+    nearby = ref.spatial.candidates(kind, accpt_colors, rec.cart_coords)
+    nearby = nearby[cols['id'][nearby] != rec.id]
+    cands = {name: cols[name][nearby] for name in CANDIDATE_COLUMNS}
+    cands['ground'] = (ref.spatial.flags()[nearby] & spatial.GROUND) != 0
+    cands['cart_coords'] = store.cart_coords[nearby]
+    return cands
 
-    closest = []
-    for nearby in nearby_objs:
-        near = ref.obj_store[nearby[0]]
-        if ((near.last_seen <= offset_min
-             and not (near.Type.startswith('Ground') and near.alive == 1))
-                and (abs(near.alt - rec.alt) < 2000)
-                and (abs(near.lat - rec.lat) <= 0.0005)
-                and (abs(near.lon - rec.lon) <= 0.0005)):
-            continue
 
-        prox = compute_dist(rec.cart_coords, near.cart_coords)
-        LOG.debug("Distance to object %s - %s is %s...", near.Name, near.Type,
-                  str(prox))
-        if not closest or (prox < closest[1]):
-            closest = [near.id, prox, near.Name, near.Pilot, near.Type]
-
-    if not closest:
+def closest_contact(rec, ref: Ref, cands: Optional[Dict[str, np.ndarray]],
+                    type='parent'):
+    """Return [id, distance, name, pilot, type] of the closest candidate
+    contact of a record, or None if none is close enough.
+    """
+    if cands is None:
+        return None
+    offset_min = rec.last_seen - 2.5
+    stale = ((cands['last_seen'] <= offset_min)
+             & ~(cands['ground'] & (cands['alive'] == 1))
+             & (np.abs(cands['alt'] - rec.alt) < 2000)
+             & (np.abs(cands['lat'] - rec.lat) <= 0.0005)
+             & (np.abs(cands['lon'] - rec.lon) <= 0.0005))
+    nearby = np.flatnonzero(~stale)
+    if not nearby.shape[0]:
         return None
 
+    prox = np.sqrt(np.square(cands['cart_coords'][nearby]
+                             - np.asarray(rec.cart_coords)).sum(axis=1))
+    idx = int(np.argmin(prox))
+    near = int(nearby[idx])
+    lookup = ref.obj_store.strings.lookup
+    closest = [int(cands['id'][near]), float(prox[idx]),
+               lookup(cands['Name'][near]), lookup(cands['Pilot'][near]),
+               lookup(cands['Type'][near])]
+    LOG.debug("Distance to object %s - %s is %s...", closest[2], closest[4],
+              str(closest[1]))
+
     if closest[1] > 1000:
         LOG.warning(
             f"Rejecting closest {type} for {rec.id}-{rec.Name}-{rec.Type}: "
             "%s %sm...%d checked!",  closest[4],
-            str(closest[1]), len(nearby_objs))
+            str(closest[1]), nearby.shape[0])
 
         return None
 
     return closest
 
 
+def determine_contact(rec, ref: Ref, type='parent'):
+    """Determine the parent of missiles, rockets, and bombs."""
+    LOG.debug(f"Determing {type} for object id: %s -- %s-%s...", rec.id,
+              rec.Name, rec.Type)
+    return closest_contact(rec, ref, contact_candidates(rec, ref, type), type)
+
+
 async def line_to_obj(raw_line: bytearray, ref: Ref) -> Optional[ObjectRec]:
     """Parse a textline from tacview into an ObjectRec."""
     # secondary_update = None
@@ -322,20 +425,7 @@ async def line_to_obj(raw_line: bytearray, ref: Ref) -> Optional[ObjectRec]:
         return None
 
     if raw_line[0:1] == b'-':
-        rec = ref.obj_store[int(raw_line[1:], 16)]
-        rec.alive = 0
-        await mark_dead(rec.id)
-
-        if 'Weapon' in rec.Type:
-            impacted = await determine_contact(rec, type='impacted', ref=ref)
-            if impacted:
-                rec.impacted = impacted[0]
-                rec.impacted_dist = impacted[1]
-                sql = create_impact_stmt()
-                vals = (ref.session_id, rec.parent, rec.impacted, rec.id,
-                        ref.time_offset, rec.impacted_dist)
-                await DB.execute(sql, *vals)
-        return rec
+        return await remove_obj(int(raw_line[1:], 16), ref)
 
     comma = raw_line.find(b',')
     rec_id = int(raw_line[0:comma], 16)
@@ -346,11 +436,11 @@ async def line_to_obj(raw_line: bytearray, ref: Ref) -> Optional[ObjectRec]:
 
     except KeyError:
         # Object not yet seen...create new record...
-        rec = ObjectRec(id_=rec_id,
-                        session_id=ref.session_id,
-                        first_seen=ref.time_offset,
-                        last_seen=ref.time_offset)
-        ref.obj_store[rec_id] = rec
+        rec = ref.obj_store.create(rec_id,
+                                   session_id=ref.session_id,
+                                   first_seen=ref.time_offset,
+                                   last_seen=ref.time_offset)
+        ref.pending.add_object(rec)
 
     while True:
         last_comma = comma + 1
@@ -389,14 +479,117 @@ async def line_to_obj(raw_line: bytearray, ref: Ref) -> Optional[ObjectRec]:
     rec.compute_velocity(ref.time_since_last)
 
     if rec.updates == 1 and rec.should_have_parent():
-        parent_info = await determine_contact(rec, type='parent', ref=ref)
-        if parent_info:
-            rec.parent = parent_info[0]
-            rec.parent_dist = parent_info[1]
+        if ref.attribution:
+            ref.attribution.submit('parent', rec, ref)
+        else:
+            assign_parent(rec, ref)
 
     return rec
 
 
+async def remove_obj(rec_id: int, ref: Ref) -> ObjectRec:
+    """Mark an object as dead, and determine what it impacted if a weapon."""
+    rec = ref.obj_store[rec_id]
+    rec.alive = 0
+    # A removal is a state of its own, never equal to the last alive one.
+    rec.updates += 1
+    ref.pending.add_dead(ref.session_id, rec.id)
+
+    if 'Weapon' in rec.Type:
+        if ref.attribution:
+            ref.attribution.submit('impacted', rec, ref)
+            return rec
+
+        impacted = determine_contact(rec, type='impacted', ref=ref)
+        if impacted:
+            rec.impacted = impacted[0]
+            rec.impacted_dist = impacted[1]
+            ref.pending.add_impact((ref.session_id, rec.parent, rec.impacted,
+                                    rec.id, ref.time_offset,
+                                    rec.impacted_dist))
+    return rec
+
+
+def assign_parent(rec: ObjectRec, ref: Ref) -> None:
+    """Determine and set the parent of a newly seen weapon."""
+    parent_info = determine_contact(rec, type='parent', ref=ref)
+    if parent_info:
+        rec.parent = parent_info[0]
+        rec.parent_dist = parent_info[1]
+
+
+async def frame_to_objs(lines: List[bytes], ref: Ref) -> List[ObjectRec]:
+    """Parse all lines of a frame at once, updating the object store in bulk.
+
+    Returns the records updated or removed in the frame, in the order that
+    they should be written.  Removals are applied after all updates.
+    """
+    return await apply_frame(parse_frame(lines), ref)
+
+
+async def apply_frame(frame: FrameColumns, ref: Ref) -> List[ObjectRec]:
+    """Update the object store in bulk from a parsed frame.
+
+    Frames may be parsed elsewhere, e.g. in another process, but must be
+    applied in order, as velocities, parents and impacts depend on state
+    left by earlier frames.
+    """
+    if ref.lon:
+        frame.lon[:] += ref.lon
+    if ref.lat:
+        frame.lat[:] += ref.lat
+
+    store = ref.obj_store
+    rows = store.lookup(frame.ids)
+    existing = rows[rows != -1]
+    if existing.shape[0]:
+        last_seen = store.cols['last_seen']
+        store.cols['secs_since_last_seen'][existing] = (
+            ref.time_offset - last_seen[existing])
+        last_seen[existing] = ref.time_offset
+        np.add.at(store.cols['updates'], existing, 1)
+
+    new_recs = []
+    for idx in np.flatnonzero(rows == -1).tolist():
+        rec_id = int(frame.ids[idx])
+        if rec_id in store:
+            # Seen earlier in this frame, as a repeated line would be.
+            row = rows[idx] = store.index[rec_id]
+            store.cols['secs_since_last_seen'][row] = 0.0
+            store.cols['updates'][row] += 1
+            continue
+        rec = store.create(rec_id,
+                           session_id=ref.session_id,
+                           first_seen=ref.time_offset,
+                           last_seen=ref.time_offset)
+        rows[idx] = rec.row
+        new_recs.append(rec)
+        ref.pending.add_object(rec)
+
+    for col_idx, key in enumerate(COORD_KEYS):
+        present = frame.present[:, col_idx]
+        store.cols[key][rows[present]] = frame.coords[present, col_idx]
+
+    recs = [store.view(row) for row in rows.tolist()]
+    for row, key, val in frame.props:
+        setattr(recs[row], key, val)
+
+    compute_velocities(store, rows)
+
+    for rec in new_recs:
+        if rec.Type and rec.should_have_parent():
+            if ref.attribution:
+                ref.attribution.submit('parent', rec, ref)
+            else:
+                assign_parent(rec, ref)
+
+    for rec_id in frame.removed:
+        if rec_id in store:
+            recs.append(await remove_obj(rec_id, ref))
+
+    return recs
+
+
 @lru_cache()
 def create_object_stmt():
     return f"""INSERT into object ({','.join(Object.c.keys())})
@@ -409,10 +602,11 @@ def create_impact_stmt():
         VALUES({','.join(["$"+str(i+1) for i, _ in enumerate(Impact.c.keys())])})"""
 
 
-async def mark_dead(obj_id) -> None:
+async def mark_dead(session_id, obj_id) -> None:
     """Mark a single record as dead."""
     await DB.execute(f"""
-        UPDATE object SET alive = 0 WHERE id = {obj_id};
+        UPDATE object SET alive = 0
+        WHERE session_id = {session_id} AND id = {obj_id};
     """)
 
     # """
@@ -430,9 +624,83 @@ async def mark_dead(obj_id) -> None:
     # """
 
 
-async def create_single(obj):
-    """Insert a single newly create record to database."""
-    vals = (obj.id, obj.session_id,
+class PendingWrites:
+    """Buffer new objects, deaths and impacts, to be applied in bulk.
+
+    New objects must be written before any event referencing them, so
+    `flush_objects` is called before each event flush.  Deaths must be
+    applied after the event COPY holding the rows that preceded them, as the
+    object merge in BinCopyWriter would otherwise be free to set alive back
+    to 1, so `flush` is called only after each event flush.
+    """
+    mark_dead_stmt = """
+        UPDATE object SET alive = 0
+        FROM unnest($1::int[], $2::int[]) AS dead(session_id, id)
+        WHERE object.session_id = dead.session_id AND object.id = dead.id
+    """
+
+    def __init__(self):
+        self.objects: List[ObjectRec] = []
+        self.dead: List[Tuple[int, int]] = []
+        self.impacts: List[Tuple] = []
+
+    def __len__(self):
+        return len(self.objects) + len(self.dead) + len(self.impacts)
+
+    def add_object(self, obj: ObjectRec) -> None:
+        """Queue a newly seen object.  Its values are read when flushed."""
+        self.objects.append(obj)
+
+    async def flush_objects(self, sink) -> None:
+        """Write all newly seen objects at once.
+
+        Here, and below, sink may be a Sink, or an asyncpg connection or pool.
+        """
+        if not self.objects:
+            return
+        objs = self.objects
+        self.objects = []
+        await as_sink(sink).write_objects([object_record(obj) for obj in objs])
+        for obj in objs:
+            obj.written = True
+
+    def add_dead(self, session_id: int, obj_id: int) -> None:
+        self.dead.append((session_id, obj_id))
+
+    def add_impact(self, impact: Tuple) -> None:
+        """Add a row of (session_id, killer, target, weapon, time_offset,
+        impact_dist).
+        """
+        self.impacts.append(impact)
+
+    def take(self) -> 'PendingWrites':
+        """Move buffered deaths and impacts into a new PendingWrites."""
+        taken = PendingWrites()
+        taken.dead, self.dead = self.dead, []
+        taken.impacts, self.impacts = self.impacts, []
+        return taken
+
+    async def flush(self, sink) -> None:
+        """Apply all buffered deaths at once, and write all impacts."""
+        await self.flush_dead(sink)
+        await self.flush_impacts(sink)
+
+    async def flush_dead(self, sink) -> None:
+        if self.dead:
+            dead = self.dead
+            self.dead = []
+            await as_sink(sink).mark_dead(dead)
+
+    async def flush_impacts(self, sink) -> None:
+        if self.impacts:
+            impacts = self.impacts
+            self.impacts = []
+            await as_sink(sink).write_impacts(impacts)
+
+
+def object_record(obj) -> Tuple:
+    """Return the values of an object, in the column order of Object."""
+    return (obj.id, obj.session_id,
             obj.Name,
             obj.Color,
             obj.Country,
@@ -446,11 +714,251 @@ async def create_single(obj):
             obj.updates, obj.velocity_kts, obj.impacted, obj.impacted_dist,
             obj.parent, obj.parent_dist)
 
+
+class PostgresSink(Sink):
+    """Write to Postgres through an asyncpg connection, or pool.
+
+    Without conn, the module's DB connection is used.  Events are written by
+    an AsyncBinCopyWriter on pool, whose transactions also apply deaths and
+    impacts.  Deaths, impacts and parents, which may be written by worker
+    tasks while the parser writes objects on conn, take a connection of
+    pool of their own whenever a pool is set.
+    """
+    set_parent_stmt = ("UPDATE object SET parent = $1, parent_dist = $2 "
+                       "WHERE session_id = $3 AND id = $4")
+
+    def __init__(self, conn=None, pool=None):
+        self.conn = conn
+        self.pool = pool
+
+    @property
+    def db(self):
+        return DB if self.conn is None else self.conn
+
+    def acquire(self):
+        """Return a context of a connection of the pool, or of db if it is
+        a single connection.
+        """
+        target = self.pool or self.db
+        if hasattr(target, 'acquire'):
+            return target.acquire()
+        return nullcontext(target)
+
+    async def write_session(self, ref) -> int:
+        """Insert the session, then create its event partition."""
+        sess_ser = ref.ser()
+        sql = f"""INSERT into session ({','.join(sess_ser.keys())})
+                VALUES({','.join(["$"+str(i+1) for i, _ in enumerate(sess_ser.keys())])})
+                RETURNING session_id
+        """
+        session_id = await self.db.fetchval(sql, *sess_ser.values())
+        await self.create_event_partition(session_id, ref.event_range_secs)
+        return session_id
+
+    async def create_event_partition(self, session_id: int,
+                                     range_secs: Optional[float]) -> None:
+        """Create the event partition of a session, before any events."""
+        try:
+            for stmt in event_partition_sql(session_id, range_secs):
+                await self.db.execute(stmt)
+            LOG.info("Event partition created for session %s...", session_id)
+        except asyncpg.PostgresError as err:
+            LOG.warning("Event partition not created for session %s: %s",
+                        session_id, err)
+
+    async def write_objects(self, records: List[Tuple]) -> None:
+        await self.db.copy_records_to_table(
+            'object', records=records, columns=list(Object.c.keys()))
+
+    async def write_events(self, columns: Dict[str, np.ndarray]) -> None:
+        """COPY and merge a batch of events in one transaction."""
+        data = CopyBuffer(Event.c)
+        values = [columns[name] for name in Event.c.keys()]
+        data.pack_columns(values, [val == NULL_INT if val.dtype.kind == 'i'
+                                   else None for val in values])
+        data.finish()
+        async with (self.pool or self.db).acquire() as conn:
+            async with conn.transaction():
+                await conn.copy_to_table('event_stage', source=data.view(),
+                                         format='binary')
+                for _, cmd in BinCopyWriter.merge_cmds:
+                    await conn.execute(cmd)
+
+    async def mark_dead(self, dead: List[Tuple[int, int]]) -> None:
+        session_ids, ids = zip(*dead)
+        async with self.acquire() as conn:
+            await conn.execute(PendingWrites.mark_dead_stmt, list(session_ids),
+                               list(ids))
+
+    async def write_impacts(self, records: List[Tuple]) -> None:
+        async with self.acquire() as conn:
+            await conn.copy_records_to_table(
+                'impact', records=records, columns=list(Impact.c.keys()))
+
+    async def write_parents(
+            self, parents: List[Tuple[int, float, int, int]]) -> None:
+        async with self.acquire() as conn:
+            await conn.executemany(self.set_parent_stmt, parents)
+
+    def writer(self, min_insert_size: int = -1,  # type: ignore
+               policy: Optional[FlushPolicy] = None,
+               **kwargs) -> 'AsyncBinCopyWriter':
+        return AsyncBinCopyWriter(Event.c, self.pool or self.db,
+                                  min_insert_size, policy=policy, **kwargs)
+
+
+def as_sink(target) -> Sink:
+    """Return target if a Sink, else a PostgresSink of an asyncpg
+    connection or pool.
+    """
+    return target if isinstance(target, Sink) else PostgresSink(target)
+
+
+async def create_single(obj):
+    """Insert a single newly create record to database."""
     sql = create_object_stmt()
-    await DB.execute(sql, *vals)
+    await DB.execute(sql, *object_record(obj))
     obj.written = True
 
 
+class AttributionQueue:
+    """Resolve parents and impacts on worker tasks, off the parsing path.
+
+    Each job holds a snapshot of the weapon at the time it was submitted.
+    Its candidate contacts are selected by the worker, from the spatial
+    index as of when the job is resolved, so the parsing path only copies
+    one record per job.  Submitting never waits: jobs submitted to a full
+    queue are dropped and counted, which also bounds how far candidates
+    may have moved since a job's frame.  Results are applied to the object
+    store immediately.  Parents are written to the database in batches, but
+    only once their object row exists; until then they are carried by the
+    object insert itself.  Impacts are added to the PendingWrites of the
+    job's Ref.  If metrics is set, the latency of each job and the time of
+    each batch are recorded.
+    """
+    def __init__(self, pool, workers: int = 1, max_queue: int = 10000,
+                 batch_size: int = 500):
+        self.pool = pool
+        self.sink = as_sink(pool)
+        self.n_workers = workers
+        self.batch_size = batch_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.tasks: List[asyncio.Task] = []
+        self.deferred: List[Tuple[Ref, Tuple[int, float, int, int]]] = []
+        self.submitted = 0
+        self.resolved = 0
+        self.dropped = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.metrics: Optional[Metrics] = None
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    @property
+    def latency_mean(self) -> float:
+        return self.latency_total / self.resolved if self.resolved else 0.0
+
+    def start(self) -> None:
+        self.tasks = [asyncio.ensure_future(self.run())
+                      for _ in range(self.n_workers)]
+
+    async def stop(self) -> None:
+        """Wait for all queued jobs to be resolved and written."""
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.write([])
+
+    def submit(self, type_: str, rec: ObjectRec, ref: Ref) -> bool:
+        """Queue a record for attribution without waiting.
+
+        Returns False, and counts the job as dropped, if the queue is full.
+        """
+        try:
+            self.queue.put_nowait((type_, rec.snapshot(), ref,
+                                   ref.time_offset, time.time()))
+            self.submitted += 1
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.metrics:
+                self.metrics.inc('attribution_dropped')
+            LOG.warning("Attribution queue full...dropping %s job for %s",
+                        type_, rec.id)
+            return False
+
+    def resolve(self, type_: str, snap: ObjectRec, ref: Ref,
+                time_offset: float, parents: List) -> None:
+        """Determine the contact of a snapshot, and collect rows to write."""
+        contact = determine_contact(snap, ref, type=type_)
+        if not contact or snap.id not in ref.obj_store:
+            return
+
+        rec = ref.obj_store[snap.id]
+        if type_ == 'parent':
+            rec.parent = contact[0]
+            rec.parent_dist = contact[1]
+            parents.append((ref, (contact[0], contact[1], ref.session_id,
+                                  snap.id)))
+        else:
+            rec.impacted = contact[0]
+            rec.impacted_dist = contact[1]
+            ref.pending.add_impact((ref.session_id, rec.parent, contact[0],
+                                    snap.id, time_offset, contact[1]))
+
+    async def run(self) -> None:
+        while True:
+            jobs = [await self.queue.get()]
+            while len(jobs) < self.batch_size and not self.queue.empty():
+                jobs.append(self.queue.get_nowait())
+
+            parents: List[Tuple[Ref, Tuple[int, float, int, int]]] = []
+            try:
+                t1 = time.time()
+                for type_, snap, ref, time_offset, submitted in jobs:
+                    self.resolve(type_, snap, ref, time_offset, parents)
+                    latency = time.time() - submitted
+                    self.resolved += 1
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+                    if self.metrics:
+                        self.metrics.observe('attribution_latency_seconds',
+                                             latency)
+                t2 = time.time()
+                await self.write(parents)
+                if self.metrics:
+                    self.metrics.observe('attribution_resolve_seconds',
+                                         t2 - t1)
+                    self.metrics.observe('attribution_write_seconds',
+                                         time.time() - t2)
+            except Exception as err:  # pylint: disable=broad-except
+                LOG.error("Attribution batch failed!")
+                LOG.exception(err)
+            finally:
+                for _ in jobs:
+                    self.queue.task_done()
+
+    async def write(self, parents: List) -> None:
+        """Write a batch of parents of objects already written."""
+        self.deferred.extend(parents)
+        ready = []
+        waiting = []
+        for ref, parent in self.deferred:
+            if ref.obj_store[parent[3]].written:
+                ready.append(parent)
+            else:
+                waiting.append((ref, parent))
+        self.deferred = waiting
+
+        if not ready:
+            return
+        await self.sink.write_parents(ready)
+
+
 class ServerExitException(Exception):
     """Throw this exception when there is a socket read timeout."""
 
@@ -460,19 +968,38 @@ class MaxIterationsException(Exception):
 
 
 class AsyncSocketReader:
-    """Read from Tacview socket."""
-    def __init__(self, host, port, debug=False):
+    """Read from Tacview socket.
+
+    If chunk_size is set, the stream is read in chunks of that many bytes
+    and split into lines locally, rather than awaiting each line.
+
+    If the Ref already holds a session when a connection is opened, as after
+    a reconnect or a restored checkpoint, the references sent by the server
+    are checked against it, and its state kept if the server is still in the
+    same mission.  Otherwise a new Ref, and session, replaces it.
+
+    If archive is set, every line read from the socket is written to it,
+    each connection as a segment of its own.  With debug set, lines are
+    archived to log/raw_sink.acmi.gz by default.
+    """
+    def __init__(self, host, port, debug=False, chunk_size=None,
+                 archive: Optional[ArchiveWriter] = None):
         self.host = host
         self.port = port
+        self.chunk_size = chunk_size
         self.reader: Optional[asyncio.StreamReader] = None
+        self.chunk_reader: Optional[ChunkedStreamReader] = None
         self.ref = Ref()
+        self.pushback: Deque[bytearray] = deque()
+        self.resumed = 0
         self.writer: Optional[asyncio.StreamWriter] = None
-        self.sink = "log/raw_sink.txt"
+        self.archive = archive
         self.data = bytearray()
         self.debug = debug
         self.msg = None
-        if self.debug:
-            open(self.sink, 'w').close()
+        if self.debug and self.archive is None:
+            self.archive = ArchiveWriter("log/raw_sink.acmi.gz",
+                                         threaded=True)
 
     async def open_connection(self):
         """
@@ -487,7 +1014,16 @@ class AsyncSocketReader:
                 LOG.info('Connection opened...sending handshake...')
                 self.writer.write(HANDSHAKE)
                 await self.reader.readline()
-
+                if self.archive:
+                    self.archive.new_segment()
+                if self.chunk_size:
+                    self.chunk_reader = ChunkedStreamReader(self.reader,
+                                                            self.chunk_size)
+
+                if self.ref.written:
+                    LOG.info('Connection opened...checking refs...')
+                    await self.resume()
+                    break
                 LOG.info('Connection opened...creating db and reading refs...')
                 while not self.ref.all_refs:
                     obj = await self.read_stream()
@@ -499,144 +1035,391 @@ class AsyncSocketReader:
                 LOG.error('Connection attempt failed....retry in 3 sec...')
                 await asyncio.sleep(3)
 
+    async def resume(self):
+        """Read refs up to the first time marker, and keep the current Ref
+        if they match it.  Lines read are replayed by read_stream.
+        """
+        candidate = Ref()
+        lines = []
+        while True:
+            obj = await self.read_stream()
+            lines.append(obj)
+            if obj[0:1] == b"#" and candidate.all_refs:
+                break
+            if obj[0:2] == b"0,":
+                await candidate.parse_ref_obj(obj, write=False)
+        self.pushback.extendleft(reversed(lines))
+        if self.ref.same_mission(candidate, float(obj[1:])):
+            LOG.info('Same mission found...resuming session %s...',
+                     self.ref.session_id)
+            self.resumed += 1
+            return
+        LOG.info('New mission found...starting new session...')
+        candidate.event_range_secs = self.ref.event_range_secs
+        candidate.attribution = self.ref.attribution
+        candidate.sink = self.ref.sink
+        self.ref = candidate
+        await self.ref.write_session()
+
+    async def reconnect(self):
+        """Close the socket, if still open, and open a new connection."""
+        if self.writer:
+            try:
+                await self.close()
+            except ConnectionError:
+                pass
+        self.pushback.clear()
+        await self.open_connection()
+
     async def read_stream(self):
         """Read lines from socket stream."""
-        data = bytearray(await self.reader.readuntil(b"\n"))
-        return data[:-1]
+        if self.pushback:
+            return self.pushback.popleft()
+        if self.chunk_reader:
+            data = await self.chunk_reader.readline()
+        else:
+            data = bytearray(await self.reader.readuntil(b"\n"))[:-1]
+        if self.archive:
+            self.archive.write_line(data)
+            if self.archive.backlogged:
+                await self.archive.drain()
+        return data
 
     async def close(self):
-        """Close the socket connection and reset ref object."""
-        self.writer.close()
-        await self.writer.wait_closed()
+        """Close the socket connection.
+
+        The Ref is kept, so that a new connection can resume its session.
+        """
+        writer = self.writer
         self.reader = None
+        self.chunk_reader = None
         self.writer = None
-        self.ref = Ref()
+        writer.close()
+        await writer.wait_closed()
 
 
 class BinCopyWriter:
-    """Manage efficient insertion of bulk data to postgres."""
-    db_event_time: float = 0.0
-    event_times: List = []
-    insert: BytesIO
-    copy_header = struct.pack('>11sii', b'PGCOPY\n\377\r\n\0', 0, 0)
-    copy_trailer =  struct.pack('>h', -1)
-    cmd = """
-            CREATE UNLOGGED TABLE IF NOT EXISTS event_temp
-                (LIKE event INCLUDING DEFAULTS);
-
-            COPY public.event_temp FROM STDIN WITH BINARY;
-
-            CREATE INDEX tmp_idx on event_temp (id);
+    """Manage efficient insertion of bulk data to postgres.
 
+    If metrics is set, the time of each flush phase is recorded in a
+    histogram of its own.
+    """
+    db_event_time: float = 0.0
+    insert: CopyBuffer
+    copy_header = COPY_HEADER
+    copy_trailer = COPY_TRAILER
+    # The staging table and merge statements are created once per
+    # connection; ON COMMIT DELETE ROWS empties the table after each flush.
+    stage_cmd = """
+        CREATE TEMP TABLE IF NOT EXISTS event_stage
+            (LIKE event INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+    """
+    # Rows from an older flush still in flight never overwrite newer state.
+    # States are ordered by (updates, last_seen), and no two states of an
+    # object share both, as removals bump updates, so the guard is strict.
+    prepare_cmd = """
+        PREPARE insert_events AS
             INSERT INTO event
-            SELECT * FROM event_temp;
+            SELECT * FROM event_stage;
 
+        PREPARE upsert_objects AS
             INSERT INTO object (
                 id, session_id, last_seen, alive, lat, lon, alt, roll, pitch,
                 yaw, u_coord, v_coord, heading, velocity_kts, updates
             )
-            SELECT id, session_id, last_seen, alive, lat, lon, alt, roll,
-                pitch, yaw, u_coord, v_coord, heading, velocity_kts, updates
-            FROM (
-                SELECT *,
-                    row_number() OVER (
-                        PARTITION BY id
-                        ORDER BY updates DESC) as row_number
-                FROM event_temp
-            ) evt
-            WHERE row_number = 1
-            ON CONFLICT (id)
-            DO UPDATE SET session_id=EXCLUDED.session_id,
-                last_seen=EXCLUDED.last_seen, alive=EXCLUDED.alive,
+            SELECT DISTINCT ON (session_id, id) id, session_id, last_seen,
+                alive, lat, lon, alt, roll, pitch, yaw, u_coord, v_coord,
+                heading, velocity_kts, updates
+            FROM event_stage
+            ORDER BY session_id, id, updates DESC, last_seen DESC
+            ON CONFLICT (session_id, id)
+            DO UPDATE SET last_seen=EXCLUDED.last_seen, alive=EXCLUDED.alive,
                 lat=EXCLUDED.lat, lon=EXCLUDED.lon, alt=EXCLUDED.alt,
                 roll=EXCLUDED.roll, pitch=EXCLUDED.pitch, yaw=EXCLUDED.yaw,
                 u_coord=EXCLUDED.u_coord, v_coord=EXCLUDED.v_coord,
                 heading=EXCLUDED.heading, velocity_kts=EXCLUDED.velocity_kts,
-                updates=EXCLUDED.updates;
-
-            DROP INDEX tmp_idx;
-
-            DROP TABLE event_temp;
-        """
+                updates=EXCLUDED.updates
+            WHERE object.updates IS NULL
+                OR (object.updates, object.last_seen)
+                    < (EXCLUDED.updates, EXCLUDED.last_seen);
+    """
+    copy_cmd = "COPY event_stage FROM STDIN WITH BINARY"
+    merge_cmds = (('insert', "EXECUTE insert_events"),
+                  ('upsert', "EXECUTE upsert_objects"))
 
     def __init__(self, columns, dsn: str, min_insert_size: int = -1):
         self.dsn = dsn
+        self.conn = None
+        self.first_row_time = 0.0
+        self.event_times: List[float] = []
+        self.phase_times: Dict[str, float] = {}
+        self.metrics: Optional[Metrics] = None
         self.min_insert_size = min_insert_size
-        self.fmt_str: str = ''
-        self.ins_vals = None
+        self.columns = columns
         self.ncol = len(columns)
-        self.build_fmt_string(columns)
         self.create_byte_buffer()
-        self.insert_count = 0
-
-    def build_fmt_string(self, columns):
-        types = {
-            "INTEGER": ('ii', 4),
-            "FLOAT": ('id', 8),
-            "DOUBLE": ('id', 8),
-            "NUMERIC": ('id', 8)
-        }
-
-        fmt_str = ['>h']
-        self.ins_vals = [0] * ((self.ncol*2)+1)
-        self.ins_vals[0] = self.ncol
-
-        i = 1
-        for col in columns.values():
-            fmt, sz = types[str(col.type)]
-            self.ins_vals[i] = sz
-            fmt_str.append(fmt)
-            i += 2
-        self.fmt_str = ''.join(fmt_str)
+        self.fmt_str = self.insert.fmt_str
+
+    def time_phase(self, phase: str, start: float) -> float:
+        """Add the time since start to a flush phase, and return now."""
+        now = time.time()
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + (
+            now - start)
+        if self.metrics:
+            self.metrics.observe(f'flush_{phase}_seconds', now - start)
+        return now
+
+    def connect(self):
+        """Return the writer's connection, preparing it on first use."""
+        if self.conn is None or self.conn.closed:
+            self.conn = pg.connect(self.dsn)
+            with self.conn.cursor() as cur:
+                cur.execute(self.stage_cmd)
+                cur.execute(self.prepare_cmd)
+            self.conn.commit()
+        return self.conn
 
     def create_byte_buffer(self) -> None:
-        self.insert = BytesIO()
-        self.insert.write(self.copy_header)
+        self.insert = CopyBuffer(self.columns)
         self.insert_count = 0
 
     def add_data(self, obj: ObjectRec) -> None:
         """Take an ObjectRec, pack it to bytes, then write to byte buffer."""
-        data = (15,
-                4, obj.id,
-                4, obj.session_id,
-                8, obj.last_seen,
-                4, obj.alive,
-                8, obj.lat,
-                8, obj.lon,
-                8, obj.alt,
-                8, obj.roll,
-                8, obj.pitch,
-                8, obj.yaw,
-                8, obj.u_coord,
-                8, obj.v_coord,
-                8, obj.heading,
-                8, obj.velocity_kts,
-                4, obj.updates)
-
-        packed = struct.pack(self.fmt_str, *data)
-        self.insert.write(packed)
+        self.insert.pack((obj.id, obj.session_id, obj.last_seen, obj.alive,
+                          obj.lat, obj.lon, obj.alt, obj.roll, obj.pitch,
+                          obj.yaw, obj.u_coord, obj.v_coord, obj.heading,
+                          obj.velocity_kts, obj.updates))
+        if not self.insert_count:
+            self.first_row_time = time.time()
         self.insert_count += 1
 
-    def insert_data(self) -> None:
-        """If data is in buffer, execute binary copy and update."""
+    def add_rows(self, store: ObjectStore, rows: np.ndarray) -> None:
+        """Pack the current state of rows of an ObjectStore, all at once."""
+        if not rows.shape[0]:
+            return
+        values = [store.cols[name][rows] for name in self.columns.keys()]
+        nulls = [val == NULL_INT if val.dtype.kind == 'i' else None
+                 for val in values]
+        if not self.insert_count:
+            self.first_row_time = time.time()
+        self.insert_count += self.insert.pack_columns(values, nulls)
+
+    def insert_data(self) -> bool:
+        """If data is in buffer, execute binary copy and update.
+
+        Returns True if the buffer was flushed.
+        """
         if self.min_insert_size > self.insert_count:
             LOG.debug("Not enough data for insert....")
-            return
+            return False
         LOG.debug(f'Inserting {self.insert_count} records...')
-        self.insert.write(self.copy_trailer)
-        self.insert.seek(0)
-        conn = pg.connect(self.dsn)
+        self.insert.finish()
+        start = t1 = time.time()
+        conn = self.connect()
+        t1 = self.time_phase('connect', t1)
         with conn.cursor() as cur:
-            cur.copy_expert(self.cmd, self.insert)
+            cur.copy_expert(self.copy_cmd, self.insert)
+            t1 = self.time_phase('copy', t1)
+            for phase, cmd in self.merge_cmds:
+                cur.execute(cmd)
+                t1 = self.time_phase(phase, t1)
         conn.commit()
-        conn.close()
-        self.insert.close()
-        self.create_byte_buffer()
+        end = self.time_phase('commit', t1)
+        self.event_times.append(end - start)
+        self.insert.reset()
+        self.insert_count = 0
+        return True
 
     def cleanup(self) -> None:
         """Shut down and ensure all data is written."""
         self.min_insert_size = -1 # ensure everything gets flushed
         self.insert_data()
+        if self.conn is not None:
+            self.conn.close()
+        self.db_event_time = sum(self.event_times)
+
+
+class AsyncBinCopyWriter(BinCopyWriter):
+    """Write events with asyncpg on pooled connections.
+
+    Buffers are double (or ring) buffered: each flush hands the filled
+    buffer to a queue of at most max_pending buffers and carries on filling
+    a recycled one, while max_in_flight background tasks COPY and merge
+    queued buffers.  When the queue is full, the parser either waits for
+    room (overflow='wait') or skips the flush and keeps filling the current
+    buffer until there is room (overflow='coalesce').  Deaths and impacts
+    passed to insert_data are applied by the same task, after the events
+    preceding them.  Connections of the pool must be set up by
+    init_connection.
+    """
+    @classmethod
+    async def init_connection(cls, conn) -> None:
+        """Create the staging table and merge statements on a connection.
+
+        Pass as the init argument of asyncpg.create_pool.
+        """
+        await conn.execute(cls.stage_cmd)
+        await conn.execute(cls.prepare_cmd)
+
+    def __init__(self, columns, pool, min_insert_size: int = -1,
+                 max_in_flight: int = 1, max_pending: int = 2,
+                 overflow: str = 'wait',
+                 policy: Optional[FlushPolicy] = None):
+        if overflow not in ['wait', 'coalesce']:
+            raise ValueError("Overflow must be wait or coalesce!")
+        self.free: List[CopyBuffer] = []
+        super().__init__(columns, None, min_insert_size)
+        self.pool = pool
+        self.max_in_flight = max_in_flight
+        self.overflow = overflow
+        self.policy = policy
+        self.draining = False
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.workers: List[asyncio.Task] = []
+        self.failures = 0
+        self.flushes = 0
+        self.coalesced = 0
+        self.buffer_wait_time = 0.0
+        self.buffer_wait_max = 0.0
+        self.rows_written = 0
+        self.staleness_total = 0.0
+        self.staleness_max = 0.0
+
+    @property
+    def pending(self) -> int:
+        """Number of buffers queued for flushing."""
+        return self.queue.qsize()
+
+    def ready(self) -> bool:
+        """Return True if the current buffer is due for a flush.
+
+        Without a policy, or while cleaning up, a buffer is due once it
+        holds min_insert_size rows.
+        """
+        if self.policy is None or self.draining:
+            return self.min_insert_size <= self.insert_count
+        return self.policy.should_flush(self.insert_count, len(self.insert),
+                                        self.first_row_time, time.time())
+
+    def create_byte_buffer(self) -> None:
+        """Start a new buffer, recycling a flushed one if available."""
+        if self.free:
+            self.insert = self.free.pop()
+            self.insert.reset()
+        else:
+            self.insert = CopyBuffer(self.columns)
+        self.insert_count = 0
+
+    async def insert_data(self,  # type: ignore
+                          pending: Optional[PendingWrites] = None) -> bool:
+        """If enough data is buffered, queue it for a background flush.
+
+        Returns True if the buffer was handed off.
+        """
+        if not self.ready():
+            LOG.debug("Not enough data for insert....")
+            return False
+        if self.overflow == 'coalesce' and self.queue.full():
+            self.coalesced += 1
+            return False
+        if not self.workers:
+            self.workers = [asyncio.ensure_future(self.run())
+                            for _ in range(self.max_in_flight)]
+
+        LOG.debug(f'Inserting {self.insert_count} records...')
+        self.insert.finish()
+        data = self.insert
+        rows, oldest = self.insert_count, self.first_row_time
+        after = pending.take() if pending else None
+        self.create_byte_buffer()
+
+        t1 = time.time()
+        await self.queue.put((data, rows, oldest, after))
+        waited = time.time() - t1
+        self.buffer_wait_time += waited
+        self.buffer_wait_max = max(self.buffer_wait_max, waited)
+        self.flushes += 1
+        return True
+
+    async def run(self) -> None:
+        while True:
+            data, rows, oldest, after = await self.queue.get()
+            try:
+                await self.copy(data, after, rows, oldest)
+            finally:
+                self.queue.task_done()
+
+    async def copy(self, data: CopyBuffer, after: Optional[PendingWrites],
+                   rows: int = 0, oldest: float = 0.0) -> None:
+        """COPY a buffer to the staging table, merge it, then apply deaths."""
+        start = t1 = time.time()
+        try:
+            async with self.pool.acquire() as conn:
+                t1 = self.time_phase('connect', t1)
+                async with conn.transaction():
+                    await conn.copy_to_table('event_stage',
+                                             source=data.view(),
+                                             format='binary')
+                    t1 = self.time_phase('copy', t1)
+                    for phase, cmd in self.merge_cmds:
+                        await conn.execute(cmd)
+                        t1 = self.time_phase(phase, t1)
+                    if after:
+                        await after.flush_dead(conn)
+                        t1 = self.time_phase('dead', t1)
+                        await after.flush_impacts(conn)
+                        t1 = self.time_phase('impacts', t1)
+                end = self.time_phase('commit', t1)
+            self.event_times.append(end - start)
+            if self.metrics:
+                self.metrics.observe('flush_seconds', end - start)
+            self.rows_written += rows
+            if rows:
+                staleness = end - oldest
+                self.staleness_total += staleness
+                self.staleness_max = max(self.staleness_max, staleness)
+            if self.policy:
+                self.policy.record(rows, end - start)
+        except Exception as err:  # pylint: disable=broad-except
+            self.failures += 1
+            if self.metrics:
+                self.metrics.inc('flush_failures')
+            LOG.error("Event flush failed!")
+            LOG.exception(err)
+        finally:
+            self.free.append(data)
+
+    async def wait(self) -> None:
+        """Wait for every queued and in flight flush to complete."""
+        await self.queue.join()
+
+    async def flush(self, pending: Optional[PendingWrites] = None) -> None:
+        """Write the current buffer, whatever its size, then pending."""
+        draining, self.draining = self.draining, True
+        min_insert_size, self.min_insert_size = self.min_insert_size, -1
+        try:
+            if self.insert_count:
+                # Make room first, so the buffer is never coalesced.
+                await self.wait()
+                await self.insert_data(pending)
+            await self.wait()
+        finally:
+            self.draining = draining
+            self.min_insert_size = min_insert_size
+        if pending and (pending.dead or pending.impacts):
+            async with self.pool.acquire() as conn:
+                await pending.flush(conn)
+
+    async def cleanup(self,  # type: ignore
+                      pending: Optional[PendingWrites] = None) -> None:
+        """Shut down and ensure all data is written."""
+        self.min_insert_size = -1
+        self.draining = True
+        await self.flush(pending)
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
         self.db_event_time = sum(self.event_times)
 
 
@@ -645,27 +1428,261 @@ async def consumer(host=HOST,
                    max_iters=None,
                    only_proc=False,
                    loop=None,
-                   bulk=False) -> None:
-    """Main method to consume stream."""
+                   bulk=False,
+                   frame_mode=False,
+                   chunk_size=None,
+                   attribution_workers=0,
+                   attribution_queue_size=10000,
+                   copy_concurrency=1,
+                   flush_queue_size=2,
+                   flush_overflow='wait',
+                   flush_max_latency=None,
+                   flush_target_rows=None,
+                   flush_target_bytes=None,
+                   compress=False,
+                   compress_position_tol=1.0,
+                   compress_keyframe_secs=10.0,
+                   event_range_secs=None,
+                   pool=None,
+                   stats: Optional[ConsumerStats] = None,
+                   reconnect=False,
+                   checkpoint_path=None,
+                   checkpoint_secs=60.0,
+                   metrics: Optional[Metrics] = None,
+                   metrics_port=None,
+                   metrics_json=None,
+                   sink=None,
+                   export_dir=None,
+                   export_rotate_secs=3600.0,
+                   export_rotate_bytes=256 * 1024 * 1024,
+                   export_float32=False,
+                   archive_path=None,
+                   archive_chunk_secs=60.0,
+                   live_port=None) -> None:
+    """Main method to consume stream.
+
+    If frame_mode is set, object lines are buffered until the next time
+    marker and parsed together by `frame_to_objs`, rather than one at a time
+    by `line_to_obj`.  If chunk_size is set, the socket is read in chunks of
+    that many bytes rather than a line at a time.  If attribution_workers is
+    set, parents and impacts are resolved by that many worker tasks, fed by a
+    queue of at most attribution_queue_size jobs.  Up to copy_concurrency
+    event flushes run in the background at once, behind a queue of at most
+    flush_queue_size filled buffers; flush_overflow sets whether the parser
+    waits for room ('wait') or keeps filling its buffer ('coalesce') when
+    that queue is full.  If flush_max_latency is set, events are flushed by a
+    FlushPolicy, once flush_target_rows rows or flush_target_bytes bytes are
+    buffered, or the oldest has waited flush_max_latency seconds; without
+    flush_target_rows, the row target adapts to COPY throughput.  Otherwise,
+    events are flushed at every time marker with at least 10 buffered.  If
+    compress is set, updates within compress_position_tol meters of their
+    dead reckoned position, with unchanged attitude and velocity, are not
+    written, except for a keyframe every compress_keyframe_secs.  If
+    event_range_secs is set, the event partition of the session is split
+    into ranges of last_seen that many seconds wide.
+
+    If pool is set, it is shared with other consumers, and used for all
+    writes rather than a pool and connection of this consumer's own; its
+    connections must be set up by AsyncBinCopyWriter.init_connection.  If
+    stats is set, it is updated at every time marker.
+
+    If reconnect is set, a dropped connection is reopened, and the session
+    and objects kept if the server is still in the same mission.  If
+    checkpoint_path is set, the Ref and its objects are saved there every
+    checkpoint_secs, and on exit, and restored from there on start.
+
+    Counters, gauges and per-frame histograms of the time spent reading the
+    socket, parsing, inserting objects, attributing and flushing events are
+    kept in metrics, or a Metrics of the consumer's own.  If metrics_port is
+    set, they are served there in the Prometheus text format.  If
+    metrics_json is set, they are dumped there as JSON on exit.
+
+    Everything is written through sink, by default a PostgresSink.  A sink
+    may also be given by a spec of `open_sink`, such as 'sqlite:data/dcs.db',
+    in which case it is closed on exit.
+
+    If export_dir is set, events are also exported there as Parquet files by
+    session, rotated every export_rotate_secs or export_rotate_bytes, with
+    attitude columns as float32 if export_float32 is set.  Requires pyarrow.
+
+    If archive_path is set, the raw stream is archived there, compressed in
+    chunks of archive_chunk_secs, with an index of the time offset of each,
+    by an ArchiveWriter.
+
+    If live_port is set, the state of alive objects is served there to the
+    coord server, by a LiveState versioned at every time marker.
+    """
     LOG.info("Starting consumer with settings: "
-             "debug: %s --  iters %s -- bulk-mode: %s", DEBUG, max_iters, bulk)
+             "debug: %s --  iters %s -- bulk-mode: %s -- frame-mode: %s "
+             "-- chunk-size: %s -- attribution-workers: %s -- "
+             "copy-concurrency: %s -- flush-queue: %s -- flush-overflow: %s",
+             DEBUG, max_iters, bulk, frame_mode, chunk_size,
+             attribution_workers, copy_concurrency, flush_queue_size,
+             flush_overflow)
     global DB
-    DB = await asyncpg.connect(PG_URL)
+    own_sink = isinstance(sink, str)
+    if own_sink:
+        sink = None if sink == 'postgres' else open_sink(sink)
+    own_pool = sink is None and pool is None
+    if own_pool:
+        DB = await asyncpg.connect(PG_URL)
+        pool = await asyncpg.create_pool(
+            PG_URL, min_size=1,
+            max_size=copy_concurrency + attribution_workers,
+            init=AsyncBinCopyWriter.init_connection)
+    elif pool is not None:
+        DB = pool
+    if sink is None:
+        sink = PostgresSink(DB, pool)
     tasks_complete = int(1)  # I know this is wrong.  It just makes division easier.
-    sock = AsyncSocketReader(host, port)
-    copy_writer = BinCopyWriter(Event.c, PG_URL, 10)
+    archive = None
+    if archive_path:
+        archive = ArchiveWriter(archive_path, chunk_secs=archive_chunk_secs,
+                                threaded=True)
+    sock = AsyncSocketReader(host, port, chunk_size=chunk_size,
+                             archive=archive)
+    sock.ref.event_range_secs = event_range_secs
+    sock.ref.sink = sink
+    policy = None
+    if flush_max_latency:
+        policy = FlushPolicy(flush_max_latency, flush_target_rows,
+                             flush_target_bytes)
+    copy_writer = sink.writer(min_insert_size=10,
+                              max_in_flight=copy_concurrency,
+                              max_pending=flush_queue_size,
+                              overflow=flush_overflow, policy=policy)
+    export = None
+    if export_dir:
+        export = event_exporter(export_dir, max_secs=export_rotate_secs,
+                                max_bytes=export_rotate_bytes,
+                                float32=export_float32)
+    attribution = None
+    if attribution_workers:
+        attribution = AttributionQueue(sink, attribution_workers,
+                                       attribution_queue_size)
+        attribution.start()
+        sock.ref.attribution = attribution
+    if checkpoint_path and load_checkpoint(sock.ref, checkpoint_path):
+        LOG.info("Checkpoint loaded from %s: session %s -- %d objects...",
+                 checkpoint_path, sock.ref.session_id, len(sock.ref.obj_store))
     await sock.open_connection()
     init_time = time.time()
+    last_checkpoint = init_time
     last_log = float(0.0)
     line_proc_time = float(0.0)
+    frame_proc_time = float(0.0)
+    read_time = float(0.0)
+
+    if metrics is None:
+        metrics = Metrics()
+    copy_writer.metrics = metrics
+    metrics.gauge('lines', lambda: tasks_complete)
+    metrics.gauge('objects', lambda: len(sock.ref.obj_store))
+    metrics.gauge('events_written', lambda: copy_writer.rows_written)
+    metrics.gauge('secs_ahead', lambda: sock.ref.time_offset - (
+        time.time() - init_time))
+    metrics.gauge('flush_queue', lambda: copy_writer.pending)
+    if attribution:
+        attribution.metrics = metrics
+        metrics.gauge('attribution_queue', lambda: attribution.depth)
+    live = None
+    live_server = None
+    if live_port:
+        live = LiveState(lambda: sock.ref)
+        live_server = await serve_live_state(live, port=live_port)
+        LOG.info("Serving live state on port %s...", live_port)
+    metrics_server = None
+    if metrics_port:
+        metrics_server = await serve_metrics([metrics], port=metrics_port)
+        LOG.info("Serving metrics on port %s...", metrics_port)
+    frame: List[bytes] = []
+    frame_rows: List[int] = []
+    compressor = None
+    if compress:
+        compressor = EventCompressor(sock.ref.obj_store,
+                                     position_tol=compress_position_tol,
+                                     keyframe_secs=compress_keyframe_secs)
+
+    def write_rows():
+        """Write rows updated in the current frame, after compression."""
+        rows = np.array(frame_rows, dtype=np.int64)
+        if compressor:
+            rows = compressor.filter(rows)
+        copy_writer.add_rows(sock.ref.obj_store, rows)
+        if export:
+            export.add_rows(sock.ref.obj_store, rows)
+        frame_rows.clear()
+
+    async def write_frame():
+        """Parse and write all lines buffered for the current frame."""
+        nonlocal line_proc_time
+        t1 = time.time()
+        objs = await frame_to_objs(frame, sock.ref)
+        line_proc_time += (time.time() - t1)
+        frame_rows.extend(obj.row for obj in objs)
+        write_rows()
+        frame.clear()
+
+    async def resume():
+        """Write everything parsed so far, and reconnect."""
+        nonlocal compressor
+        if frame:
+            await write_frame()
+        if frame_rows:
+            write_rows()
+        ref = sock.ref
+        await ref.pending.flush_objects(sink)
+        await sock.reconnect()
+        if sock.ref is not ref:
+            await copy_writer.flush(ref.pending)
+            if compressor:
+                compressor = EventCompressor(
+                    sock.ref.obj_store, position_tol=compress_position_tol,
+                    keyframe_secs=compress_keyframe_secs)
 
     while True:
         try:
-            obj = await sock.read_stream()
+            try:
+                t1 = time.time()
+                obj = await sock.read_stream()
+                read_time += time.time() - t1
+            except (asyncio.IncompleteReadError, ConnectionError) as err:
+                if not reconnect:
+                    raise
+                LOG.warning("Connection lost: %r...reconnecting...", err)
+                await resume()
+                continue
+
             if obj[0:1] == b"#":
+                if frame:
+                    await write_frame()
+                if frame_rows:
+                    write_rows()
                 sock.ref.update_time(obj)
+                if live:
+                    live.frame()
+                metrics.inc('frames')
+                metrics.observe('socket_read_seconds', read_time)
+                metrics.observe('parse_seconds',
+                                line_proc_time - frame_proc_time)
+                read_time, frame_proc_time = 0.0, line_proc_time
+                if sock.ref.pending.objects:
+                    t1 = time.time()
+                    await sock.ref.pending.flush_objects(sink)
+                    metrics.observe('object_insert_seconds', time.time() - t1)
                 if not bulk:
-                    copy_writer.insert_data()
+                    t1 = time.time()
+                    await copy_writer.insert_data(sock.ref.pending)
+                    metrics.observe('insert_wait_seconds', time.time() - t1)
+                if export:
+                    await export.insert_data()
+                if stats:
+                    stats.frame(sock.ref.time_offset, tasks_complete,
+                                copy_writer.rows_written)
+                if (checkpoint_path
+                        and time.time() - last_checkpoint > checkpoint_secs):
+                    save_checkpoint(sock.ref, checkpoint_path)
+                    last_checkpoint = time.time()
 
                 runtime = time.time() - init_time
                 log_check = runtime - last_log
@@ -676,18 +1693,39 @@ async def consumer(host=HOST,
                     LOG.info(
                         f"Runtime: {round(runtime, 2)} - Sec ahead: {round(secs_ahead, 2)}..."
                         f"Lines/sec: {ln_sec} - Total: {tasks_complete}")
+                    if attribution:
+                        LOG.info(
+                            "Attribution queue: %d - Resolved: %d - "
+                            "Dropped: %d - Mean latency: %.4f",
+                            attribution.depth, attribution.resolved,
+                            attribution.dropped, attribution.latency_mean)
+                    if compressor:
+                        LOG.info("Events compressed: %d - Written: %d - "
+                                 "Ratio: %.3f", compressor.dropped,
+                                 compressor.kept, compressor.ratio)
+                    LOG.info(
+                        "Flush queue: %d - Buffer wait: %.4f - "
+                        "Max buffer wait: %.4f - Coalesced: %d",
+                        copy_writer.pending, copy_writer.buffer_wait_time,
+                        copy_writer.buffer_wait_max, copy_writer.coalesced)
                     last_log = runtime
 
+            elif frame_mode:
+                frame.append(bytes(obj))
+                tasks_complete += 1
+
             else:
                 t1 = time.time()
                 obj = await line_to_obj(obj, sock.ref)
 
                 if obj:
                     line_proc_time += (time.time() - t1)
-                    if not obj.written:
-                        await create_single(obj)
-
-                    copy_writer.add_data(obj)
+                    if compressor:
+                        frame_rows.append(obj.row)
+                    else:
+                        copy_writer.add_data(obj)
+                        if export:
+                            export.add_data(obj)
 
                 tasks_complete += 1
 
@@ -697,7 +1735,35 @@ async def consumer(host=HOST,
 
         except (KeyboardInterrupt, MaxIterationsException,
                 ServerExitException, asyncio.IncompleteReadError):
-            copy_writer.cleanup()
+            if frame:
+                await write_frame()
+            if frame_rows:
+                write_rows()
+            await sock.ref.pending.flush_objects(sink)
+            if attribution:
+                await attribution.stop()
+                LOG.info('Attribution jobs resolved: %d -- dropped: %d -- '
+                         'mean latency: %.4f -- max latency: %.4f',
+                         attribution.resolved, attribution.dropped,
+                         attribution.latency_mean, attribution.latency_max)
+            await copy_writer.cleanup(sock.ref.pending)
+            if export:
+                await export.cleanup()
+                await export.sink.close()
+                LOG.info('Events exported: %d -- files: %d',
+                         export.rows_written,
+                         export.sink.events_writer.files_written)
+            if checkpoint_path:
+                save_checkpoint(sock.ref, checkpoint_path)
+            if archive:
+                archive.close()
+                LOG.info('Stream archived: %d chunks -- %d raw bytes -- '
+                         '%d compressed bytes', archive.chunks,
+                         archive.raw_bytes, archive.offset)
+            if own_pool:
+                await pool.close()
+            if own_sink:
+                await sink.close()
             await sock.close()
             total_time = time.time() - init_time
             LOG.info('Total iters : %s', str(tasks_complete))
@@ -705,6 +1771,28 @@ async def consumer(host=HOST,
             LOG.info('Pct Event Write Time: %.2f',
                      copy_writer.db_event_time / total_time)
             LOG.info('Pct Line Proc Time: %.2f', line_proc_time / total_time)
+            LOG.info('Pct Buffer Wait Time: %.2f',
+                     copy_writer.buffer_wait_time / total_time)
+            LOG.info('Events written: %d -- mean staleness: %.4f -- '
+                     'max staleness: %.4f', copy_writer.rows_written,
+                     copy_writer.staleness_total / max(
+                         len(copy_writer.event_times), 1),
+                     copy_writer.staleness_max)
+            for phase, secs in copy_writer.phase_times.items():
+                LOG.info('Event flush %s seconds: %.4f', phase, secs)
+            for name, hist in metrics.histograms.items():
+                LOG.info('%s -- count: %d -- mean: %.6f -- p50: %.6f -- '
+                         'p99: %.6f -- max: %.6f', name, hist.count,
+                         hist.mean, hist.percentile(50),
+                         hist.percentile(99), hist.max)
+            if metrics_json:
+                metrics.dump(metrics_json)
+            if metrics_server:
+                metrics_server.close()
+                await metrics_server.wait_closed()
+            if live_server:
+                live_server.close()
+                await live_server.wait_closed()
             LOG.info('Lines/second: %.4f', tasks_complete / total_time)
             total = {}
             for obj in sock.ref.obj_store.values():
@@ -737,7 +1825,12 @@ def check_results():
             FROM object""", conn)
     print(obj)
 
-def main(host, port, debug=False, max_iters=None, only_proc=False, bulk=False):
-    """Start event loop to consume stream."""
+def main(host, port, debug=False, max_iters=None, only_proc=False, bulk=False,
+         **kwargs):
+    """Start event loop to consume stream.
+
+    Any additional keyword arguments are passed through to `consumer`.
+    """
     loop = asyncio.get_event_loop()
-    asyncio.run(consumer(host, port, max_iters, only_proc, loop, bulk))
+    asyncio.run(consumer(host, port, max_iters, only_proc, loop, bulk,
+                         **kwargs))
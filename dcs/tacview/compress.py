@@ -0,0 +1,117 @@
+"""
+Dead reckoning compression of event rows.
+
+Most updates, especially of static ground units and ships, carry no new
+information.  For each object, the last row written and its rate of change
+since the row written before it are kept; an update is only written if its
+position, attitude or velocity has drifted beyond a tolerance of a linear
+extrapolation from that row.  Births, deaths and a keyframe every
+keyframe_secs are always written.
+"""
+import numpy as np
+
+from dcs.tacview.store import ObjectStore
+
+ATTITUDE_FIELDS = ('roll', 'pitch', 'yaw', 'heading')
+
+
+def wrap_degrees(delta: np.ndarray) -> np.ndarray:
+    """Wrap differences of angles, in degrees, to [-180, 180)."""
+    return (delta + 180.0) % 360.0 - 180.0
+
+
+class EventCompressor:
+    """Filter rows of an ObjectStore down to those worth writing.
+
+    Tolerances are in meters, for position, degrees, for attitude, and
+    knots, for velocity.
+    """
+    def __init__(self, store: ObjectStore,
+                 position_tol: float = 1.0,
+                 attitude_tol: float = 1.0,
+                 velocity_tol: float = 1.0,
+                 keyframe_secs: float = 10.0):
+        self.store = store
+        self.position_tol = position_tol
+        self.attitude_tol = attitude_tol
+        self.velocity_tol = velocity_tol
+        self.keyframe_secs = keyframe_secs
+        self.capacity = 0
+        self.time = np.empty(0, dtype=np.float64)
+        self.pos = np.empty((0, 3), dtype=np.float64)
+        self.pos_rate = np.empty((0, 3), dtype=np.float64)
+        self.att = np.empty((0, 4), dtype=np.float64)
+        self.att_rate = np.empty((0, 4), dtype=np.float64)
+        self.vel = np.empty(0, dtype=np.float64)
+        self.kept = 0
+        self.dropped = 0
+
+    def grow(self, capacity: int) -> None:
+        """Reallocate state to hold at least capacity rows."""
+        if capacity <= self.capacity:
+            return
+        for name in ['time', 'pos', 'pos_rate', 'att', 'att_rate', 'vel']:
+            old = getattr(self, name)
+            new = np.full((capacity,) + old.shape[1:], np.nan,
+                          dtype=old.dtype)
+            new[:self.capacity] = old
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    @property
+    def ratio(self) -> float:
+        """Share of rows written."""
+        total = self.kept + self.dropped
+        return self.kept / total if total else 1.0
+
+    def filter(self, rows: np.ndarray) -> np.ndarray:
+        """Return the rows to write, recording them as written."""
+        if not rows.shape[0]:
+            return rows
+        store = self.store
+        self.grow(store.capacity)
+
+        now = store.cols['last_seen'][rows]
+        pos = store.cart_coords[rows]
+        att = np.stack([store.cols[name][rows] for name in ATTITUDE_FIELDS],
+                       axis=1)
+        vel = store.cols['velocity_kts'][rows]
+
+        last_time = self.time[rows]
+        elapsed = now - last_time
+        pos_err = np.linalg.norm(
+            pos - self.pos[rows] - self.pos_rate[rows] * elapsed[:, None],
+            axis=1)
+        att_err = np.abs(wrap_degrees(
+            att - self.att[rows] - self.att_rate[rows] * elapsed[:, None]
+        )).max(axis=1)
+        vel_err = np.abs(vel - self.vel[rows])
+
+        # Comparisons with NaN are False, so rows never written, or with
+        # missing state, are kept.
+        same = ((pos_err <= self.position_tol)
+                & (att_err <= self.attitude_tol)
+                & (vel_err <= self.velocity_tol)
+                & (elapsed < self.keyframe_secs))
+        keep = ~same | (store.cols['alive'][rows] == 0)
+
+        kept = rows[keep]
+        elapsed = elapsed[keep]
+        moving = elapsed > 0
+        pos_rate = np.zeros((kept.shape[0], 3))
+        att_rate = np.zeros((kept.shape[0], 4))
+        pos_rate[moving] = ((pos[keep][moving] - self.pos[kept[moving]])
+                            / elapsed[moving, None])
+        att_rate[moving] = (wrap_degrees(att[keep][moving]
+                                         - self.att[kept[moving]])
+                            / elapsed[moving, None])
+        self.pos_rate[kept] = np.nan_to_num(pos_rate)
+        self.att_rate[kept] = np.nan_to_num(att_rate)
+        self.pos[kept] = pos[keep]
+        self.att[kept] = att[keep]
+        self.vel[kept] = vel[keep]
+        self.time[kept] = now[keep]
+
+        self.kept += kept.shape[0]
+        self.dropped += rows.shape[0] - kept.shape[0]
+        return kept
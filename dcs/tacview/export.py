@@ -0,0 +1,218 @@
+"""
+Rolling Parquet export of the event stream, for analytics.
+
+Event batches are written as Arrow record batches to Parquet files under
+root/session_id=<id>/, one open file per session, rotated once a file holds
+max_rows rows or max_bytes bytes, or has been open max_secs seconds.  Every
+open file is checked for age on each write, and the files of earlier
+sessions are closed as soon as a new session appears.  Files are written as .parquet.part and renamed when closed, so readers only ever
+see complete files.  Columns are those of the Event table, as serialized by
+BinCopyWriter; id columns are dictionary encoded, and with float32 set, the
+attitude columns are stored as float32.  Requires pyarrow.
+"""
+from asyncio.log import logging
+import glob
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from dcs.common.db import Event
+from dcs.tacview.sinks import Columns, SinkWriter, ThreadedSink
+from dcs.tacview.store import NULL_INT
+
+LOG = logging.getLogger('tacview-export')
+
+ID_COLUMNS = ('id', 'session_id')
+ATTITUDE_COLUMNS = ('roll', 'pitch', 'yaw', 'heading')
+PART_SUFFIX = '.part'
+
+
+def event_schema(float32: bool = False):
+    """Return the Arrow schema of exported events."""
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    fields = []
+    for name, col in Event.c.items():
+        if name in ID_COLUMNS:
+            type_ = pa.dictionary(pa.int32(), pa.int64())
+        elif str(col.type) == 'INTEGER':
+            type_ = pa.int64()
+        elif float32 and name in ATTITUDE_COLUMNS:
+            type_ = pa.float32()
+        else:
+            type_ = pa.float64()
+        fields.append((name, type_))
+    return pa.schema(fields)
+
+
+def session_dir(root: str, session_id: int) -> str:
+    return os.path.join(root, f"session_id={session_id}")
+
+
+class RollingEventWriter:
+    """Write event columns to rotated Parquet files, by session."""
+    def __init__(self, root: str, max_rows: int = 5000000,
+                 max_bytes: int = 256 * 1024 * 1024,
+                 max_secs: Optional[float] = 3600.0, float32: bool = False,
+                 compression: str = 'zstd'):
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+        self.pa = pa
+        self.pq = pq
+        self.root = root
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_secs = max_secs
+        self.compression = compression
+        self.schema = event_schema(float32)
+        self.files: Dict[int, dict] = {}
+        self.sessions: Set[int] = set()
+        self.files_written = 0
+        self.rows_written = 0
+
+    def batch(self, columns: Columns, rows: Optional[np.ndarray] = None):
+        """Return rows of columns as a record batch, with NULLs masked."""
+        arrays = []
+        for field in self.schema:
+            col = columns[field.name]
+            if rows is not None:
+                col = col[rows]
+            mask = np.isnan(col) if col.dtype.kind == 'f' else col == NULL_INT
+            if field.name in ID_COLUMNS:
+                arrays.append(self.pa.array(
+                    col, mask=mask,
+                    type=field.type.value_type).dictionary_encode())
+            else:
+                arrays.append(self.pa.array(
+                    col.astype(field.type.to_pandas_dtype()), mask=mask,
+                    type=field.type))
+        return self.pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def open(self, session_id: int) -> dict:
+        path = session_dir(self.root, session_id)
+        os.makedirs(path, exist_ok=True)
+        seq = len(glob.glob(os.path.join(path, 'events-*.parquet*')))
+        filename = os.path.join(path, f"events-{seq:05d}.parquet")
+        LOG.info("Opening event export file %s...", filename)
+        return {'path': filename, 'rows': 0, 'bytes': 0,
+                'opened': time.time(),
+                'writer': self.pq.ParquetWriter(
+                    filename + PART_SUFFIX, self.schema,
+                    compression=self.compression)}
+
+    def rotate(self, session_id: int) -> None:
+        """Close the open file of a session, making it visible to readers."""
+        file_ = self.files.pop(session_id, None)
+        if file_:
+            file_['writer'].close()
+            os.replace(file_['path'] + PART_SUFFIX, file_['path'])
+            self.files_written += 1
+
+    def due(self, file_: dict) -> bool:
+        return (file_['rows'] >= self.max_rows
+                or file_['bytes'] >= self.max_bytes
+                or (self.max_secs is not None
+                    and time.time() - file_['opened'] >= self.max_secs))
+
+    def expire(self) -> None:
+        """Close every file open for max_secs, whether written to or not."""
+        if self.max_secs is None:
+            return
+        now = time.time()
+        for session_id, file_ in list(self.files.items()):
+            if now - file_['opened'] >= self.max_secs:
+                self.rotate(session_id)
+
+    def write(self, columns: Columns) -> None:
+        """Write a batch of event columns, split by session_id."""
+        session_ids = columns['session_id']
+        unique = np.unique(session_ids)
+        batch_sessions = set(unique.tolist())
+        if not batch_sessions <= self.sessions:
+            # Earlier sessions see no more events once a new one starts.
+            for session_id in set(self.files) - batch_sessions:
+                self.rotate(session_id)
+            self.sessions |= batch_sessions
+        for session_id in unique.tolist():
+            rows = None
+            if unique.shape[0] > 1:
+                rows = np.flatnonzero(session_ids == session_id)
+            batch = self.batch(columns, rows)
+            file_ = self.files.get(session_id)
+            if file_ is None:
+                file_ = self.files[session_id] = self.open(session_id)
+            file_['writer'].write_batch(batch)
+            file_['rows'] += batch.num_rows
+            file_['bytes'] += batch.nbytes
+            self.rows_written += batch.num_rows
+            if self.due(file_):
+                self.rotate(session_id)
+        self.expire()
+
+    def close(self) -> None:
+        for session_id in list(self.files):
+            self.rotate(session_id)
+
+
+class EventExportSink(ThreadedSink):
+    """Sink of events alone, exported by a RollingEventWriter.
+
+    Fed by its own SinkWriter alongside the writer of the main sink, so
+    events are exported whatever the sink of the consumer.
+    """
+    def __init__(self, root: str, **kwargs):
+        super().__init__()
+        self.events_writer = RollingEventWriter(root, **kwargs)
+
+    def events(self, columns: Columns) -> None:
+        self.events_writer.write(columns)
+
+    def close_sync(self) -> None:
+        self.events_writer.close()
+
+
+def event_exporter(root: str, batch_rows: int = 65536,
+                   **kwargs) -> SinkWriter:
+    """Return a writer exporting events to root, once batch_rows are
+    buffered, with the RollingEventWriter options of kwargs.
+    """
+    return SinkWriter(EventExportSink(root, **kwargs),
+                      min_insert_size=batch_rows)
+
+
+def list_sessions(root: str) -> List[int]:
+    """Return the session_ids exported to root."""
+    return sorted(int(path.rsplit('=', 1)[1]) for path
+                  in glob.glob(os.path.join(root, 'session_id=*')))
+
+
+def read_session(root: str, session_id: int,
+                 columns: Optional[List[str]] = None,
+                 start: Optional[float] = None, end: Optional[float] = None,
+                 categorical: bool = False):
+    """Load the exported events of a session as a DataFrame.
+
+    Only complete files are read.  Rows may be limited to last_seen within
+    [start, end).  Id columns are decoded to plain integers by pyarrow, and
+    returned as categoricals if categorical is set.
+    """
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+    files = sorted(glob.glob(os.path.join(session_dir(root, session_id),
+                                          'events-*.parquet')))
+    if not files:
+        raise FileNotFoundError(
+            f"No events exported for session {session_id} in {root}!")
+    filters = []
+    if start is not None:
+        filters.append(('last_seen', '>=', start))
+    if end is not None:
+        filters.append(('last_seen', '<', end))
+    dataset = pq.ParquetDataset(files, filters=filters or None,
+                                partitioning=None)
+    frame = dataset.read(columns=columns).to_pandas()
+    if categorical:
+        for name in ID_COLUMNS:
+            if name in frame:
+                frame[name] = frame[name].astype('category')
+    return frame
@@ -0,0 +1,57 @@
+"""
+Adaptive flush policy for event writes.
+
+A buffer is flushed once it holds a target number of rows or bytes, or once
+its oldest row has waited max_latency seconds.  Unless a fixed row target is
+given, the row target adapts to the observed COPY throughput, so that a
+flush is expected to take a fraction of max_latency: large batches when the
+database keeps up, and small ones when it does not.
+"""
+from typing import Optional
+
+
+class FlushPolicy:
+    """Decide when a buffer of events should be flushed."""
+    def __init__(self,
+                 max_latency: float = 1.0,
+                 target_rows: Optional[int] = None,
+                 target_bytes: Optional[int] = None,
+                 min_rows: int = 10,
+                 max_rows: int = 100000,
+                 copy_share: float = 0.5,
+                 smoothing: float = 0.2):
+        if max_latency <= 0:
+            raise ValueError("Max latency must be positive!")
+        self.max_latency = max_latency
+        self.adaptive = target_rows is None
+        self.target_rows = target_rows if target_rows else min_rows
+        self.target_bytes = target_bytes
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.copy_share = copy_share
+        self.smoothing = smoothing
+        self.rows_per_sec: Optional[float] = None
+
+    def should_flush(self, rows: int, nbytes: int, oldest: float,
+                     now: float) -> bool:
+        """Return True if a buffer of rows, first filled at oldest, is due."""
+        if not rows:
+            return False
+        if rows >= self.target_rows:
+            return True
+        if self.target_bytes and nbytes >= self.target_bytes:
+            return True
+        return now - oldest >= self.max_latency
+
+    def record(self, rows: int, secs: float) -> None:
+        """Update observed throughput with a completed flush."""
+        if rows <= 0 or secs <= 0:
+            return
+        rate = rows / secs
+        if self.rows_per_sec is None:
+            self.rows_per_sec = rate
+        else:
+            self.rows_per_sec += self.smoothing * (rate - self.rows_per_sec)
+        if self.adaptive:
+            target = int(self.rows_per_sec * self.max_latency * self.copy_share)
+            self.target_rows = min(max(target, self.min_rows), self.max_rows)
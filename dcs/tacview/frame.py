@@ -0,0 +1,167 @@
+"""
+Frame-at-a-time ACMI parsing.
+
+All object lines between two `#` time markers are parsed in one pass, with
+the transform (T=) fields of every line converted to floats in a single
+NumPy call rather than one `float()` per coordinate.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+COORD_COLS = ('lon', 'lat', 'alt', 'roll', 'pitch', 'yaw', 'u_coord',
+              'v_coord', 'heading')
+N_COORDS = len(COORD_COLS)
+
+# Tacview transforms come in four layouts, distinguished by field count:
+#   3: lon|lat|alt
+#   5: lon|lat|alt|u|v
+#   6: lon|lat|alt|roll|pitch|yaw
+#   9: lon|lat|alt|roll|pitch|yaw|u|v|heading
+EMPTY = b''
+PAD_3 = [EMPTY] * 6
+PAD_5 = [EMPTY] * 3
+PAD_6 = [EMPTY] * 3
+
+PROP_KEYS = {
+    b'Name': 'Name',
+    b'Color': 'Color',
+    b'Country': 'Country',
+    b'Group': 'grp',
+    b'Pilot': 'Pilot',
+    b'Type': 'Type',
+    b'Coalition': 'Coalition',
+}
+
+
+class FrameColumns:
+    """Columnar representation of every object update in a single frame."""
+    __slots__ = ['ids', 'coords', 'present', 'props', 'removed']
+
+    def __init__(self, ids, coords, present, props, removed):
+        self.ids: np.ndarray = ids
+        self.coords: np.ndarray = coords
+        self.present: np.ndarray = present
+        self.props: List[Tuple[int, str, str]] = props
+        self.removed: List[int] = removed
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    def col(self, key: str) -> np.ndarray:
+        """Return a single coordinate column by name."""
+        return self.coords[:, COORD_COLS.index(key)]
+
+    @property
+    def lon(self):
+        return self.coords[:, 0]
+
+    @property
+    def lat(self):
+        return self.coords[:, 1]
+
+    @property
+    def alt(self):
+        return self.coords[:, 2]
+
+    @property
+    def roll(self):
+        return self.coords[:, 3]
+
+    @property
+    def pitch(self):
+        return self.coords[:, 4]
+
+    @property
+    def yaw(self):
+        return self.coords[:, 5]
+
+    @property
+    def u(self):
+        return self.coords[:, 6]
+
+    @property
+    def v(self):
+        return self.coords[:, 7]
+
+    @property
+    def heading(self):
+        return self.coords[:, 8]
+
+
+def split_transform(transform: bytes, tokens: List[bytes]) -> None:
+    """Split a T= value and append exactly N_COORDS tokens to tokens."""
+    parts = transform.split(b'|')
+    n_parts = len(parts)
+    if n_parts == N_COORDS:
+        tokens.extend(parts)
+    elif n_parts == 3:
+        tokens.extend(parts)
+        tokens.extend(PAD_3)
+    elif n_parts == 6:
+        tokens.extend(parts)
+        tokens.extend(PAD_6)
+    elif n_parts == 5:
+        tokens.extend(parts[0:3])
+        tokens.extend(PAD_5)
+        tokens.extend(parts[3:5])
+        tokens.append(EMPTY)
+    else:
+        parts = parts[0:N_COORDS]
+        tokens.extend(parts)
+        tokens.extend([EMPTY] * (N_COORDS - len(parts)))
+
+
+def parse_frame(lines: List[bytes]) -> FrameColumns:
+    """Parse every object line of a single frame into NumPy columns.
+
+    Global (`0,`) lines are skipped, `-<id>` lines are collected as removals,
+    and all other lines yield one row.  Coordinates that are absent from a
+    line are NaN in `coords` and False in `present`.
+    """
+    ids: List[int] = []
+    tokens: List[bytes] = []
+    props: List[Tuple[int, str, str]] = []
+    removed: List[int] = []
+
+    for line in lines:
+        first = line[0:1]
+        if first == b'0' or first == b'' or first == b'#':
+            continue
+        if first == b'-':
+            removed.append(int(line[1:], 16))
+            continue
+
+        fields = line.split(b',')
+        row = len(ids)
+        ids.append(int(fields[0], 16))
+        has_transform = False
+        for field in fields[1:]:
+            if field[0:2] == b'T=':
+                split_transform(field[2:], tokens)
+                has_transform = True
+                continue
+            eq_loc = field.find(b'=')
+            key = PROP_KEYS.get(field[0:eq_loc])
+            if key is not None:
+                props.append((row, key, field[eq_loc + 1:].decode('UTF-8')))
+
+        if not has_transform:
+            tokens.extend([EMPTY] * N_COORDS)
+
+    n_rows = len(ids)
+    if not n_rows:
+        return FrameColumns(np.empty(0, dtype=np.int64),
+                            np.empty((0, N_COORDS), dtype=np.float64),
+                            np.empty((0, N_COORDS), dtype=bool),
+                            props, removed)
+
+    raw = np.array(tokens, dtype=np.bytes_)
+    present = raw != EMPTY
+    coords = np.full(raw.shape, np.nan, dtype=np.float64)
+    coords[present] = raw[present].astype(np.float64)
+
+    return FrameColumns(np.array(ids, dtype=np.int64),
+                        coords.reshape(n_rows, N_COORDS),
+                        present.reshape(n_rows, N_COORDS),
+                        props, removed)
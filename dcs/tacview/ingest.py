@@ -0,0 +1,284 @@
+"""
+Offline ingest of recorded ACMI files.
+
+The file is split at frame boundaries into chunks of roughly chunk_size
+bytes, and chunks are parsed into FrameColumns on a pool of processes.
+Plain files are memory mapped by each worker; gzipped files are decompressed
+as a stream in the main process and their chunks sent to workers.  Parsed
+frames are applied to a single Ref in file order, so velocities, parents and
+impacts are resolved exactly as they would be over a socket, whatever the
+number of workers.
+
+Stream archives, with an index, are read by their indexed chunks instead,
+each decompressed by a worker, and may be ingested from any time offset
+without decompressing what comes before it.
+"""
+import asyncio
+from asyncio.log import logging
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+import gzip
+import mmap
+import os
+import time
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+import asyncpg
+import numpy as np
+
+from dcs.common import get_logger
+from dcs.common.db import PG_URL
+from dcs.tacview import archive, client
+from dcs.tacview.compress import EventCompressor
+from dcs.tacview.flush import FlushPolicy
+from dcs.tacview.frame import FrameColumns, parse_frame
+from dcs.tacview.stream import split_lines
+
+LOG = get_logger(logging.getLogger('tacview-ingest'))
+LOG.setLevel(logging.INFO)
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+FRAME_START = b'\n#'
+
+Frame = Tuple[bytes, FrameColumns]
+
+
+def is_gzip(path: str) -> bool:
+    return path.endswith('.gz')
+
+
+def split_header(data: bytes) -> Tuple[List[bytes], int]:
+    """Return the lines before the first frame, and the offset of that frame.
+
+    Data may be bytes or a memory map.
+    """
+    if data[:1] == b'#':
+        return [], 0
+    start = data.find(FRAME_START)
+    end = len(data) if start == -1 else start + 1
+    lines = [line.rstrip(b'\r') for line in split_lines(data[:end])]
+    return [line for line in lines if line], end
+
+
+def frame_bounds(data, start: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) offsets of chunks of data, split before a frame."""
+    size = len(data)
+    while start < size:
+        end = data.find(FRAME_START, start + chunk_size)
+        end = size if end == -1 else end + 1
+        yield start, end
+        start = end
+
+
+def parse_chunk(data: bytes) -> List[Frame]:
+    """Parse every frame in data, which must start with a time marker.
+
+    Returns (time marker, frame) for each frame, in order.
+    """
+    frames: List[Frame] = []
+    marker = None
+    lines: List[bytes] = []
+    for line in split_lines(data):
+        line = line.rstrip(b'\r')
+        if line[0:1] == b'#':
+            if marker is not None:
+                frames.append((marker, parse_frame(lines)))
+            marker, lines = line, []
+        elif line:
+            lines.append(line)
+    if marker is not None:
+        frames.append((marker, parse_frame(lines)))
+    return frames
+
+
+def parse_archive_chunk(path: str, entry: archive.Entry) -> List[Frame]:
+    """Decompress and parse an indexed chunk of a stream archive."""
+    return parse_chunk(archive.read_chunk(path, entry))
+
+
+def parse_file_chunk(path: str, start: int, end: int) -> List[Frame]:
+    """Memory map a plain file and parse the chunk between start and end."""
+    with open(path, 'rb') as fp_:
+        with mmap.mmap(fp_.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return parse_chunk(data[start:end])
+
+
+def read_header(path: str, segment: int = 0) -> List[bytes]:
+    """Return the header lines of a file, before its first frame."""
+    if archive.has_index(path):
+        return archive.ArchiveReader(path).header(segment)
+    opener = gzip.open if is_gzip(path) else open
+    with opener(path, 'rb') as fp_:
+        data = fp_.read(64 * 1024)
+        while FRAME_START not in data and data[:1] != b'#':
+            more = fp_.read(64 * 1024)
+            if not more:
+                break
+            data += more
+    return split_header(data)[0]
+
+
+def iter_gzip_chunks(path: str, chunk_size: int) -> Iterator[bytes]:
+    """Decompress a file as a stream, yielding chunks split before a frame."""
+    with gzip.open(path, 'rb') as fp_:
+        data = fp_.read(chunk_size)
+        _, start = split_header(data)
+        data = data[start:]
+        while True:
+            more = fp_.read(chunk_size)
+            data += more
+            end = data.rfind(FRAME_START)
+            if not more:
+                break
+            if end > 0:
+                yield data[:end + 1]
+                data = data[end + 1:]
+        if data:
+            yield data
+
+
+def executor_workers(executor: Executor) -> int:
+    """Return the number of workers of an executor, or of CPUs if unknown."""
+    return getattr(executor, '_max_workers', None) or os.cpu_count() or 1
+
+
+async def read_frames(path: str, executor: Executor,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      ahead: Optional[int] = None,
+                      start: Optional[float] = None,
+                      end: Optional[float] = None,
+                      segment: int = 0) -> AsyncIterator[Frame]:
+    """Parse a file on executor, yielding its frames in order.
+
+    At most ahead chunks, by default twice the workers of executor, are
+    parsed ahead of the one being yielded, so every worker is kept busy.
+    Only frames with time offset in [start, end) are yielded; archives are
+    read from the chunk holding start, and other files from their beginning.
+    """
+    loop = asyncio.get_event_loop()
+    if ahead is None:
+        ahead = 2 * executor_workers(executor)
+    if archive.has_index(path):
+        reader = archive.ArchiveReader(path)
+        entries = (reader.chunks(segment) if start is None
+                   else reader.seek(start, segment))
+        jobs: Iterator = ((parse_archive_chunk, path, entry)
+                          for entry in entries
+                          if end is None or entry[1] < end)
+    elif is_gzip(path):
+        jobs = ((parse_chunk, chunk)
+                for chunk in iter_gzip_chunks(path, chunk_size))
+    else:
+        with open(path, 'rb') as fp_:
+            with mmap.mmap(fp_.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                _, offset = split_header(data)
+                bounds = list(frame_bounds(data, offset, chunk_size))
+        jobs = ((parse_file_chunk, path, lo, hi) for lo, hi in bounds)
+
+    def in_range(marker: bytes) -> bool:
+        time_offset = float(marker[1:])
+        return ((start is None or time_offset >= start)
+                and (end is None or time_offset < end))
+
+    pending: deque = deque()
+    for job in jobs:
+        pending.append(loop.run_in_executor(executor, *job))
+        if len(pending) < ahead:
+            continue
+        for frame in await pending.popleft():
+            if in_range(frame[0]):
+                yield frame
+    while pending:
+        for frame in await pending.popleft():
+            if in_range(frame[0]):
+                yield frame
+
+
+async def ingest_file(path: str, executor: Executor, sink,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      copy_concurrency: int = 1,
+                      flush_rows: int = 100000,
+                      compress: bool = False,
+                      start: Optional[float] = None,
+                      end: Optional[float] = None,
+                      segment: int = 0,
+                      ahead: Optional[int] = None) -> client.Ref:
+    """Ingest one file, as its own session, returning its Ref.
+
+    Sink may be a Sink, or an asyncpg pool.  Objects are keyed by session,
+    so files whose ids overlap may be ingested into one database.
+    Only frames in [start, end) are ingested, of the given segment if the
+    file is a stream archive.  At most ahead chunks are parsed ahead of the
+    frames being applied.
+    """
+    t1 = time.time()
+    sink = client.as_sink(sink)
+    ref = client.Ref()
+    ref.sink = sink
+    for line in read_header(path, segment):
+        if line[0:2] == b"0,":
+            await ref.parse_ref_obj(line)
+    if not ref.all_refs:
+        LOG.warning("Not all references found in header of %s!", path)
+
+    writer = sink.writer(
+        10, policy=FlushPolicy(max_latency=10.0, target_rows=flush_rows),
+        max_in_flight=copy_concurrency)
+    compressor = None
+    if compress:
+        compressor = EventCompressor(ref.obj_store)
+
+    n_frames = 0
+    async for marker, frame in read_frames(path, executor, chunk_size,
+                                           ahead, start=start, end=end,
+                                           segment=segment):
+        ref.update_time(marker)
+        recs = await client.apply_frame(frame, ref)
+        rows = np.array([rec.row for rec in recs], dtype=np.int64)
+        if compressor:
+            rows = compressor.filter(rows)
+        writer.add_rows(ref.obj_store, rows)
+        await ref.pending.flush_objects(sink)
+        await writer.insert_data(ref.pending)
+        n_frames += 1
+
+    await ref.pending.flush_objects(sink)
+    await writer.cleanup(ref.pending)
+    LOG.info("Ingested %s -- session %s -- %d frames -- %d objects -- "
+             "%d events -- %.2f secs", path, ref.session_id, n_frames,
+             len(ref.obj_store), writer.rows_written, time.time() - t1)
+    return ref
+
+
+async def ingest(paths: List[str],
+                 workers: Optional[int] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 copy_concurrency: int = 1,
+                 flush_rows: int = 100000,
+                 compress: bool = False,
+                 start: Optional[float] = None,
+                 end: Optional[float] = None,
+                 segment: int = 0) -> None:
+    """Ingest each file in turn, sharing one process pool and connection pool.
+
+    Twice as many chunks as workers are parsed ahead of those applied.
+    """
+    workers = workers or os.cpu_count() or 1
+    client.DB = await asyncpg.connect(PG_URL)
+    pool = await asyncpg.create_pool(
+        PG_URL, min_size=1, max_size=copy_concurrency,
+        init=client.AsyncBinCopyWriter.init_connection)
+    sink = client.PostgresSink(client.DB, pool)
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            for path in paths:
+                await ingest_file(path, executor, sink, chunk_size,
+                                  copy_concurrency, flush_rows, compress,
+                                  start, end, segment, ahead=2 * workers)
+    finally:
+        await pool.close()
+        await client.DB.close()
+
+
+def main(paths: List[str], **kwargs) -> None:
+    asyncio.run(ingest(paths, **kwargs))
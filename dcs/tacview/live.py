@@ -0,0 +1,177 @@
+"""
+Live state of the objects of a consumer, served over a local socket.
+
+The coord server reads alive objects from here rather than the database, so
+its requests never wait on ingest.  The consumer bumps the version of its
+LiveState at every time marker; a snapshot is only built when requested,
+at most once per version, and a client already holding the current version
+gets an empty reply.
+
+Versions are '<start>:<frame>', of the time in milliseconds the LiveState
+was created and the frames since, so no two consumers ever share one.
+Requests are a single line, answered by a line of '<version> <length>',
+then length bytes of JSON:
+
+    snapshot <version>    alive objects, unless version is current
+    status <id>,<id>,...  [alive, name] of each id found
+"""
+import asyncio
+from asyncio.log import logging
+import json
+import math
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dcs.common import config
+
+LOG = logging.getLogger('tacview-live')
+
+# Keys of snapshot objects, as columns of the object table, to store fields.
+STR_COLUMNS = {'name': 'Name', 'pilot': 'Pilot', 'type': 'Type',
+               'grp': 'grp', 'coalition': 'Coalition', 'color': 'Color',
+               'country': 'Country'}
+FLOAT_COLUMNS = ('lat', 'lon', 'alt', 'heading', 'velocity_kts',
+                 'first_seen', 'last_seen')
+
+
+def snapshot(store) -> List[dict]:
+    """Return a dict of each alive object of a store.
+
+    Missing strings are '', as in the object table, and platform is the
+    name of the object.
+    """
+    rows = np.flatnonzero(store.col('alive') == 1)
+    lookup = store.strings.lookup
+    cols = {'id': store.col('id')[rows].tolist()}
+    for key, name in STR_COLUMNS.items():
+        cols[key] = [lookup(code) or ''
+                     for code in store.col(name)[rows].tolist()]
+    for name in FLOAT_COLUMNS:
+        cols[name] = [None if math.isnan(val) else val
+                      for val in store.col(name)[rows].tolist()]
+    cols['platform'] = cols['name']
+    keys = list(cols) + ['alive']
+    return [dict(zip(keys, vals + (1,))) for vals in zip(*cols.values())]
+
+
+class LiveState:
+    """Versioned state of the Ref returned by get_ref.
+
+    Versions are prefixed by the time the state was created, so a client
+    never mistakes the state of a restarted consumer for the one it holds,
+    however many frames either has seen.
+    """
+    def __init__(self, get_ref: Callable):
+        self.get_ref = get_ref
+        self.start = int(time.time() * 1000)
+        self.frames = 0
+        self.built_version: Optional[str] = None
+        self.built = b''
+        self.builds = 0
+        self.requests = 0
+
+    @property
+    def version(self) -> str:
+        return f"{self.start}:{self.frames}"
+
+    def frame(self) -> None:
+        self.frames += 1
+
+    def snapshot(self) -> bytes:
+        """Return the JSON snapshot of the current version."""
+        if self.built_version != self.version:
+            ref = self.get_ref()
+            self.built = json.dumps({
+                'version': self.version,
+                'session_id': ref.session_id,
+                'time_offset': ref.time_offset,
+                'objects': snapshot(ref.obj_store),
+            }).encode()
+            self.built_version = self.version
+            self.builds += 1
+        return self.built
+
+    def status(self, ids: List[int]) -> bytes:
+        store = self.get_ref().obj_store
+        found = {}
+        for id_ in ids:
+            rec = store.get(id_)
+            if rec is not None:
+                found[id_] = [int(rec.alive), rec.Name]
+        return json.dumps(found).encode()
+
+    def respond(self, request: bytes) -> bytes:
+        kind, _, arg = request.decode().strip().partition(' ')
+        if kind == 'snapshot':
+            body = b'' if arg == self.version else self.snapshot()
+        elif kind == 'status':
+            body = self.status([int(id_) for id_ in arg.split(',') if id_])
+        else:
+            raise ValueError(f"Unknown live state request: {kind}!")
+        return f"{self.version} {len(body)}\n".encode() + body
+
+
+async def serve_live_state(state: LiveState, host: str = config.LIVE_HOST,
+                           port: int = config.LIVE_PORT
+                           ) -> asyncio.AbstractServer:
+    """Serve the live state of a consumer, one request per connection."""
+    async def handle(reader, writer):
+        try:
+            state.requests += 1
+            writer.write(state.respond(await reader.readline()))
+            await writer.drain()
+        except (ConnectionError, ValueError) as err:
+            LOG.warning("Live state request failed: %r", err)
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+class LiveStateClient:
+    """Fetch the live state of a consumer, keeping the last snapshot.
+
+    Safe to share between threads, as by the handlers of a web server.
+    Raises OSError if no consumer is serving live state.
+    """
+    def __init__(self, host: str = config.LIVE_HOST,
+                 port: int = config.LIVE_PORT, timeout: float = 1.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.version: Optional[str] = None
+        self.state: Optional[dict] = None
+        self.lock = threading.Lock()
+
+    def request(self, line: str) -> Tuple[str, bytes]:
+        with socket.create_connection((self.host, self.port),
+                                      self.timeout) as sock:
+            sock.sendall(line.encode() + b"\n")
+            with sock.makefile('rb') as fp_:
+                header = fp_.readline().split()
+                if len(header) != 2:
+                    raise ConnectionError("Incomplete live state reply!")
+                body = fp_.read(int(header[1]))
+        return header[0].decode(), body
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            version, body = self.request(f"snapshot {self.version}")
+            if body:
+                self.state = json.loads(body)
+                self.version = version
+            return self.state
+
+    def objects(self) -> List[dict]:
+        """Return a dict of each alive object."""
+        return self.snapshot()['objects']
+
+    def status(self, ids: List[int]) -> Dict[int, Tuple[int, str]]:
+        """Return (alive, name) of each id known to the consumer."""
+        _, body = self.request(
+            "status " + ','.join(str(id_) for id_ in ids))
+        return {int(id_): tuple(val) for id_, val in json.loads(body).items()}
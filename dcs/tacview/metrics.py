@@ -0,0 +1,233 @@
+"""
+Runtime metrics of tacview consumers.
+
+Metrics are served in the Prometheus text format by `serve_metrics`, and
+may be dumped as JSON.
+"""
+import asyncio
+import json
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class ConsumerStats:
+    """Throughput and lag of one consumer.
+
+    Lag is how far the consumer has fallen behind the stream since its first
+    frame: the wall time elapsed, less the stream time elapsed.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.lines = 0
+        self.frames = 0
+        self.events = 0
+        self.restarts = 0
+        self.time_offset = 0.0
+        self.first_offset: Optional[float] = None
+        self.first_frame: Optional[float] = None
+        self.last_frame: Optional[float] = None
+
+    def frame(self, time_offset: float, lines: int, events: int) -> None:
+        """Record a time marker, with running totals of lines and events."""
+        now = time.time()
+        if self.first_frame is None:
+            self.first_frame = now
+            self.first_offset = time_offset
+        self.last_frame = now
+        self.time_offset = time_offset
+        self.lines = lines
+        self.events = events
+        self.frames += 1
+
+    @property
+    def lines_per_sec(self) -> float:
+        return self.lines / max(time.time() - self.started, 1e-9)
+
+    @property
+    def lag(self) -> float:
+        if self.first_frame is None:
+            return 0.0
+        return ((time.time() - self.first_frame)
+                - (self.time_offset - self.first_offset))
+
+    def summary(self) -> str:
+        return (f"{self.name}: lines/sec: {self.lines_per_sec:.2f} -- "
+                f"frames: {self.frames} -- events: {self.events} -- "
+                f"lag: {self.lag:.2f} -- restarts: {self.restarts}")
+
+
+class Histogram:
+    """Log-linear histogram of positive values, in the style of HDR.
+
+    Each power of two from lowest up is split into sub_buckets linear
+    buckets, so any value up to highest is recorded to within 1/sub_buckets
+    of itself, at a fixed cost in memory and time per value.  Values below
+    lowest fall in the first bucket, those above highest in the last.
+    """
+    def __init__(self, lowest: float = 1e-6, highest: float = 1e3,
+                 sub_buckets: int = 16):
+        self.lowest = lowest
+        self.sub_buckets = sub_buckets
+        self.powers = math.ceil(math.log2(highest / lowest)) + 1
+        self.counts = [0] * (self.powers * sub_buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def index(self, value: float) -> int:
+        if value < self.lowest:
+            return 0
+        mant, exp = math.frexp(value / self.lowest)
+        idx = (exp - 1) * self.sub_buckets + int(
+            (mant * 2.0 - 1.0) * self.sub_buckets)
+        return min(idx, len(self.counts) - 1)
+
+    def upper(self, idx: int) -> float:
+        """Return the upper bound of bucket idx."""
+        power, sub = divmod(idx, self.sub_buckets)
+        return self.lowest * 2.0 ** power * (1.0 + (sub + 1) / self.sub_buckets)
+
+    def record(self, value: float) -> None:
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, pct: float) -> float:
+        """Return the upper bound of the bucket holding the pct percentile."""
+        if not self.count:
+            return 0.0
+        rank = max(math.ceil(self.count * pct / 100.0), 1)
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if idx == len(self.counts) - 1:
+                    return self.max
+                return min(self.upper(idx), self.max)
+        return self.max
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """Return (upper bound, count at or below) at each power of two."""
+        bounds = []
+        seen = 0
+        for power in range(self.powers):
+            start = power * self.sub_buckets
+            seen += sum(self.counts[start:start + self.sub_buckets])
+            bounds.append((self.lowest * 2.0 ** (power + 1), seen))
+        return bounds
+
+    def summary(self) -> Dict[str, float]:
+        return {'count': self.count, 'sum': self.total, 'mean': self.mean,
+                'max': self.max, 'p50': self.percentile(50),
+                'p90': self.percentile(90), 'p99': self.percentile(99),
+                'p999': self.percentile(99.9)}
+
+
+class Metrics:
+    """Counters, gauges and latency histograms of one consumer, by name.
+
+    Counters are incremented as events happen; gauges are read from a
+    function when exported; histograms record seconds spent in a stage.
+    Every metric is exported with labels, such as the server consumed.
+    """
+    def __init__(self, labels: Optional[Dict[str, str]] = None):
+        self.labels = labels or {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, func: Callable[[], float]) -> None:
+        self.gauges[name] = func
+
+    def observe(self, name: str, value: float) -> None:
+        try:
+            self.histograms[name].record(value)
+        except KeyError:
+            self.histograms[name] = Histogram()
+            self.histograms[name].record(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'labels': self.labels,
+            'counters': dict(self.counters),
+            'gauges': {name: func() for name, func in self.gauges.items()},
+            'histograms': {name: hist.summary()
+                           for name, hist in self.histograms.items()},
+        }
+
+    def dump(self, path: str) -> None:
+        """Write all metrics to path as JSON."""
+        with open(path, 'w') as fp_:
+            json.dump(self.to_dict(), fp_, indent=2)
+
+
+def format_labels(labels: Dict[str, str], **extra: str) -> str:
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{val}"'
+                          for key, val in labels.items()) + '}'
+
+
+def render(sources: List[Metrics], prefix: str = 'tacview') -> str:
+    """Render metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    kinds = [('counter', 'counters'), ('gauge', 'gauges'),
+             ('histogram', 'histograms')]
+    for kind, attr in kinds:
+        names = sorted({name for src in sources for name in getattr(src, attr)})
+        for name in names:
+            full = f'{prefix}_{name}'
+            lines.append(f'# TYPE {full} {kind}')
+            for src in sources:
+                if name not in getattr(src, attr):
+                    continue
+                labels = format_labels(src.labels)
+                if kind == 'counter':
+                    lines.append(f'{full}{labels} {src.counters[name]}')
+                elif kind == 'gauge':
+                    lines.append(f'{full}{labels} {src.gauges[name]()}')
+                else:
+                    hist = src.histograms[name]
+                    for bound, count in hist.cumulative():
+                        lines.append(f'{full}_bucket'
+                                     f'{format_labels(src.labels, le=f"{bound:g}")}'
+                                     f' {count}')
+                    lines.append(f'{full}_bucket'
+                                 f'{format_labels(src.labels, le="+Inf")}'
+                                 f' {hist.count}')
+                    lines.append(f'{full}_sum{labels} {hist.total}')
+                    lines.append(f'{full}_count{labels} {hist.count}')
+    return '\n'.join(lines) + '\n'
+
+
+async def serve_metrics(sources: List[Metrics], host: str = '127.0.0.1',
+                        port: int = 9100) -> asyncio.AbstractServer:
+    """Serve metrics of sources over HTTP, on any path."""
+    async def handle(reader, writer):
+        try:
+            while (await reader.readline()).strip():
+                pass
+            body = render(sources).encode()
+            writer.write(b'HTTP/1.0 200 OK\r\n'
+                         b'Content-Type: text/plain; version=0.0.4\r\n'
+                         + f'Content-Length: {len(body)}\r\n\r\n'.encode()
+                         + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,203 @@
+"""
+Postgres binary COPY packing.
+
+Rows are packed with precompiled structs into a preallocated bytearray,
+grown by doubling.  A field of None (or NaN, for columns packed from NumPy)
+is written as a NULL, with length -1.  Whole frames can be packed from NumPy
+columns at once, with one structured array per distinct pattern of NULLs.
+"""
+from itertools import compress
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+COPY_HEADER = struct.pack('>11sii', b'PGCOPY\n\377\r\n\0', 0, 0)
+COPY_TRAILER = struct.pack('>h', -1)
+
+# Column type name: (struct format, NumPy dtype, size in bytes)
+TYPES = {
+    "INTEGER": ('i', '>i4', 4),
+    "FLOAT": ('d', '>f8', 8),
+    "DOUBLE": ('d', '>f8', 8),
+    "NUMERIC": ('d', '>f8', 8),
+}
+
+
+class CopyBuffer:
+    """Growable buffer of rows in Postgres binary COPY format.
+
+    Supports read, for use as a file by psycopg2, and view, for use as a
+    buffer by asyncpg.
+    """
+    def __init__(self, columns, capacity: int = 1 << 16):
+        self.ncol = len(columns)
+        self.fmts = []
+        self.dtypes = []
+        self.sizes = []
+        for col in columns.values():
+            fmt, dtype, size = TYPES[str(col.type)]
+            self.fmts.append(fmt)
+            self.dtypes.append(dtype)
+            self.sizes.append(size)
+        self.fmt_str = '>h' + ''.join('i' + fmt for fmt in self.fmts)
+        self.row = struct.Struct(self.fmt_str)
+        self.null_rows: Dict[Tuple[bool, ...], Tuple] = {}
+        self.args: List = [self.ncol]
+        for size in self.sizes:
+            self.args.extend([size, None])
+
+        self.buf = bytearray(capacity)
+        self.pos = 0
+        self.read_pos = 0
+        self.rows = 0
+        self.reset()
+
+    def __len__(self) -> int:
+        return self.pos
+
+    def reset(self) -> None:
+        """Empty the buffer, keeping its memory, and write the header."""
+        self.pos = 0
+        self.read_pos = 0
+        self.rows = 0
+        self.write(COPY_HEADER)
+
+    def ensure(self, nbytes: int) -> None:
+        """Grow the buffer to fit nbytes more.
+
+        A new bytearray is allocated, rather than resizing in place, so
+        views of the old one held by a reader never block growth.
+        """
+        needed = self.pos + nbytes
+        if needed <= len(self.buf):
+            return
+        capacity = len(self.buf) * 2
+        while capacity < needed:
+            capacity *= 2
+        new = bytearray(capacity)
+        new[:self.pos] = self.buf[:self.pos]
+        self.buf = new
+
+    def write(self, data: bytes) -> None:
+        self.ensure(len(data))
+        self.buf[self.pos:self.pos + len(data)] = data
+        self.pos += len(data)
+
+    def pack(self, values: Sequence) -> None:
+        """Pack one row of values, in column order."""
+        if None in values:
+            self.pack_nulls(values)
+            return
+        args = self.args
+        args[2::2] = values
+        row = self.row
+        if self.pos + row.size > len(self.buf):
+            self.ensure(row.size)
+        row.pack_into(self.buf, self.pos, *args)
+        self.pos += row.size
+        self.rows += 1
+
+    def pack_nulls(self, values: Sequence) -> None:
+        """Pack one row of values, any of which may be None.
+
+        A struct, with a template of arguments, is compiled and cached for
+        each pattern of NULLs.
+        """
+        key = tuple([value is None for value in values])
+        try:
+            row, args, keep, slots = self.null_rows[key]
+        except KeyError:
+            row, args, keep, slots = self.null_rows[key] = self.null_row(key)
+        for slot, value in zip(slots, compress(values, keep)):
+            args[slot] = value
+        if self.pos + row.size > len(self.buf):
+            self.ensure(row.size)
+        row.pack_into(self.buf, self.pos, *args)
+        self.pos += row.size
+        self.rows += 1
+
+    def null_row(self, is_null: Sequence[bool]) -> Tuple:
+        """Compile a row struct for a pattern of NULLs.
+
+        Returns the struct, a template of its arguments, a mask of the
+        columns not NULL, and the index of each of their values in the
+        template.
+        """
+        fmt = ['>h']
+        args = [self.ncol]
+        slots = []
+        for fmt_, size, null in zip(self.fmts, self.sizes, is_null):
+            if null:
+                fmt.append('i')
+                args.append(-1)
+            else:
+                fmt.append('i' + fmt_)
+                args.append(size)
+                slots.append(len(args))
+                args.append(None)
+        keep = [not null for null in is_null]
+        return struct.Struct(''.join(fmt)), args, keep, slots
+
+    def pack_columns(self, values: Sequence[np.ndarray],
+                     nulls: Optional[Sequence[Optional[np.ndarray]]] = None
+                     ) -> int:
+        """Pack a row for every element of equal length column arrays.
+
+        NaN values of float columns, and values where the matching mask of
+        nulls is True, are packed as NULL.  Rows sharing the same NULL
+        columns are packed together, so row order is not preserved.
+        Returns the number of rows packed.
+        """
+        n_rows = len(values[0]) if values else 0
+        if not n_rows:
+            return 0
+        null = np.zeros((n_rows, self.ncol), dtype=bool)
+        for idx, col in enumerate(values):
+            if self.fmts[idx] == 'd':
+                null[:, idx] = np.isnan(col)
+            if nulls is not None and nulls[idx] is not None:
+                null[:, idx] |= nulls[idx]
+
+        if not null.any():
+            groups = [(np.zeros(self.ncol, dtype=bool), slice(None))]
+        else:
+            keys = null.dot(1 << np.arange(self.ncol, dtype=np.int64))
+            uniq, first, inverse = np.unique(keys, return_index=True,
+                                             return_inverse=True)
+            groups = [(null[first[k]], np.flatnonzero(inverse == k))
+                      for k in range(uniq.shape[0])]
+
+        for is_null, rows in groups:
+            fields = [('n', '>i2')]
+            for idx, dtype in enumerate(self.dtypes):
+                fields.append((f'l{idx}', '>i4'))
+                if not is_null[idx]:
+                    fields.append((f'v{idx}', dtype))
+            packed = np.empty(n_rows if isinstance(rows, slice)
+                              else rows.shape[0], dtype=fields)
+            packed['n'] = self.ncol
+            for idx, size in enumerate(self.sizes):
+                if is_null[idx]:
+                    packed[f'l{idx}'] = -1
+                else:
+                    packed[f'l{idx}'] = size
+                    packed[f'v{idx}'] = values[idx][rows]
+            self.write(memoryview(packed.view(np.uint8)))
+        self.rows += n_rows
+        return n_rows
+
+    def finish(self) -> None:
+        """Write the trailer, ready for reading."""
+        self.write(COPY_TRAILER)
+        self.read_pos = 0
+
+    def view(self) -> memoryview:
+        """Return a view of the packed bytes."""
+        return memoryview(self.buf)[:self.pos]
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.pos if size < 0 else min(self.read_pos + size, self.pos)
+        data = bytes(self.buf[self.read_pos:end])
+        self.read_pos = end
+        return data
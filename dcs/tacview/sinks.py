@@ -0,0 +1,557 @@
+"""
+Pluggable storage sinks of the tacview consumer.
+
+A sink receives everything the consumer writes, in batches: sessions, newly
+seen objects, event rows, deaths, impacts and parents.  Objects and impacts
+are tuples in the column order of their tables.  Event batches are equal
+length NumPy arrays, by event column, with NULL_INT for missing integers and
+NaN for missing floats.  Objects are keyed by (session_id, id), as Tacview
+ids are only unique within a recording.
+
+Postgres is written by PostgresSink, in the client, with its own COPY
+writer.  Every other sink is fed by a SinkWriter, which buffers event rows
+as columns, and writes each batch, then the deaths and impacts buffered
+before it, in order.  Blocking sinks run every call on a single thread of
+their own, so the event loop is never blocked and calls apply in order.
+"""
+import abc
+import asyncio
+from asyncio.log import logging
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dcs.common import config
+from dcs.common.db import Event, Impact, Object, Session
+from dcs.tacview.flush import FlushPolicy
+from dcs.tacview.metrics import Metrics
+from dcs.tacview.store import NULL_INT
+
+LOG = logging.getLogger('tacview-sinks')
+
+Columns = Dict[str, np.ndarray]
+
+EVENT_COLUMNS = list(Event.c.keys())
+OBJECT_COLUMNS = list(Object.c.keys())
+IMPACT_COLUMNS = list(Impact.c.keys())
+SESSION_COLUMNS = [col for col in Session.__table__.c.keys()
+                   if col != 'session_id']
+INT_TYPES = ('INTEGER',)
+
+
+class Sink(abc.ABC):
+    """Destination of everything written by a consumer."""
+    @abc.abstractmethod
+    async def write_session(self, ref) -> int:
+        """Write the session of a Ref, returning its session_id."""
+
+    @abc.abstractmethod
+    async def write_objects(self, records: List[Tuple]) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def write_events(self, columns: Columns) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def mark_dead(self, dead: List[Tuple[int, int]]) -> None:
+        """Set alive to 0 of each object, given as (session_id, id)."""
+
+    @abc.abstractmethod
+    async def write_impacts(self, records: List[Tuple]) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def write_parents(
+            self, parents: List[Tuple[int, float, int, int]]) -> None:
+        """Set (parent, parent_dist) of each object, given as
+        (parent, parent_dist, session_id, id).
+        """
+
+    async def close(self) -> None:
+        pass
+
+    def writer(self, min_insert_size: int = -1,
+               policy: Optional[FlushPolicy] = None, **kwargs) -> 'SinkWriter':
+        """Return the event writer of this sink.
+
+        Options of the Postgres COPY writer, such as max_in_flight, are
+        accepted and ignored.
+        """
+        return SinkWriter(self, min_insert_size, policy)
+
+
+class NullSink(Sink):
+    """Discard everything, to measure parsing alone."""
+    def __init__(self):
+        self.sessions = 0
+
+    async def write_session(self, ref) -> int:
+        self.sessions += 1
+        return self.sessions
+
+    async def write_objects(self, records: List[Tuple]) -> None:
+        pass
+
+    async def write_events(self, columns: Columns) -> None:
+        pass
+
+    async def mark_dead(self, dead: List[Tuple[int, int]]) -> None:
+        pass
+
+    async def write_impacts(self, records: List[Tuple]) -> None:
+        pass
+
+    async def write_parents(
+            self, parents: List[Tuple[int, float, int, int]]) -> None:
+        pass
+
+
+class ThreadedSink(Sink):
+    """Sink whose writes block, run in order on a thread of its own.
+
+    Subclasses implement the blocking methods session, objects, events,
+    dead, impacts and parents, taking the same batches as the async ones.
+    """
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(1)
+
+    async def call(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def write_session(self, ref) -> int:
+        return await self.call(self.session, ref.ser())
+
+    async def write_objects(self, records: List[Tuple]) -> None:
+        await self.call(self.objects, records)
+
+    async def write_events(self, columns: Columns) -> None:
+        await self.call(self.events, columns)
+
+    async def mark_dead(self, dead: List[Tuple[int, int]]) -> None:
+        await self.call(self.dead, dead)
+
+    async def write_impacts(self, records: List[Tuple]) -> None:
+        await self.call(self.impacts, records)
+
+    async def write_parents(
+            self, parents: List[Tuple[int, float, int, int]]) -> None:
+        await self.call(self.parents, parents)
+
+    async def close(self) -> None:
+        await self.call(self.close_sync)
+        self.executor.shutdown()
+
+    def close_sync(self) -> None:
+        pass
+
+
+def sqlite_type(col) -> str:
+    name = str(col.type)
+    if name in INT_TYPES:
+        return 'INTEGER'
+    if name in ('FLOAT', 'NUMERIC', 'DOUBLE'):
+        return 'REAL'
+    return 'TEXT'
+
+
+def sqlite_ddl(table) -> str:
+    cols = [f"{name} {sqlite_type(col)}" for name, col in table.c.items()]
+    key = table.primary_key.columns.keys()
+    if key:
+        cols.append(f"PRIMARY KEY ({', '.join(key)})")
+    return f"CREATE TABLE IF NOT EXISTS {table.name} ({', '.join(cols)})"
+
+
+def latest_rows(columns: Columns) -> np.ndarray:
+    """Return the index of the latest row of each object, by updates then
+    last_seen.
+    """
+    order = np.lexsort((columns['last_seen'], columns['updates'],
+                        columns['id'], columns['session_id']))
+    ids = columns['id'][order]
+    session_ids = columns['session_id'][order]
+    last = np.ones(ids.shape[0], dtype=bool)
+    last[:-1] = (ids[1:] != ids[:-1]) | (session_ids[1:] != session_ids[:-1])
+    return order[last]
+
+
+def column_values(columns: Columns, names: List[str],
+                  rows: Optional[np.ndarray] = None) -> List[Tuple]:
+    """Return rows of columns as tuples, with NULLs as None."""
+    values = []
+    for name in names:
+        col = columns[name] if rows is None else columns[name][rows]
+        if col.dtype.kind == 'f':
+            null = np.isnan(col)
+        else:
+            null = col == NULL_INT
+        col = col.astype(object)
+        col[null] = None
+        values.append(col.tolist())
+    return list(zip(*values))
+
+
+class SQLiteSink(ThreadedSink):
+    """Write to a SQLite file, in WAL mode, for a single box.
+
+    Every batch is one transaction.  Event batches also update the current
+    state of each object, so object can be read as a live view, as by the
+    coord server.
+    """
+    upsert_cols = ('last_seen', 'alive', 'lat', 'lon', 'alt', 'roll', 'pitch',
+                   'yaw', 'u_coord', 'v_coord', 'heading', 'velocity_kts',
+                   'updates')
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        session_cols = ', '.join(f"{name} {sqlite_type(col)}" for name, col
+                                 in Session.__table__.c.items()
+                                 if name != 'session_id')
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS session "
+                f"(session_id INTEGER PRIMARY KEY, {session_cols})")
+            for table in [Object, Event, Impact]:
+                self.conn.execute(sqlite_ddl(table))
+            self.conn.execute("CREATE INDEX IF NOT EXISTS event_session_id_idx"
+                              " ON event (session_id, id)")
+        self.insert_event = (f"INSERT INTO event ({', '.join(EVENT_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(EVENT_COLUMNS))})")
+        self.update_object = (
+            "UPDATE object SET "
+            + ', '.join(f"{col} = ?" for col in self.upsert_cols)
+            + " WHERE session_id = ? AND id = ? AND (updates IS NULL"
+            " OR (updates, last_seen) < (?, ?))")
+
+    def session(self, session: Dict[str, Any]) -> int:
+        values = [session.get(col) for col in SESSION_COLUMNS]
+        values = [str(val) if col == 'start_time' and val else val
+                  for col, val in zip(SESSION_COLUMNS, values)]
+        with self.conn:
+            cur = self.conn.execute(
+                f"INSERT INTO session ({', '.join(SESSION_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(SESSION_COLUMNS))})", values)
+        return cur.lastrowid
+
+    def objects(self, records: List[Tuple]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO object ({', '.join(OBJECT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(OBJECT_COLUMNS))})", records)
+
+    def events(self, columns: Columns) -> None:
+        latest = column_values(
+            columns, list(self.upsert_cols)
+            + ['session_id', 'id', 'updates', 'last_seen'],
+            latest_rows(columns))
+        with self.conn:
+            self.conn.executemany(self.insert_event,
+                                  column_values(columns, EVENT_COLUMNS))
+            self.conn.executemany(self.update_object, latest)
+
+    def dead(self, dead: List[Tuple[int, int]]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE object SET alive = 0 WHERE session_id = ? AND id = ?",
+                dead)
+
+    def impacts(self, records: List[Tuple]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO impact ({', '.join(IMPACT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(IMPACT_COLUMNS))})", records)
+
+    def parents(self, parents: List[Tuple[int, float, int, int]]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE object SET parent = ?, parent_dist = ? "
+                "WHERE session_id = ? AND id = ?", parents)
+
+    def close_sync(self) -> None:
+        self.conn.close()
+
+
+class ParquetSink(ThreadedSink):
+    """Append each batch as a row group to a Parquet file per table.
+
+    Events are written by a RollingEventWriter under path/event, so may be
+    read by session with `export.read_session`.  Deaths and parents are
+    appended as rows of their own, to be joined to objects on read.
+    Requires pyarrow.
+    """
+    def __init__(self, path: str, **kwargs):
+        super().__init__()
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+        # pylint: disable=import-outside-toplevel
+        from dcs.tacview.export import RollingEventWriter
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.schemas = {
+            'session': pa.schema(
+                [('session_id', pa.int64())]
+                + [(name, pa.string() if sqlite_type(col) == 'TEXT'
+                    else pa.float64())
+                   for name, col in Session.__table__.c.items()
+                   if name != 'session_id']),
+            'object': self.arrow_schema(Object),
+            'impact': self.arrow_schema(Impact),
+            'dead': pa.schema([('session_id', pa.int64()),
+                               ('id', pa.int64())]),
+            'parent': pa.schema([('parent', pa.int64()),
+                                 ('parent_dist', pa.float64()),
+                                 ('session_id', pa.int64()),
+                                 ('id', pa.int64())]),
+        }
+        self.writers: Dict[str, Any] = {}
+        self.events_writer = RollingEventWriter(os.path.join(path, 'event'),
+                                                **kwargs)
+        self.sessions = 0
+
+    def arrow_schema(self, table):
+        pa = self.pa
+        types = {'INTEGER': pa.int64(), 'REAL': pa.float64(),
+                 'TEXT': pa.string()}
+        return pa.schema([(name, types[sqlite_type(col)])
+                          for name, col in table.c.items()])
+
+    def append(self, name: str, table) -> None:
+        if name not in self.writers:
+            self.writers[name] = self.pq.ParquetWriter(
+                os.path.join(self.path, f"{name}.parquet"),
+                self.schemas[name])
+        self.writers[name].write_table(table)
+
+    def append_records(self, name: str, records: List[Tuple]) -> None:
+        if records:
+            schema = self.schemas[name]
+            self.append(name, self.pa.Table.from_pylist(
+                [dict(zip(schema.names, rec)) for rec in records],
+                schema=schema))
+
+    def session(self, session: Dict[str, Any]) -> int:
+        self.sessions += 1
+        record = dict(session, session_id=self.sessions)
+        if record.get('start_time'):
+            record['start_time'] = str(record['start_time'])
+        self.append_records('session', [tuple(
+            record.get(name) for name in self.schemas['session'].names)])
+        return self.sessions
+
+    def objects(self, records: List[Tuple]) -> None:
+        self.append_records('object', records)
+
+    def events(self, columns: Columns) -> None:
+        self.events_writer.write(columns)
+
+    def dead(self, dead: List[Tuple[int, int]]) -> None:
+        self.append_records('dead', dead)
+
+    def impacts(self, records: List[Tuple]) -> None:
+        self.append_records('impact', records)
+
+    def parents(self, parents: List[Tuple[int, float, int, int]]) -> None:
+        self.append_records('parent', parents)
+
+    def close_sync(self) -> None:
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        self.events_writer.close()
+
+
+class SinkWriter:
+    """Buffer event rows as columns, and write them to a sink in batches.
+
+    Has the interface of the Postgres AsyncBinCopyWriter used by the
+    consumer.  Each batch is written before the deaths and impacts buffered
+    with it, and before insert_data returns.
+    """
+    def __init__(self, sink: Sink, min_insert_size: int = -1,
+                 policy: Optional[FlushPolicy] = None):
+        self.sink = sink
+        self.min_insert_size = min_insert_size
+        self.policy = policy
+        self.draining = False
+        self.dtypes = {name: np.int64 if str(col.type) in INT_TYPES
+                       else np.float64 for name, col in Event.c.items()}
+        self.records: List[Tuple] = []
+        self.batches: List[Columns] = []
+        self.insert_count = 0
+        self.nbytes = 0
+        self.first_row_time = 0.0
+        self.metrics: Optional[Metrics] = None
+        self.phase_times: Dict[str, float] = {}
+        self.event_times: List[float] = []
+        self.db_event_time = 0.0
+        self.rows_written = 0
+        self.staleness_total = 0.0
+        self.staleness_max = 0.0
+        self.flushes = 0
+        self.failures = 0
+        self.coalesced = 0
+        self.buffer_wait_time = 0.0
+        self.buffer_wait_max = 0.0
+
+    @property
+    def pending(self) -> int:
+        return 0
+
+    def time_phase(self, phase: str, start: float) -> float:
+        now = time.time()
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + (
+            now - start)
+        if self.metrics:
+            self.metrics.observe(f'flush_{phase}_seconds', now - start)
+        return now
+
+    def added(self, rows: int) -> None:
+        if not self.insert_count:
+            self.first_row_time = time.time()
+        self.insert_count += rows
+        self.nbytes += rows * len(self.dtypes) * 8
+
+    def add_data(self, obj) -> None:
+        self.records.append(tuple(getattr(obj, name) for name in self.dtypes))
+        self.added(1)
+
+    def add_rows(self, store, rows: np.ndarray) -> None:
+        if not rows.shape[0]:
+            return
+        self.batches.append({name: store.cols[name][rows]
+                             for name in self.dtypes})
+        self.added(rows.shape[0])
+
+    def take(self) -> Columns:
+        """Return every buffered row as columns, and empty the buffer."""
+        batches = self.batches
+        if self.records:
+            batch = {}
+            for idx, (name, dtype) in enumerate(self.dtypes.items()):
+                null = np.nan if dtype is np.float64 else NULL_INT
+                batch[name] = np.array(
+                    [null if rec[idx] is None else rec[idx]
+                     for rec in self.records], dtype=dtype)
+            batches.append(batch)
+        columns = {name: np.concatenate([batch[name] for batch in batches])
+                   for name in self.dtypes}
+        self.records = []
+        self.batches = []
+        self.insert_count = 0
+        self.nbytes = 0
+        return columns
+
+    def restore(self, columns: Columns, rows: int, oldest: float) -> None:
+        """Put columns returned by take back before the buffered rows."""
+        self.batches.insert(0, columns)
+        self.insert_count += rows
+        self.nbytes += rows * len(self.dtypes) * 8
+        self.first_row_time = oldest
+
+    def ready(self) -> bool:
+        if self.policy is None or self.draining:
+            return self.min_insert_size <= self.insert_count
+        return self.policy.should_flush(self.insert_count, self.nbytes,
+                                        self.first_row_time, time.time())
+
+    async def insert_data(self, pending=None) -> bool:
+        """If enough rows are buffered, write them, then pending deaths and
+        impacts.  Returns True if rows were written.
+
+        Whatever a failed write was given is put back, to be written by the
+        next call.
+        """
+        if not self.ready():
+            return False
+        if not self.insert_count and not (
+                pending and (pending.dead or pending.impacts)):
+            return False
+        rows, oldest = self.insert_count, self.first_row_time
+        start = t1 = time.time()
+        try:
+            if rows:
+                columns = self.take()
+                try:
+                    await self.sink.write_events(columns)
+                except Exception:
+                    self.restore(columns, rows, oldest)
+                    raise
+                t1 = self.time_phase('events', t1)
+            if pending:
+                if pending.dead:
+                    dead, pending.dead = pending.dead, []
+                    try:
+                        await self.sink.mark_dead(dead)
+                    except Exception:
+                        pending.dead = dead + pending.dead
+                        raise
+                    t1 = self.time_phase('dead', t1)
+                if pending.impacts:
+                    impacts, pending.impacts = pending.impacts, []
+                    try:
+                        await self.sink.write_impacts(impacts)
+                    except Exception:
+                        pending.impacts = impacts + pending.impacts
+                        raise
+                    t1 = self.time_phase('impacts', t1)
+        except Exception as err:  # pylint: disable=broad-except
+            self.failures += 1
+            if self.metrics:
+                self.metrics.inc('flush_failures')
+            LOG.error("Event flush failed!")
+            LOG.exception(err)
+            return False
+        self.event_times.append(t1 - start)
+        self.flushes += 1
+        self.rows_written += rows
+        if rows:
+            staleness = t1 - oldest
+            self.staleness_total += staleness
+            self.staleness_max = max(self.staleness_max, staleness)
+        if self.policy:
+            self.policy.record(rows, t1 - start)
+        if self.metrics:
+            self.metrics.observe('flush_seconds', t1 - start)
+        return True
+
+    async def wait(self) -> None:
+        pass
+
+    async def flush(self, pending=None) -> None:
+        """Write every buffered row, whatever their number, then pending."""
+        draining, self.draining = self.draining, True
+        min_insert_size, self.min_insert_size = self.min_insert_size, -1
+        try:
+            await self.insert_data(pending)
+        finally:
+            self.draining = draining
+            self.min_insert_size = min_insert_size
+
+    async def cleanup(self, pending=None) -> None:
+        """Write everything buffered."""
+        await self.flush(pending)
+        self.db_event_time = sum(self.event_times)
+
+
+def open_sink(spec: str) -> Sink:
+    """Return a sink of spec: null, sqlite:<path> or parquet:<dir>."""
+    kind, _, path = spec.partition(':')
+    if kind == 'null':
+        return NullSink()
+    if kind == 'sqlite':
+        return SQLiteSink(path or config.DB_LOC)
+    if kind == 'parquet':
+        return ParquetSink(path or 'data/parquet')
+    raise ValueError(f"Unknown sink: {spec}!")
@@ -0,0 +1,146 @@
+"""
+In-memory spatial index over the ECEF coordinates of an ObjectStore.
+
+Objects are bucketed into a uniform 3D grid, partitioned by type class and
+color, so that candidate parents and impact targets of a weapon can be
+found locally, rather than by querying the database.  The index is rebuilt
+lazily, at most once per frame, and objects created since are added to it
+before it is next queried, so a weapon may find a launcher new to its own
+frame.
+"""
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+from dcs.tacview.store import NULL_STR, ObjectStore
+
+# Type classes, stored as bit flags per interned string.
+PARENT = 1
+AIR = 2
+GROUND = 4
+
+PARENT_EXCLUDED = ('Decoy', 'Misc', 'Weapon', 'Projectile',
+                   'Ground+Light+Human+Air+Parachutist')
+
+# Cells must be at least as wide as the largest distance searched for, plus
+# the distance an object can move between rebuilds.
+DEFAULT_CELL_SIZE = 1500.0
+
+KEY_BITS = 21
+KEY_OFFSET = 1 << (KEY_BITS - 1)
+NEIGHBORS = np.array([(x, y, z)
+                      for x in (-1, 0, 1)
+                      for y in (-1, 0, 1)
+                      for z in (-1, 0, 1)], dtype=np.int64)
+
+
+def type_flags(type_: str) -> int:
+    """Return the type class flags of an object type."""
+    flags = 0
+    if not any(excl in type_ for excl in PARENT_EXCLUDED):
+        flags |= PARENT
+    if 'Air+' in type_:
+        flags |= AIR
+    if type_.startswith('Ground'):
+        flags |= GROUND
+    return flags
+
+
+def cell_keys(cells: np.ndarray) -> np.ndarray:
+    """Pack (n, 3) integer cell coordinates into one int64 key each."""
+    cells = cells + KEY_OFFSET
+    return (cells[:, 0] << (2 * KEY_BITS)) | (cells[:, 1] << KEY_BITS) | cells[:, 2]
+
+
+class SpatialIndex:
+    """Uniform grid index over the cart_coords of an ObjectStore."""
+    def __init__(self, store: ObjectStore,
+                 cell_size: float = DEFAULT_CELL_SIZE):
+        self.store = store
+        self.cell_size = cell_size
+        self.stale = True
+        self.size = 0
+        self.rebuilds = 0
+        self.code_flags = np.zeros(0, dtype=np.int8)
+        self.parts: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def flags(self) -> np.ndarray:
+        """Return type class flags for every row of the store."""
+        strings = self.store.strings
+        n_known = self.code_flags.shape[0]
+        if n_known < len(strings):
+            new = [type_flags(val) for val in strings.values[n_known:]]
+            self.code_flags = np.concatenate(
+                [self.code_flags, np.array(new, dtype=np.int8)])
+        codes = self.store.col('Type')
+        flags = np.zeros(codes.shape[0], dtype=np.int8)
+        known = codes != NULL_STR
+        flags[known] = self.code_flags[codes[known]]
+        return flags
+
+    def partition(self, rows: np.ndarray
+                  ) -> Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]:
+        """Return (keys, rows) sorted by cell key, of each partition of
+        rows with a position.
+        """
+        store = self.store
+        cart = store.cart_coords[rows]
+        placed = ~np.isnan(cart[:, 0])
+        rows = rows[placed]
+        keys = cell_keys(
+            np.floor(cart[placed] / self.cell_size).astype(np.int64))
+        flags = self.flags()[rows]
+        colors = store.col('Color')[rows]
+
+        parts = {}
+        for kind in (PARENT, AIR):
+            of_kind = (flags & kind) != 0
+            for color in np.unique(colors[of_kind]).tolist():
+                mask = of_kind & (colors == color)
+                order = np.argsort(keys[mask], kind='stable')
+                parts[(kind, color)] = (keys[mask][order], rows[mask][order])
+        return parts
+
+    def rebuild(self) -> None:
+        """Rebuild every partition from current store positions."""
+        self.size = self.store.size
+        self.parts = self.partition(np.arange(self.size))
+        self.stale = False
+        self.rebuilds += 1
+
+    def add_new(self) -> None:
+        """Add rows created in the store since it was last indexed."""
+        rows = np.arange(self.size, self.store.size)
+        self.size = self.store.size
+        for part, (keys, new_rows) in self.partition(rows).items():
+            if part not in self.parts:
+                self.parts[part] = (keys, new_rows)
+                continue
+            part_keys, part_rows = self.parts[part]
+            at = np.searchsorted(part_keys, keys, side='right')
+            self.parts[part] = (np.insert(part_keys, at, keys),
+                                np.insert(part_rows, at, new_rows))
+
+    def candidates(self, kind: int, colors: Iterable[str],
+                   point: Tuple[float, float, float]) -> np.ndarray:
+        """Return rows of kind and any of colors in cells around point."""
+        if self.stale:
+            self.rebuild()
+        elif self.size < self.store.size:
+            self.add_new()
+        cell = np.floor(np.asarray(point) / self.cell_size).astype(np.int64)
+        keys = cell_keys(cell + NEIGHBORS)
+        found = []
+        for color in colors:
+            code = self.store.strings.codes.get(color)
+            if code is None or (kind, code) not in self.parts:
+                continue
+            part_keys, part_rows = self.parts[(kind, code)]
+            starts = np.searchsorted(part_keys, keys, side='left')
+            ends = np.searchsorted(part_keys, keys, side='right')
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                if start != end:
+                    found.append(part_rows[start:end])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(found)
@@ -0,0 +1,260 @@
+"""
+Columnar object store.
+
+Every numeric field of every object is held in a preallocated, growable
+NumPy array, indexed by row, with an id -> row mapping.  String fields are
+interned into a single table and stored as int32 codes.  Rows are accessed
+through lightweight views, which expose the same attributes as ObjectRec.
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+NULL_INT = -1
+NULL_STR = -1
+
+FLOAT_FIELDS = ('first_seen', 'last_seen', 'lat', 'lon', 'alt', 'roll',
+                'pitch', 'yaw', 'u_coord', 'v_coord', 'heading',
+                'impacted_dist', 'parent_dist', 'velocity_kts',
+                'secs_since_last_seen')
+INT_FIELDS = {
+    'id': np.int64,
+    'session_id': np.int32,
+    'alive': np.int8,
+    'impacted': np.int64,
+    'parent': np.int64,
+    'updates': np.int32,
+}
+STR_FIELDS = ('Name', 'Color', 'Country', 'grp', 'Pilot', 'Type',
+              'Coalition')
+
+# Defaults for a newly created row, matching those of ObjectRec.
+DEFAULTS = {
+    'alive': 1,
+    'alt': 1.0,
+    'roll': 0.0,
+    'pitch': 0.0,
+    'yaw': 0.0,
+    'heading': 0.0,
+    'updates': 1,
+    'velocity_kts': 0.0,
+}
+
+
+class StringTable:
+    """Intern strings, mapping each unique value to an int32 code."""
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return NULL_STR
+        try:
+            return self.codes[value]
+        except KeyError:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+            return code
+
+    def lookup(self, code: int) -> Optional[str]:
+        if code == NULL_STR:
+            return None
+        return self.values[code]
+
+
+def float_property(name):
+    def fget(self):
+        val = self.store.cols[name][self.row]
+        return None if val != val else float(val)
+
+    def fset(self, value):
+        self.store.cols[name][self.row] = np.nan if value is None else value
+
+    return property(fget, fset)
+
+
+def int_property(name):
+    def fget(self):
+        val = self.store.cols[name][self.row]
+        return None if val == NULL_INT else int(val)
+
+    def fset(self, value):
+        self.store.cols[name][self.row] = NULL_INT if value is None else value
+
+    return property(fget, fset)
+
+
+def str_property(name):
+    def fget(self):
+        return self.store.strings.lookup(self.store.cols[name][self.row])
+
+    def fset(self, value):
+        self.store.cols[name][self.row] = self.store.strings.intern(value)
+
+    return property(fget, fset)
+
+
+def written_property():
+    def fget(self):
+        return bool(self.store.written[self.row])
+
+    def fset(self, value):
+        self.store.written[self.row] = value
+
+    return property(fget, fset)
+
+
+def cart_coords_property():
+    def fget(self):
+        val = self.store.cart_coords[self.row]
+        if val[0] != val[0]:
+            return None
+        return tuple(val.tolist())
+
+    def fset(self, value):
+        self.store.cart_coords[self.row] = np.nan if value is None else value
+
+    return property(fget, fset)
+
+
+def view_properties(cls):
+    """Class decorator adding a property for every column of the store."""
+    for name in FLOAT_FIELDS:
+        setattr(cls, name, float_property(name))
+    for name in INT_FIELDS:
+        setattr(cls, name, int_property(name))
+    for name in STR_FIELDS:
+        setattr(cls, name, str_property(name))
+    cls.written = written_property()
+    cls.cart_coords = cart_coords_property()
+    return cls
+
+
+class ObjectStore:
+    """Struct-of-arrays store of object state, keyed by object id.
+
+    Supports the mapping protocol used on the previous dict of ObjectRec,
+    returning instances of view_cls, which must accept (store, row).
+    """
+    def __init__(self, view_cls, capacity: int = 1024):
+        self.view_cls = view_cls
+        self.capacity = 0
+        self.size = 0
+        self.index: Dict[int, int] = {}
+        self.strings = StringTable()
+        self.cols: Dict[str, np.ndarray] = {}
+        for name in FLOAT_FIELDS:
+            self.cols[name] = np.empty(0, dtype=np.float64)
+        for name, dtype in INT_FIELDS.items():
+            self.cols[name] = np.empty(0, dtype=dtype)
+        for name in STR_FIELDS:
+            self.cols[name] = np.empty(0, dtype=np.int32)
+        self.written = np.empty(0, dtype=bool)
+        self.cart_coords = np.empty((0, 3), dtype=np.float64)
+        self.grow(capacity)
+
+    def grow(self, capacity: int) -> None:
+        """Reallocate all columns to hold at least capacity rows."""
+        if capacity <= self.capacity:
+            return
+        for name, col in self.cols.items():
+            new = np.empty(capacity, dtype=col.dtype)
+            new[:self.size] = col[:self.size]
+            self.cols[name] = new
+        written = np.zeros(capacity, dtype=bool)
+        written[:self.size] = self.written[:self.size]
+        self.written = written
+        cart_coords = np.empty((capacity, 3), dtype=np.float64)
+        cart_coords[:self.size] = self.cart_coords[:self.size]
+        self.cart_coords = cart_coords
+        self.capacity = capacity
+
+    def col(self, name: str) -> np.ndarray:
+        """Return the filled portion of a column."""
+        return self.cols[name][:self.size]
+
+    def nbytes(self) -> int:
+        """Total bytes allocated to columns."""
+        return (sum(col.nbytes for col in self.cols.values())
+                + self.written.nbytes + self.cart_coords.nbytes)
+
+    def create(self,
+               id_: int,
+               first_seen: Optional[float] = None,
+               last_seen: Optional[float] = None,
+               session_id: Optional[int] = None):
+        """Add a new row with ObjectRec defaults and return a view of it."""
+        if self.size == self.capacity:
+            self.grow(self.capacity * 2)
+        row = self.size
+        self.size += 1
+        self.index[id_] = row
+
+        for name in FLOAT_FIELDS:
+            self.cols[name][row] = DEFAULTS.get(name, np.nan)
+        for name in INT_FIELDS:
+            self.cols[name][row] = DEFAULTS.get(name, NULL_INT)
+        for name in STR_FIELDS:
+            self.cols[name][row] = NULL_STR
+        self.written[row] = False
+        self.cart_coords[row] = np.nan
+
+        view = self.view_cls(self, row)
+        view.id = id_
+        view.first_seen = first_seen
+        view.last_seen = last_seen
+        view.session_id = session_id
+        return view
+
+    def lookup(self, ids: np.ndarray) -> np.ndarray:
+        """Return the row of each id, or -1 where the id is not stored."""
+        index = self.index
+        return np.fromiter((index.get(id_, -1) for id_ in ids.tolist()),
+                           dtype=np.int64, count=ids.shape[0])
+
+    def view(self, row: int):
+        return self.view_cls(self, row)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, id_: int) -> bool:
+        return id_ in self.index
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.index)
+
+    def __getitem__(self, id_: int):
+        return self.view_cls(self, self.index[id_])
+
+    def __setitem__(self, id_: int, rec) -> None:
+        """Copy every field of an ObjectRec-like record into the store."""
+        try:
+            view = self[id_]
+        except KeyError:
+            view = self.create(id_)
+        for name in FLOAT_FIELDS + tuple(INT_FIELDS) + STR_FIELDS + (
+                'written', 'cart_coords'):
+            setattr(view, name, getattr(rec, name))
+
+    def get(self, id_: int, default=None):
+        try:
+            return self[id_]
+        except KeyError:
+            return default
+
+    def keys(self) -> Iterator[int]:
+        return iter(self.index)
+
+    def values(self):
+        for row in range(self.size):
+            yield self.view_cls(self, row)
+
+    def items(self) -> Iterator[Tuple[int, object]]:
+        for id_, row in self.index.items():
+            yield id_, self.view_cls(self, row)
@@ -0,0 +1,145 @@
+"""
+Run consumers of several Tacview servers from one supervisor.
+
+In 'tasks' mode, each server is consumed by a task of one event loop, with
+its own Ref and event writer, all sharing a single bounded connection pool.
+Consumers of tasks are restarted if they exit.  In 'processes' mode, each
+server is consumed by a process of its own, as if started separately.
+
+If checkpoint_dir is set, each server is checkpointed to a file of its own
+name there, so a restarted consumer resumes its session.  If archive_dir is
+set, the raw stream of each server is archived to a file of its own name
+there.  If metrics_port is set, the metrics of every server are served
+there, labelled by server.
+"""
+import asyncio
+from asyncio.log import logging
+from multiprocessing import Process
+import os
+from typing import List, Optional, Tuple
+
+import asyncpg
+
+from dcs.common import config, get_logger
+from dcs.common.db import PG_URL
+from dcs.tacview import client
+from dcs.tacview.metrics import ConsumerStats, Metrics, serve_metrics
+
+LOG = get_logger(logging.getLogger('tacview-supervisor'))
+LOG.setLevel(logging.INFO)
+
+Server = Tuple[str, str, int]
+
+
+def checkpoint_path(checkpoint_dir: str, name: str) -> str:
+    return os.path.join(checkpoint_dir, f"{name.replace(':', '_')}.npz")
+
+
+def archive_path(archive_dir: str, name: str) -> str:
+    return os.path.join(archive_dir, f"{name.replace(':', '_')}.acmi.gz")
+
+
+def parse_server(spec: str) -> Server:
+    """Return (name, host, port) of a preset name, host:port or name=host:port."""
+    if '=' in spec:
+        name, addr = spec.split('=', 1)
+    elif spec in config.presets:
+        name, addr = spec, config.presets[spec]
+    else:
+        name, addr = spec, spec
+    host, port = addr.rsplit(':', 1)
+    return name, host, int(port)
+
+
+async def run_server(server: Server, pool, stats: ConsumerStats,
+                     restart_delay: float = 10.0,
+                     checkpoint_dir: Optional[str] = None,
+                     archive_dir: Optional[str] = None, **kwargs) -> None:
+    """Consume a server, restarting the consumer whenever it exits.
+
+    A consumer with max_iters set is not restarted once it returns.
+    """
+    name, host, port = server
+    if checkpoint_dir:
+        kwargs['checkpoint_path'] = checkpoint_path(checkpoint_dir, name)
+    if archive_dir:
+        kwargs['archive_path'] = archive_path(archive_dir, name)
+    while True:
+        try:
+            await client.consumer(host, port, pool=pool, stats=stats,
+                                  **kwargs)
+            if kwargs.get('max_iters'):
+                return
+            LOG.warning("Consumer of %s exited...", name)
+        except Exception as err:  # pylint: disable=broad-except
+            LOG.error("Consumer of %s failed!", name)
+            LOG.exception(err)
+        stats.restarts += 1
+        await asyncio.sleep(restart_delay)
+
+
+async def log_stats(stats: List[ConsumerStats], interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        for stat in stats:
+            LOG.info(stat.summary())
+
+
+async def supervise(servers: List[Server], pool_size: int = 4,
+                    log_interval: float = 30.0, restart_delay: float = 10.0,
+                    metrics_port: Optional[int] = None,
+                    **kwargs) -> List[ConsumerStats]:
+    """Consume every server as a task, sharing one pool of pool_size."""
+    pool = await asyncpg.create_pool(
+        PG_URL, min_size=1, max_size=pool_size,
+        init=client.AsyncBinCopyWriter.init_connection)
+    stats = [ConsumerStats(name) for name, _, _ in servers]
+    metrics = [Metrics({'server': name}) for name, _, _ in servers]
+    for stat, metric in zip(stats, metrics):
+        metric.gauge('lag_seconds', lambda stat=stat: stat.lag)
+        metric.gauge('restarts', lambda stat=stat: stat.restarts)
+    server = None
+    if metrics_port:
+        server = await serve_metrics(metrics, port=metrics_port)
+    reporter = asyncio.ensure_future(log_stats(stats, log_interval))
+    try:
+        await asyncio.gather(*[
+            run_server(srv, pool, stat, restart_delay, metrics=metric,
+                       **kwargs)
+            for srv, stat, metric in zip(servers, stats, metrics)])
+    finally:
+        reporter.cancel()
+        if server:
+            server.close()
+        await pool.close()
+    return stats
+
+
+def run_processes(servers: List[Server], checkpoint_dir: Optional[str] = None,
+                  archive_dir: Optional[str] = None, **kwargs) -> None:
+    """Consume every server in a process of its own."""
+    procs = []
+    for name, host, port in servers:
+        if checkpoint_dir:
+            kwargs['checkpoint_path'] = checkpoint_path(checkpoint_dir, name)
+        if archive_dir:
+            kwargs['archive_path'] = archive_path(archive_dir, name)
+        proc = Process(target=client.main, name=name, args=(host, port),
+                       kwargs=dict(kwargs))
+        proc.start()
+        procs.append(proc)
+    for proc in procs:
+        proc.join()
+
+
+def main(servers: List[str], mode: str = 'tasks', **kwargs) -> None:
+    """Consume servers, given as preset names or host:port addresses."""
+    parsed = [parse_server(spec) for spec in servers]
+    LOG.info("Supervising %d servers as %s...", len(parsed), mode)
+    if mode == 'processes':
+        for key in ['pool_size', 'log_interval', 'restart_delay',
+                    'metrics_port']:
+            kwargs.pop(key, None)
+        run_processes(parsed, **kwargs)
+    else:
+        asyncio.run(supervise(parsed, **kwargs))
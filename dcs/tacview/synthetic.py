@@ -0,0 +1,157 @@
+"""
+Seeded synthetic ACMI recordings, for benchmarks and tests.
+
+Aircraft fly straight and level, turning now and then, ground units move
+slowly and report every ground_update_secs, and weapons are launched from
+the position of a random aircraft, fly for a while, then are removed.
+Aircraft and ground units die at death_rate per object per second, and are
+replaced by new objects, so object counts stay constant.  The same seed and
+settings always produce the same bytes.
+"""
+import random
+from typing import Dict, Iterator, List, Tuple
+
+HEADER = [
+    b"FileType=text/acmi/tacview",
+    b"FileVersion=2.1",
+    b"0,DataSource=DCS 2.5.6",
+    b"0,Title=Synthetic",
+    b"0,Author=synthetic",
+    b"0,ReferenceTime=2019-01-01T12:00:00Z",
+    b"0,RecordingTime=2019-01-01T12:00:00.5Z",
+    b"0,ReferenceLatitude=42",
+    b"0,ReferenceLongitude=41",
+]
+
+COLORS = ('Blue', 'Red')
+AIRCRAFT = ('FA-18C_hornet', 'F-16C_50', 'Su-27', 'MiG-29S')
+GROUND = ('M-1 Abrams', 'T-72B', 'SA-11 Buk LN 9A310M1', 'Ural-375')
+WEAPONS = ('AIM-120C', 'R-77', 'GBU-12', 'Mk-82')
+
+
+class SyntheticACMI:
+    """Generate an ACMI stream of aircraft, ground units and weapons.
+
+    Rates are per second: weapon_rate weapons launched in total, and
+    death_rate deaths per aircraft or ground unit.  Object ids are assigned
+    in order from first_id.
+    """
+    def __init__(self, seed: int = 0, aircraft: int = 50, ground: int = 200,
+                 weapon_rate: float = 1.0, death_rate: float = 0.005,
+                 fps: float = 10.0, ground_update_secs: float = 1.0,
+                 weapon_secs: float = 20.0, first_id: int = 0x100):
+        self.rng = random.Random(seed)
+        self.n_aircraft = aircraft
+        self.n_ground = ground
+        self.weapon_rate = weapon_rate
+        self.death_rate = death_rate
+        self.fps = fps
+        self.ground_update_secs = ground_update_secs
+        self.weapon_secs = weapon_secs
+        self.next_id = first_id
+        self.time = 0.0
+        self.frame = 0
+        self.objects: Dict[int, dict] = {}
+        self.pending: List[Tuple[int, bytes]] = []
+        for _ in range(aircraft):
+            self.spawn('aircraft')
+        for _ in range(ground):
+            self.spawn('ground')
+
+    def spawn(self, kind: str, launcher: dict = None) -> None:
+        """Add an object, to be announced in full in the next frame."""
+        rng = self.rng
+        obj_id = self.next_id
+        self.next_id += 1
+        if kind == 'weapon':
+            obj = dict(launcher, kind=kind, name=rng.choice(WEAPONS),
+                       speed=rng.uniform(0.005, 0.01),
+                       expires=self.time + rng.uniform(
+                           self.weapon_secs / 2, self.weapon_secs))
+            type_ = 'Weapon+Missile'
+        elif kind == 'aircraft':
+            obj = dict(kind=kind, name=rng.choice(AIRCRAFT),
+                       color=rng.choice(COLORS),
+                       lon=rng.uniform(-1.0, 1.0), lat=rng.uniform(-1.0, 1.0),
+                       alt=rng.uniform(1000.0, 10000.0),
+                       heading=rng.uniform(0.0, 360.0),
+                       speed=rng.uniform(0.001, 0.003))
+            type_ = 'Air+FixedWing'
+        else:
+            obj = dict(kind=kind, name=rng.choice(GROUND),
+                       color=rng.choice(COLORS),
+                       lon=rng.uniform(-1.0, 1.0), lat=rng.uniform(-1.0, 1.0),
+                       alt=rng.uniform(0.0, 500.0),
+                       heading=rng.uniform(0.0, 360.0),
+                       speed=rng.choice([0.0, 0.00005]))
+            type_ = 'Ground+Heavy+Armor+Vehicle'
+        obj['next_update'] = self.time
+        self.objects[obj_id] = obj
+        self.pending.append((obj_id, (
+            self.transform(obj_id, obj)
+            + f",Type={type_},Name={obj['name']},Color={obj['color']},"
+              f"Coalition=Enemies".encode())))
+
+    def transform(self, obj_id: int, obj: dict) -> bytes:
+        return (f"{obj_id:x},T={obj['lon']:.7f}|{obj['lat']:.7f}|"
+                f"{obj['alt']:.2f}|0|0|{obj['heading']:.1f}").encode()
+
+    def chance(self, rate: float) -> int:
+        """Return a count of events this frame, for a rate per second."""
+        expected = rate / self.fps
+        count = int(expected)
+        return count + (self.rng.random() < expected - count)
+
+    def step(self) -> List[bytes]:
+        """Advance one frame, returning its time marker and lines."""
+        rng = self.rng
+        lines = [f"#{self.time:.2f}".encode()]
+        announced = {obj_id for obj_id, _ in self.pending}
+        lines.extend(line for _, line in self.pending)
+        self.pending = []
+        dt = 1.0 / self.fps
+
+        for obj_id, obj in list(self.objects.items()):
+            kind = obj['kind']
+            if kind == 'weapon' and self.time >= obj['expires']:
+                del self.objects[obj_id]
+                lines.append(f"-{obj_id:x}".encode())
+                continue
+            if kind != 'weapon' and rng.random() < self.death_rate * dt:
+                del self.objects[obj_id]
+                lines.append(f"-{obj_id:x}".encode())
+                self.spawn(kind)
+                continue
+            if kind == 'aircraft' and rng.random() < 0.01:
+                obj['heading'] = (obj['heading'] + rng.uniform(-90, 90)) % 360
+            obj['lat'] += obj['speed'] * dt * (1 if obj['heading'] < 180 else -1)
+            obj['lon'] += obj['speed'] * dt * (1 if obj['heading'] % 180 < 90 else -1)
+            if kind == 'ground':
+                if self.time < obj['next_update']:
+                    continue
+                obj['next_update'] = self.time + self.ground_update_secs
+            if obj_id not in announced:
+                lines.append(self.transform(obj_id, obj))
+
+        launchers = [obj for obj in self.objects.values()
+                     if obj['kind'] == 'aircraft']
+        for _ in range(self.chance(self.weapon_rate)):
+            if launchers:
+                self.spawn('weapon', rng.choice(launchers))
+
+        self.time = round(self.time + dt, 6)
+        self.frame += 1
+        return lines
+
+    def frames(self, seconds: float) -> Iterator[List[bytes]]:
+        """Yield the lines of every frame for seconds of stream time."""
+        for _ in range(int(seconds * self.fps)):
+            yield self.step()
+
+    def lines(self, seconds: float) -> Iterator[bytes]:
+        yield from HEADER
+        for frame in self.frames(seconds):
+            yield from frame
+
+    def to_bytes(self, seconds: float) -> bytes:
+        return b'\n'.join(self.lines(seconds)) + b'\n'
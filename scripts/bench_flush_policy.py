@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""Compare event flush policies by rows/sec and end-to-end staleness.
+
+Frames are generated in real time, alternating between quiet and busy
+periods.  By default, COPYs go to a simulated database whose cost is a fixed
+overhead per flush plus a cost per row; pass --dsn to use a real database.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path('.').parent.absolute()))
+from dcs.common.db import Event
+from dcs.tacview import client
+from dcs.tacview.flush import FlushPolicy
+
+
+class SimulatedConn:
+    """Connection whose COPY sleeps for overhead plus per_row per row."""
+    def __init__(self, overhead: float, per_row: float, row_size: int):
+        self.overhead = overhead
+        self.per_row = per_row
+        self.row_size = row_size
+
+    def transaction(self):
+        class Transaction:
+            async def __aenter__(self):
+                pass
+
+            async def __aexit__(self, *args):
+                return False
+        return Transaction()
+
+    async def execute(self, sql, *args):
+        pass
+
+    async def copy_to_table(self, table, source, format):
+        rows = len(source) // self.row_size
+        await asyncio.sleep(self.overhead + rows * self.per_row)
+
+
+class SimulatedPool:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = asyncio.Lock()
+
+    def acquire(self):
+        pool = self
+
+        class Acquire:
+            async def __aenter__(self):
+                await pool.lock.acquire()
+                return pool.conn
+
+            async def __aexit__(self, *args):
+                pool.lock.release()
+                return False
+        return Acquire()
+
+
+def make_rec(id_: int, updates: int) -> client.ObjectRec:
+    rec = client.ObjectRec(id_, 1.0, 1.0, 1)
+    rec.lat, rec.lon, rec.u_coord, rec.v_coord = 1.0, 2.0, 3.0, 4.0
+    rec.updates = updates
+    return rec
+
+
+async def run_policy(pool, policy, seconds: float, fps: float,
+                     quiet_rows: int, busy_rows: int, period: float):
+    """Feed frames for seconds, flushing with policy at every time marker."""
+    writer = client.AsyncBinCopyWriter(Event.c, pool, 10, policy=policy)
+    recs = [make_rec(i, 1) for i in range(busy_rows)]
+    start = time.perf_counter()
+    frame = 0
+    while time.perf_counter() - start < seconds:
+        busy = int((time.perf_counter() - start) / period) % 2
+        for rec in recs[:busy_rows if busy else quiet_rows]:
+            writer.add_data(rec)
+        await writer.insert_data()
+        frame += 1
+        delay = start + frame / fps - time.perf_counter()
+        await asyncio.sleep(max(delay, 0))
+    await writer.cleanup()
+    elapsed = time.perf_counter() - start
+    return writer, elapsed
+
+
+async def run(args) -> None:
+    if args.dsn:
+        pool = await client.asyncpg.create_pool(
+            args.dsn, min_size=1, max_size=1,
+            init=client.AsyncBinCopyWriter.init_connection)
+    else:
+        row_size = client.CopyBuffer(Event.c).row.size
+        pool = SimulatedPool(SimulatedConn(args.overhead, args.per_row,
+                                           row_size))
+
+    policies = [
+        ('every-marker', None),
+        (f'fixed-{args.target_rows}', FlushPolicy(args.max_latency,
+                                                  args.target_rows)),
+        ('adaptive', FlushPolicy(args.max_latency)),
+    ]
+    for name, policy in policies:
+        writer, elapsed = await run_policy(pool, policy, args.seconds,
+                                           args.fps, args.quiet_rows,
+                                           args.busy_rows, args.period)
+        flushes = max(len(writer.event_times), 1)
+        print(f"{name:>14}: {writer.rows_written / elapsed:,.0f} rows/sec "
+              f"-- {flushes} flushes -- mean staleness "
+              f"{writer.staleness_total / flushes:.3f}s -- max staleness "
+              f"{writer.staleness_max:.3f}s -- buffer wait "
+              f"{writer.buffer_wait_time:.3f}s")
+    if args.dsn:
+        await pool.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10.0,
+                        help='Seconds to run each policy')
+    parser.add_argument('--fps', type=float, default=20.0,
+                        help='Time markers per second')
+    parser.add_argument('--quiet-rows', type=int, default=5,
+                        help='Events per frame in quiet periods')
+    parser.add_argument('--busy-rows', type=int, default=2000,
+                        help='Events per frame in busy periods')
+    parser.add_argument('--period', type=float, default=2.0,
+                        help='Seconds between switching quiet and busy')
+    parser.add_argument('--max-latency', type=float, default=1.0,
+                        help='Max latency of the fixed and adaptive policies')
+    parser.add_argument('--target-rows', type=int, default=5000,
+                        help='Row target of the fixed policy')
+    parser.add_argument('--overhead', type=float, default=0.02,
+                        help='Simulated seconds of overhead per flush')
+    parser.add_argument('--per-row', type=float, default=2e-6,
+                        help='Simulated seconds per row flushed')
+    parser.add_argument('--dsn', type=str, default=None,
+                        help='Flush to this database rather than simulate')
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""Benchmark tacview parsing and ingest on seeded synthetic recordings.
+
+Micro-benchmarks time single functions on the objects of a synthetic
+recording.  Macro-benchmarks serve the recording on a local socket and run
+the consumer end to end, into a sink that discards every write, so only
+the client is measured.  Results are written as JSON; pass --baseline with
+the results of an earlier run to print the change in each.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path('.').parent.absolute()))
+from dcs.common.db import Event
+from dcs.tacview import client
+from dcs.tacview.sinks import NullSink
+from dcs.tacview.synthetic import HEADER, SyntheticACMI
+
+
+def timed(func, ops: int, min_ops: int = 100000) -> dict:
+    """Run func, which performs ops operations, until at least min_ops are
+    done, and return its timing.
+    """
+    reps = max(1, -(-min_ops // max(ops, 1)))
+    start = time.perf_counter()
+    for _ in range(reps):
+        func()
+    secs = time.perf_counter() - start
+    ops *= reps
+    return {'ops': ops, 'secs': secs, 'ops_per_sec': ops / secs}
+
+
+def make_ref() -> client.Ref:
+    ref = client.Ref()
+    for line in HEADER:
+        if line[0:2] == b"0,":
+            asyncio.run(ref.parse_ref_obj(line, write=False))
+    ref.session_id = 1
+    return ref
+
+
+def parse_lines(lines) -> client.Ref:
+    """Parse lines one at a time, as the consumer does without frame mode."""
+    ref = make_ref()
+
+    async def run():
+        for line in lines:
+            if line[0:1] == b"#":
+                ref.update_time(line)
+            else:
+                await client.line_to_obj(bytearray(line), ref)
+    asyncio.run(run())
+    return ref
+
+
+def parse_frames(frames) -> client.Ref:
+    ref = make_ref()
+
+    async def run():
+        for frame in frames:
+            ref.update_time(frame[0])
+            await client.frame_to_objs(frame[1:], ref)
+    asyncio.run(run())
+    return ref
+
+
+def micro(settings: dict, seconds: float) -> dict:
+    frames = list(SyntheticACMI(**settings).frames(seconds))
+    lines = [line for frame in frames for line in frame]
+    results = {}
+
+    results['line_to_obj'] = timed(lambda: parse_lines(lines), len(lines))
+    results['frame_to_objs'] = timed(lambda: parse_frames(frames), len(lines))
+
+    ref = parse_frames(frames)
+    store = ref.obj_store
+    coords = list(zip(store.col('lat').tolist(), store.col('lon').tolist(),
+                      store.col('alt').tolist()))
+
+    def cartesian():
+        for lat, lon, alt in coords:
+            client.get_cartesian_coord(lat, lon, alt)
+    results['get_cartesian_coord'] = timed(cartesian, len(coords))
+
+    weapons = [rec for rec in store.values()
+               if rec.Type and 'Weapon' in rec.Type]
+
+    def contact():
+        for rec in weapons:
+            client.determine_contact(rec, ref, 'parent')
+    results['determine_contact'] = timed(contact, len(weapons), 10000)
+
+    recs = list(store.values())
+    writer = client.BinCopyWriter(Event.c, None)
+
+    def add_data():
+        writer.create_byte_buffer()
+        for rec in recs:
+            writer.add_data(rec)
+    results['add_data'] = timed(add_data, len(recs))
+
+    rows = np.arange(len(store), dtype=np.int64)
+
+    def add_rows():
+        writer.create_byte_buffer()
+        writer.add_rows(store, rows)
+    results['add_rows'] = timed(add_rows, len(recs))
+    return results
+
+
+async def serve_and_consume(payload: bytes, **kwargs) -> float:
+    """Serve payload on a local socket, and consume it to the end."""
+    async def handle(reader, writer):
+        await reader.readline()
+        writer.write(payload)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    start = time.perf_counter()
+    await client.consumer('127.0.0.1', port, sink=NullSink(), **kwargs)
+    secs = time.perf_counter() - start
+    server.close()
+    await server.wait_closed()
+    return secs
+
+
+def macro(settings: dict, seconds: float) -> dict:
+    payload = SyntheticACMI(**settings).to_bytes(seconds)
+    n_lines = payload.count(b'\n')
+    results = {}
+    runs = {
+        'consumer_lines': {},
+        'consumer_frames': {'frame_mode': True},
+        'consumer_frames_chunked': {'frame_mode': True,
+                                    'chunk_size': 256 * 1024},
+        'consumer_frames_compressed': {'frame_mode': True,
+                                       'chunk_size': 256 * 1024,
+                                       'compress': True},
+    }
+    for name, kwargs in runs.items():
+        secs = asyncio.run(serve_and_consume(payload, **kwargs))
+        results[name] = {'ops': n_lines, 'secs': secs,
+                         'ops_per_sec': n_lines / secs}
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """Print the change in ops/sec of every benchmark from a baseline."""
+    for name, result in results['results'].items():
+        old = baseline['results'].get(name)
+        if not old:
+            continue
+        change = result['ops_per_sec'] / old['ops_per_sec'] - 1.0
+        print(f"{name:>28}: {result['ops_per_sec']:>14,.0f} ops/sec "
+              f"-- {change:+.1%} vs baseline")
+
+
+def main(seed: int, seconds: float, settings: dict, output: str,
+         baseline: str = None, skip_macro: bool = False) -> dict:
+    settings = dict(settings, seed=seed)
+    results = micro(settings, seconds)
+    if not skip_macro:
+        results.update(macro(settings, seconds))
+    report = {
+        'meta': {'commit': git_commit(), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'time': time.time(),
+                 'seconds': seconds, 'settings': settings},
+        'results': results,
+    }
+    for name, result in results.items():
+        print(f"{name:>28}: {result['ops_per_sec']:>14,.0f} ops/sec "
+              f"-- {result['ops']} ops in {result['secs']:.3f}s")
+    if output:
+        with open(output, 'w') as fp_:
+            json.dump(report, fp_, indent=2)
+    if baseline:
+        with open(baseline) as fp_:
+            compare(report, json.load(fp_))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the synthetic recording')
+    parser.add_argument('--seconds', type=float, default=60.0,
+                        help='Seconds of stream time to generate')
+    parser.add_argument('--aircraft', type=int, default=50,
+                        help='Aircraft alive at any time')
+    parser.add_argument('--ground', type=int, default=200,
+                        help='Ground units alive at any time')
+    parser.add_argument('--weapon-rate', type=float, default=1.0,
+                        help='Weapons launched per second')
+    parser.add_argument('--death-rate', type=float, default=0.005,
+                        help='Deaths per aircraft or ground unit per second')
+    parser.add_argument('--fps', type=float, default=10.0,
+                        help='Frames per second of stream time')
+    parser.add_argument('--output', type=str, default='bench_ingest.json',
+                        help='Write results to this JSON file')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Compare with results of an earlier run')
+    parser.add_argument('--skip-macro', action='store_true',
+                        help='Only run micro-benchmarks?')
+    args = parser.parse_args()
+    main(args.seed, args.seconds,
+         dict(aircraft=args.aircraft, ground=args.ground,
+              weapon_rate=args.weapon_rate, death_rate=args.death_rate,
+              fps=args.fps),
+         args.output, args.baseline, args.skip_macro)
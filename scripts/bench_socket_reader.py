@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Compare throughput of the per-line and chunked tacview socket readers."""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path('.').parent.absolute()))
+from dcs.tacview import client
+
+SAMPLE_LINES = [
+    b"#1.02",
+    b"802,T=6.3596289|5.139203|342.67|||7.3|729234.25|-58312.28|,"
+    b"Type=Ground+Static+Aerodrome,Name=FARP,Color=Blue,"
+    b"Coalition=Enemies,Country=us",
+    b"4001,T=4.6361975|6.5404775|1487.59|0.1|-2.3|357.8|-347259.72|"
+    b"380887.44|355.1",
+    b"4002,T=4.6361975|6.5404775|1487.59",
+    b"0,Event=Message|4001|A long comment\\",
+    b"that continues on the next line",
+    b"-4002",
+]
+
+
+def make_payload(total_lines: int) -> bytes:
+    """Build a payload of roughly total_lines lines from the sample lines."""
+    reps = max(1, total_lines // len(SAMPLE_LINES))
+    return b'\n'.join(SAMPLE_LINES * reps) + b'\n'
+
+
+async def run_reader(payload: bytes, chunk_size=None, batched=False):
+    """Serve payload on a local socket and time reading it back.
+
+    If batched is set, lines are taken a chunk at a time from read_lines
+    rather than one at a time from read_stream.  Lines are counted as the
+    chunked reader returns them, with continued lines joined, so every mode
+    counts the same lines.
+    """
+    async def handle(reader, writer):
+        writer.write(payload)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    sock = client.AsyncSocketReader('127.0.0.1', port, chunk_size=chunk_size)
+    sock.reader, sock.writer = await asyncio.open_connection('127.0.0.1',
+                                                             port)
+    if chunk_size:
+        sock.chunk_reader = client.ChunkedStreamReader(sock.reader,
+                                                       chunk_size)
+    lines = 0
+    start = time.perf_counter()
+    try:
+        if batched:
+            while True:
+                lines += len(await sock.chunk_reader.read_lines())
+        while True:
+            line = await sock.read_stream()
+            if line[-1:] != b'\\':
+                lines += 1
+    except asyncio.IncompleteReadError:
+        pass
+    elapsed = time.perf_counter() - start
+
+    sock.writer.close()
+    server.close()
+    await server.wait_closed()
+    return lines, elapsed
+
+
+def main(total_lines: int, chunk_sizes) -> None:
+    payload = make_payload(total_lines)
+    print(f"Payload: {len(payload) / 1e6:.2f} MB")
+    runs = [('readuntil', None, False)]
+    for chunk_size in chunk_sizes:
+        runs.append((f"chunked-{chunk_size // 1024}KiB", chunk_size, False))
+        runs.append((f"batched-{chunk_size // 1024}KiB", chunk_size, True))
+
+    for name, chunk_size, batched in runs:
+        lines, elapsed = asyncio.run(run_reader(payload, chunk_size, batched))
+        print(f"{name:>16}: {lines} lines in {elapsed:.3f}s "
+              f"-- {lines / elapsed:,.0f} lines/sec "
+              f"-- {len(payload) / elapsed / 1e6:.1f} MB/sec")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=1000000,
+                        help='Number of lines to send')
+    parser.add_argument('--chunk-sizes', type=int, nargs='+',
+                        default=[64 * 1024, 128 * 1024, 256 * 1024],
+                        help='Chunk sizes, in bytes, to benchmark')
+    args = parser.parse_args()
+    main(args.lines, args.chunk_sizes)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""Ingest recorded ACMI files, plain, gzipped or stream archives, straight to
+the database.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path('.').parent.absolute()))
+from dcs.tacview import ingest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='+', help='Files to ingest, in order')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processes parsing chunks; defaults to all cores')
+    parser.add_argument('--chunk-size', type=int,
+                        default=ingest.DEFAULT_CHUNK_SIZE,
+                        help='Approximate bytes of frames per chunk')
+    parser.add_argument('--copy-concurrency', type=int, default=1,
+                        help='Event flushes to run at once')
+    parser.add_argument('--flush-rows', type=int, default=100000,
+                        help='Events per flush')
+    parser.add_argument('--compress', action='store_true',
+                        help='Drop events predictable by dead reckoning?')
+    parser.add_argument('--start', type=float, default=None,
+                        help='Ingest frames from this time offset')
+    parser.add_argument('--end', type=float, default=None,
+                        help='Ingest frames up to this time offset')
+    parser.add_argument('--segment', type=int, default=0,
+                        help='Segment of a stream archive to ingest')
+    args = parser.parse_args()
+    ingest.main(args.paths, workers=args.workers, chunk_size=args.chunk_size,
+                copy_concurrency=args.copy_concurrency,
+                flush_rows=args.flush_rows, compress=args.compress,
+                start=args.start, end=args.end, segment=args.segment)
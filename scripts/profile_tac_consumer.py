@@ -24,6 +24,42 @@ if __name__=='__main__':
                         help='Filename to process')
     parser.add_argument('--bulk', action='store_true',
                         help='Should the program run in bulk mode?')
+    parser.add_argument('--frame-mode', action='store_true',
+                        help='Parse a full frame of lines at a time?')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Read the socket in chunks of this many bytes')
+    parser.add_argument('--attribution-workers', type=int, default=0,
+                        help='Resolve parents and impacts on this many workers')
+    parser.add_argument('--flush-queue-size', type=int, default=2,
+                        help='Number of filled event buffers awaiting flush')
+    parser.add_argument('--flush-overflow', type=str, default='wait',
+                        choices=['wait', 'coalesce'],
+                        help='Wait, or keep filling, when the queue is full')
+    parser.add_argument('--flush-max-latency', type=float, default=None,
+                        help='Flush events at most this many seconds late')
+    parser.add_argument('--flush-target-rows', type=int, default=None,
+                        help='Flush at this many rows, rather than adapting')
+    parser.add_argument('--compress', action='store_true',
+                        help='Drop events predictable by dead reckoning?')
+    parser.add_argument('--event-range-secs', type=float, default=None,
+                        help='Partition session events by ranges of seconds')
+    parser.add_argument('--metrics-json', type=str, default=None,
+                        help='Dump consumer metrics to this JSON file on exit')
+    parser.add_argument('--sink', type=str, default='postgres',
+                        help='Write to postgres, null, sqlite:<path> or '
+                             'parquet:<dir>')
+    parser.add_argument('--export-dir', type=str, default=None,
+                        help='Also export events as Parquet to this dir')
+    parser.add_argument('--archive', type=str, default=None,
+                        help='Archive the raw stream to this .gz or .zst file')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='Replay the file at this multiple of real time; '
+                             '0 for max')
+    parser.add_argument('--target-lps', type=float, default=None,
+                        help='Synthesize objects to reach these lines/sec')
+    parser.add_argument('--live-port', type=int, default=None,
+                        help='Serve live object state to the coord server '
+                             'on this port')
     args = parser.parse_args()
 
     if args.profile:
@@ -31,7 +67,8 @@ if __name__=='__main__':
         yappi.start(builtins=True)
 
     server_proc = Process(target=partial(
-        serve_test_data.main, filename=args.filename))
+        serve_test_data.main, filename=args.filename, speed=args.speed,
+        target_lps=args.target_lps))
     server_proc.start()
 
     client.main(host='127.0.0.1',
@@ -39,9 +76,23 @@ if __name__=='__main__':
                 debug=False,
                 max_iters=args.iters,
                 only_proc=False,
-                bulk=args.bulk)
+                bulk=args.bulk,
+                frame_mode=args.frame_mode,
+                chunk_size=args.chunk_size,
+                attribution_workers=args.attribution_workers,
+                flush_queue_size=args.flush_queue_size,
+                flush_overflow=args.flush_overflow,
+                flush_max_latency=args.flush_max_latency,
+                flush_target_rows=args.flush_target_rows,
+                compress=args.compress,
+                event_range_secs=args.event_range_secs,
+                metrics_json=args.metrics_json,
+                sink=args.sink,
+                export_dir=args.export_dir,
+                archive_path=args.archive,
+                live_port=args.live_port)
 
-    if not args.profile:
+    if not args.profile and args.sink == 'postgres':
         client.check_results()
 
     server_proc.terminate()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""Consume several Tacview servers from one supervisor."""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path('.').parent.absolute()))
+from dcs.tacview import supervisor
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('servers', nargs='+',
+                        help='Preset names, host:port or name=host:port')
+    parser.add_argument('--mode', choices=['tasks', 'processes'],
+                        default='tasks',
+                        help='Consume servers as tasks of one loop, '
+                        'or in a process each')
+    parser.add_argument('--pool-size', type=int, default=4,
+                        help='Connections shared by all servers, in tasks mode')
+    parser.add_argument('--log-interval', type=float, default=30.0,
+                        help='Seconds between logging per-server stats')
+    parser.add_argument('--frame-mode', action='store_true',
+                        help='Parse a full frame of lines at a time?')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Read sockets in chunks of this many bytes')
+    parser.add_argument('--compress', action='store_true',
+                        help='Drop events predictable by dead reckoning?')
+    parser.add_argument('--reconnect', action='store_true',
+                        help='Reconnect dropped servers, keeping their state?')
+    parser.add_argument('--checkpoint-dir', type=str, default=None,
+                        help='Checkpoint each server to a file in this dir')
+    parser.add_argument('--archive-dir', type=str, default=None,
+                        help='Archive the raw stream of each server here')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve metrics of all servers on this port')
+    args = parser.parse_args()
+
+    kwargs = dict(frame_mode=args.frame_mode, chunk_size=args.chunk_size,
+                  compress=args.compress, reconnect=args.reconnect,
+                  checkpoint_dir=args.checkpoint_dir,
+                  archive_dir=args.archive_dir)
+    if args.mode == 'tasks':
+        kwargs.update(pool_size=args.pool_size,
+                      log_interval=args.log_interval,
+                      metrics_port=args.metrics_port)
+    supervisor.main(args.servers, args.mode, **kwargs)
@@ -0,0 +1,48 @@
+"""Fixtures shared by tests of the tacview client."""
+import asyncio
+from typing import Iterable, Optional
+
+import pytest
+
+from dcs.tacview import client
+
+HEADER = [
+    b"0,RecordingTime=2019-01-01T12:12:01.5Z",
+    b"0,ReferenceLatitude=42",
+    b"0,ReferenceLongitude=41",
+]
+
+FRAME = [
+    b"101,T=0|0.01|5000,Type=Air+FixedWing,Name=FA-18C,Color=Blue",
+    b"102,T=0.5|0|10,Type=Ground+Static,Color=Red",
+]
+
+
+def build_ref(frame: Iterable[bytes] = FRAME, sink=None,
+              session_id: Optional[int] = None, marker: bytes = b"#1.0",
+              header: Iterable[bytes] = HEADER) -> client.Ref:
+    """Return a Ref of the references of header, at the time of marker,
+    having parsed the lines of frame.
+
+    Unless session_id is given, the session is written to sink.
+    """
+    ref = client.Ref()
+    if sink is not None:
+        ref.sink = sink
+    for line in header:
+        asyncio.run(ref.parse_ref_obj(line, write=False))
+    if session_id is None:
+        asyncio.run(ref.write_session())
+    else:
+        ref.session_id = session_id
+    ref.update_time(marker)
+    frame = list(frame)
+    if frame:
+        asyncio.run(client.frame_to_objs(frame, ref))
+    return ref
+
+
+@pytest.fixture
+def make_ref():
+    """Factory of Refs, taking the arguments of build_ref."""
+    return build_ref
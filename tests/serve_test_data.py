@@ -1,63 +1,191 @@
 #!/usr/bin/env python3
 """Socket Perf Test.
+
+Replay a recording to any number of clients at once, as a Tacview server
+would.  The file is split into frames once, when loaded, and every client
+is served from that single copy: plain files are memory mapped, gzipped
+files and stream archives decompressed into memory.  Frames are paced by
+their time markers at speed times real time, or sent as fast as each client
+reads them if speed is 0.  If target_lps is set, aircraft are synthesized
+into every frame, to reach that many lines per second of stream time.
+
+Consumers of a single ingest node may all be pointed at one server, as in
+`supervise_tacview.py a=127.0.0.1:5555 b=127.0.0.1:5555 ...`, to measure how
+many servers the node keeps up with.
 """
 import argparse
 import asyncio
 from asyncio.log import logging
 import gzip
-from functools import partial
+import math
+import mmap
 import sys
 from pathlib import Path
+from typing import List, Optional, Tuple
 
-from google.cloud import storage
+sys.path.append(str(Path('.').parent.absolute()))
+from dcs.tacview import archive
+from dcs.tacview.ingest import FRAME_START, split_header
+from dcs.tacview.synthetic import SyntheticACMI
 
 logging.basicConfig(level=logging.INFO)
 LOG = logging.getLogger('test_server')
 LOG.propagate=False
 LOG.setLevel(logging.INFO)
 
+# Ids of synthesized objects, clear of those of any recording.
+SYNTHETIC_FIRST_ID = 0x40000000
 
-async def handle_req(reader, writer, filename: str) -> None:
-    """Send data."""
-    try:
-        LOG.info('Connection started...')
-        if filename.endswith('.gz'):
-            fp_ = gzip.open(filename, 'rb')
-        else:
-            fp_ = open(filename, 'rb')
-                # lines = fp_.readlines()
-        await reader.read(4026)
+# Time offset of a frame, and its data from its time marker to the next.
+Frame = Tuple[float, bytes]
 
-        while True:
-            line = fp_.read()
-            if line:
-                writer.write(line)
-            else:
-                break
 
-        await writer.drain()
-        writer.close()
-        LOG.info("All lines sent...closing...")
-    except (ConnectionResetError, BrokenPipeError):
-        writer.close()
+def read_data(filename: str):
+    """Return the contents of a file, memory mapped if plain."""
+    if archive.has_index(filename):
+        return b"\n".join(archive.ArchiveReader(filename).lines()) + b"\n"
+    if filename.endswith('.gz'):
+        with gzip.open(filename, 'rb') as fp_:
+            return fp_.read()
+    with open(filename, 'rb') as fp_:
+        return mmap.mmap(fp_.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def split_frames(data) -> Tuple[bytes, List[Frame]]:
+    """Return the header of data, and views of each of its frames."""
+    _, start = split_header(data)
+    header = bytes(data[:start])
+    view = memoryview(data)
+    frames = []
+    while start < len(data):
+        end = data.find(FRAME_START, start)
+        end = len(data) if end == -1 else end + 1
+        marker_end = data.find(b"\n", start, end)
+        marker_end = end if marker_end == -1 else marker_end
+        frames.append((float(data[start + 1:marker_end]), view[start:end]))
+        start = end
+    return header, frames
+
+
+def add_synthetic(frames: List[Frame], target_lps: float,
+                  fps: float = 10.0, seed: int = 0) -> List[Frame]:
+    """Return frames with aircraft added, to reach target_lps lines per
+    second of stream time.
+    """
+    if len(frames) < 2:
+        return frames
+    duration = frames[-1][0] - frames[0][0]
+    if duration <= 0:
+        return frames
+    lines = sum(bytes(data).count(b"\n") for _, data in frames)
+    extra = target_lps - lines / duration
+    if extra <= 0:
+        return frames
+    aircraft = math.ceil(extra / fps)
+    LOG.info("Synthesizing %d aircraft, for %.0f more lines/sec...",
+             aircraft, extra)
+    gen = SyntheticACMI(seed, aircraft=aircraft, ground=0, weapon_rate=0.0,
+                        death_rate=0.0, fps=fps, first_id=SYNTHETIC_FIRST_ID)
+    gen.time = frames[0][0]
+    merged = []
+    for time_offset, data in frames:
+        data = bytes(data)
+        if not data.endswith(b"\n"):
+            data += b"\n"
+        while gen.time <= time_offset:
+            data += b"".join(line + b"\n" for line in gen.step()[1:])
+        merged.append((time_offset, data))
+    return merged
+
 
+def load(filename: str,
+         target_lps: Optional[float] = None) -> Tuple[bytes, List[Frame]]:
+    header, frames = split_frames(read_data(filename))
+    if target_lps:
+        frames = add_synthetic(frames, target_lps)
+    return header, frames
 
-def run_server(filename: str) -> None:
-    """Read from Tacview socket."""
-    LOG.info('Serving tests data at 127.0.0.1:5555...')
-    loop = asyncio.get_event_loop()
-    loop.create_task(asyncio.start_server(partial(handle_req, filename=filename),
-                                          "127.0.0.1", "5555"))
-    loop.run_forever()
 
+class ReplayServer:
+    """Serve the same frames to every client, each at its own pace.
 
-def main(filename: str) -> None:
+    max_lag is the furthest any client has fallen behind the schedule of
+    its frames, in seconds of real time.
+    """
+    def __init__(self, header: bytes, frames: List[Frame], speed: float = 0.0):
+        self.header = header
+        self.frames = frames
+        self.speed = speed
+        self.clients = 0
+        self.served = 0
+        self.bytes_sent = 0
+        self.max_lag = 0.0
+
+    async def handle_req(self, reader, writer) -> None:
+        """Send data."""
+        self.clients += 1
+        try:
+            LOG.info('Connection started...')
+            await reader.read(4026)
+            writer.write(self.header)
+            loop = asyncio.get_event_loop()
+            start = loop.time()
+            first = self.frames[0][0] if self.frames else 0.0
+            for time_offset, data in self.frames:
+                if self.speed:
+                    delay = ((time_offset - first) / self.speed
+                             - (loop.time() - start))
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        self.max_lag = max(self.max_lag, -delay)
+                writer.write(data)
+                self.bytes_sent += len(data)
+                await writer.drain()
+
+            writer.close()
+            LOG.info("All lines sent...closing...")
+        except (ConnectionResetError, BrokenPipeError):
+            writer.close()
+        finally:
+            self.clients -= 1
+            self.served += 1
+
+
+async def serve(filename: str, host: str = "127.0.0.1", port: int = 5555,
+                speed: float = 0.0, target_lps: Optional[float] = None,
+                log_interval: float = 10.0) -> None:
+    header, frames = load(filename, target_lps)
+    replay = ReplayServer(header, frames, speed)
+    server = await asyncio.start_server(replay.handle_req, host, port)
+    LOG.info('Serving %s at %s:%s -- %d frames -- speed: %s...', filename,
+             host, port, len(frames), speed or 'max')
+    async with server:
+        while True:
+            await asyncio.sleep(log_interval)
+            LOG.info("Clients: %d -- Served: %d -- MB sent: %.1f -- "
+                     "Max lag: %.3f", replay.clients, replay.served,
+                     replay.bytes_sent / 1e6, replay.max_lag)
+
+
+def main(filename: str, host: str = "127.0.0.1", port: int = 5555,
+         speed: float = 0.0, target_lps: Optional[float] = None) -> None:
     try:
-        run_server(filename)
+        asyncio.run(serve(filename, host, port, speed, target_lps))
     except KeyboardInterrupt:
         LOG.info("Keyboard interupt!")
 
 
 if __name__ == "__main__":
-    main(filename='tests/data/tacview-test2.txt')
-
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filename', type=str,
+                        default='tests/data/tacview-test2.txt',
+                        help='Recording, plain, gzipped or a stream archive')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='Multiple of real time to replay at; 0 for max')
+    parser.add_argument('--target-lps', type=float, default=None,
+                        help='Synthesize objects to reach these lines/sec')
+    args = parser.parse_args()
+    main(args.filename, args.host, args.port, args.speed, args.target_lps)
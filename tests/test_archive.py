@@ -0,0 +1,179 @@
+"""Test the raw stream archive and its index."""
+import asyncio
+import gzip
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dcs.tacview import client, ingest
+from dcs.tacview.archive import ArchiveReader, ArchiveWriter, read_index
+from dcs.tacview.synthetic import SyntheticACMI
+
+
+def write_archive(path, seconds=30.0, chunk_secs=5.0, threaded=False):
+    lines = list(SyntheticACMI(seed=1, aircraft=3, ground=3,
+                               fps=2.0).lines(seconds))
+    writer = ArchiveWriter(path, chunk_secs=chunk_secs, threaded=threaded)
+    for line in lines:
+        writer.write_line(line)
+    writer.close()
+    return lines
+
+
+@pytest.mark.parametrize('threaded', [False, True])
+def test_archive_round_trip(tmp_path, threaded):
+    path = str(tmp_path / 'stream.acmi.gz')
+    lines = write_archive(path, threaded=threaded)
+    entries = read_index(path)
+    assert entries[0][1] is None
+    assert [entry[1] for entry in entries[1:]] == [
+        0.0, 5.0, 10.0, 15.0, 20.0, 25.0]
+    assert {entry[0] for entry in entries} == {0}
+
+    with gzip.open(path, 'rb') as fp_:
+        assert fp_.read() == b"\n".join(lines) + b"\n"
+    reader = ArchiveReader(path)
+    assert list(reader.lines()) == lines
+    assert reader.header()[0] == b"FileType=text/acmi/tacview"
+
+
+def test_threaded_writes_never_block_the_loop(tmp_path):
+    """Test that lines are written while chunks are compressed, and that
+    a backlog is drained while other tasks run.
+    """
+    path = str(tmp_path / 'stream.acmi.gz')
+    writer = ArchiveWriter(path, chunk_secs=1.0, threaded=True,
+                           max_pending=2)
+    compress = writer.compress
+    release = threading.Event()
+
+    def slow_compress(raw):
+        release.wait()
+        return compress(raw)
+    writer.compress = slow_compress
+
+    async def run():
+        writer.write_line(b"FileType=text/acmi/tacview")
+        for i in range(5):
+            writer.write_line(f"#{float(i)}".encode())
+            writer.write_line(b"101,T=1|2|3")
+        # The header and four frame chunks, none written yet.
+        assert len(writer.pending) == 5 and writer.backlogged
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+        ticker = asyncio.ensure_future(tick())
+        drained = asyncio.ensure_future(writer.drain())
+        await asyncio.sleep(0.01)
+        assert not drained.done() and ticks > 1
+        release.set()
+        await drained
+        ticker.cancel()
+        assert not writer.backlogged
+    try:
+        asyncio.run(run())
+    finally:
+        release.set()
+    writer.close()
+    assert writer.chunks == 6
+
+
+def test_archive_seek(tmp_path):
+    path = str(tmp_path / 'stream.acmi.gz')
+    write_archive(path)
+    reader = ArchiveReader(path)
+    assert reader.seek(12.0)[0][1] == 10.0
+    assert reader.seek(-1.0)[0][1] == 0.0
+    markers = [marker for marker, _ in reader.frames(12.0, 14.0)]
+    assert markers == [b"#12.00", b"#12.50", b"#13.00", b"#13.50"]
+
+    extracted = str(tmp_path / 'extract.acmi')
+    reader.extract(extracted, start=20.0)
+    with open(extracted, 'rb') as fp_:
+        data = fp_.read().split(b"\n")
+    assert data[:len(reader.header())] == reader.header()
+    assert data[len(reader.header())] == b"#20.00"
+
+
+def test_archive_segments_and_recovery(tmp_path):
+    path = str(tmp_path / 'stream.acmi.gz')
+    write_archive(path, seconds=10.0)
+    writer = ArchiveWriter(path, chunk_secs=5.0)
+    writer.new_segment()
+    for line in [b"FileType=text/acmi/tacview", b"#3.00", b"101,T=1|2|3"]:
+        writer.write_line(line)
+    writer.flush()
+    writer.write_line(b"#60.00")
+    writer.fp_.write(b"partial chunk")
+    writer.fp_.close()
+    writer.index.close()
+
+    writer = ArchiveWriter(path)
+    writer.close()
+    reader = ArchiveReader(path)
+    assert reader.segments == [0, 1]
+    assert list(reader.lines(segment=1)) == [
+        b"FileType=text/acmi/tacview", b"#3.00", b"101,T=1|2|3"]
+    with gzip.open(path, 'rb') as fp_:
+        assert fp_.read().endswith(b"101,T=1|2|3\n")
+
+
+def test_unindexed_file_moved_aside(tmp_path):
+    path = tmp_path / 'stream.acmi.gz'
+    path.write_bytes(gzip.compress(b"FileType=text/acmi/tacview\n"))
+    write_archive(str(path), seconds=5.0)
+    aside = [name for name in os.listdir(tmp_path)
+             if name.startswith('stream.acmi-')]
+    assert len(aside) == 1 and aside[0].endswith('.gz')
+    assert gzip.decompress((tmp_path / aside[0]).read_bytes()) == (
+        b"FileType=text/acmi/tacview\n")
+    assert ArchiveReader(str(path)).segments == [0]
+
+
+def test_archive_zstd(tmp_path):
+    pytest.importorskip('zstandard')
+    path = str(tmp_path / 'stream.acmi.zst')
+    lines = write_archive(path)
+    assert list(ArchiveReader(path).lines()) == lines
+
+
+def test_ingest_reads_archive_chunks(tmp_path):
+    path = str(tmp_path / 'stream.acmi.gz')
+    write_archive(path)
+
+    async def frames():
+        with ThreadPoolExecutor(2) as executor:
+            return [marker async for marker, _ in ingest.read_frames(
+                path, executor, start=24.0, end=26.0)]
+    assert asyncio.run(frames()) == [b"#24.00", b"#24.50", b"#25.00",
+                                     b"#25.50"]
+    assert ingest.read_header(path)[0] == b"FileType=text/acmi/tacview"
+
+
+def test_socket_reader_archives_stream(tmp_path):
+    path = str(tmp_path / 'stream.acmi.gz')
+    payload = SyntheticACMI(seed=2, aircraft=2, ground=2).to_bytes(3.0)
+
+    async def run():
+        async def handle(reader, writer):
+            await reader.readline()
+            writer.write(b"Tacview.RealTimeTelemetry.0\n" + payload)
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        await client.consumer('127.0.0.1', port, frame_mode=True,
+                              sink='null', archive_path=path)
+        server.close()
+        await server.wait_closed()
+    asyncio.run(run())
+
+    with gzip.open(path, 'rb') as fp_:
+        assert fp_.read() == payload
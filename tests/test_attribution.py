@@ -0,0 +1,215 @@
+"""Test asynchronous parent and impact attribution."""
+import asyncio
+
+from dcs.tacview import client
+
+
+class RecordingConn:
+    """Stand-in for an asyncpg connection that records calls made on it."""
+    def __init__(self):
+        self.calls = []
+
+    async def execute(self, sql, *args):
+        self.calls.append((sql, args))
+
+    async def executemany(self, sql, rows):
+        self.calls.append((sql, list(rows)))
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.calls.append((table, list(records)))
+
+
+class RecordingPool:
+    def __init__(self):
+        self.conn = RecordingConn()
+
+    def acquire(self):
+        pool = self
+
+        class Acquire:
+            async def __aenter__(self):
+                return pool.conn
+
+            async def __aexit__(self, *args):
+                return False
+        return Acquire()
+
+
+class BusyConn(RecordingConn):
+    """Stand-in for a single asyncpg connection, which fails if an
+    operation is started while another is in progress.
+    """
+    def __init__(self):
+        super().__init__()
+        self.busy = False
+
+    async def run(self, call):
+        if self.busy:
+            raise RuntimeError("another operation is in progress")
+        self.busy = True
+        try:
+            await asyncio.sleep(0.01)
+            self.calls.append(call)
+        finally:
+            self.busy = False
+
+    async def execute(self, sql, *args):
+        await self.run((sql, args))
+
+    async def executemany(self, sql, rows):
+        await self.run((sql, list(rows)))
+
+    async def copy_records_to_table(self, table, records, columns):
+        await self.run((table, list(records)))
+
+
+def test_parent_and_impact_resolved_off_path(make_ref):
+    ref = make_ref((), session_id=7)
+
+    async def run():
+        queue = client.AttributionQueue(RecordingPool(), workers=2)
+        ref.attribution = queue
+        queue.start()
+
+        await client.frame_to_objs([
+            b"101,T=0|0|5000,Type=Air+FixedWing,Name=FA-18C,Color=Blue",
+            b"102,T=0|0.001|5000,Type=Air+FixedWing,Name=Su-27,Color=Red",
+        ], ref)
+        ref.obj_store[0x101].written = True
+        ref.obj_store[0x102].written = True
+
+        ref.update_time(b"#2.0")
+        await client.frame_to_objs([
+            b"201,T=0|0.0001|5000,Type=Weapon+Missile,Name=AIM-120C,"
+            b"Color=Blue"], ref)
+        assert queue.submitted == 1
+
+        ref.update_time(b"#3.0")
+        await client.frame_to_objs([b"201,T=0|0.0009|5000"], ref)
+        await queue.queue.join()
+        weapon = ref.obj_store[0x201]
+        assert weapon.parent == 0x101
+        # Weapon object not yet written, so its parent is deferred.
+        assert queue.pool.conn.calls == []
+
+        ref.obj_store[0x201].written = True
+        ref.update_time(b"#4.0")
+        queue.submit('impacted', weapon, ref)
+        await queue.stop()
+        return ref, queue
+
+    ref, queue = asyncio.run(run())
+    assert queue.resolved == 2
+    assert queue.dropped == 0
+    calls = dict(queue.pool.conn.calls)
+    parent_sql = [sql for sql in calls if sql.startswith('UPDATE')][0]
+    assert calls[parent_sql][0][0] == 0x101
+    impact = ref.pending.impacts[0]
+    assert impact[1] == 0x101
+    assert impact[2] == 0x102
+    assert impact[3] == 0x201
+    assert impact[4] == 4.0
+    assert ref.obj_store[0x201].impacted == 0x102
+
+
+def test_full_queue_drops_jobs(make_ref):
+    ref = make_ref((), session_id=7)
+
+    async def run():
+        queue = client.AttributionQueue(RecordingPool(), max_queue=1)
+        rec = ref.obj_store.create(1, 1.0, 1.0)
+        rec.Type = 'Weapon+Missile'
+        assert queue.submit('parent', rec, ref)
+        assert not queue.submit('parent', rec, ref)
+        assert queue.depth == 1
+        queue.start()
+        await queue.stop()
+        return queue
+    queue = asyncio.run(run())
+    assert queue.dropped == 1
+    assert queue.submitted == queue.resolved == 1
+
+
+def test_candidates_selected_by_worker(monkeypatch, make_ref):
+    """Test that submitting a job only snapshots the weapon."""
+    ref = make_ref((), session_id=7)
+    selected = []
+
+    def contact_candidates(rec, ref, type='parent'):
+        selected.append(rec.id)
+        return candidates(rec, ref, type)
+    candidates = client.contact_candidates
+    monkeypatch.setattr(client, 'contact_candidates', contact_candidates)
+
+    async def run():
+        queue = client.AttributionQueue(RecordingPool())
+        ref.attribution = queue
+        await client.frame_to_objs([
+            b"101,T=0|0|5000,Type=Air+FixedWing,Name=FA-18C,Color=Blue",
+        ], ref)
+        ref.update_time(b"#2.0")
+        await client.frame_to_objs([
+            b"201,T=0|0.0001|5000,Type=Weapon+Missile,Name=AIM-120C,"
+            b"Color=Blue"], ref)
+        assert queue.depth == 1 and not selected
+        queue.start()
+        await queue.stop()
+        return ref
+    ref = asyncio.run(run())
+    assert selected == [0x201]
+    assert ref.obj_store[0x201].parent == 0x101
+
+
+def test_objects_deaths_and_impacts_flushed_in_bulk(make_ref):
+    ref = make_ref((), session_id=7)
+
+    async def run():
+        conn = RecordingConn()
+        await client.frame_to_objs([
+            b"101,T=0|0|5000,Type=Air+FixedWing,Name=FA-18C,Color=Red",
+            b"201,T=0|0.0001|5000,Type=Weapon+Missile,Color=Blue",
+            b"202,T=0|0.5|5000,Type=Weapon+Bomb,Color=Blue",
+            b"301,T=0|0.1|5000,Type=Ground+Heavy+Armor,Color=Red",
+        ], ref)
+        ref.update_time(b"#2.0")
+        recs = await client.frame_to_objs([b"-201", b"-202", b"-301"], ref)
+        assert [rec.alive for rec in recs] == [0, 0, 0]
+        assert conn.calls == []
+        await ref.pending.flush_objects(conn)
+        assert ref.obj_store[0x301].written
+        await ref.pending.flush(conn)
+        assert len(ref.pending) == 0
+        return conn
+
+    conn = asyncio.run(run())
+    table, objects = conn.calls[0]
+    assert table == 'object'
+    assert [obj[0] for obj in objects] == [0x101, 0x201, 0x202, 0x301]
+    assert objects[0][2] == 'FA-18C'
+    assert conn.calls[1] == (client.PendingWrites.mark_dead_stmt,
+                             ([7, 7, 7], [0x201, 0x202, 0x301]))
+    table, impacts = conn.calls[2]
+    assert table == 'impact'
+    assert impacts == [(7, None, 0x101, 0x201, 2.0, impacts[0][5])]
+
+
+def test_parents_written_on_pool_while_objects_flushed(make_ref):
+    """Test that, with a pool of its own, attribution workers never share
+    the connection objects are written on.
+    """
+    ref = make_ref((), session_id=7)
+
+    async def run():
+        conn, pool = BusyConn(), RecordingPool()
+        sink = client.PostgresSink(conn, pool)
+        await client.frame_to_objs([
+            b"101,T=0|0|5000,Type=Air+FixedWing,Name=FA-18C,Color=Blue",
+            b"201,T=0|0.0001|5000,Type=Weapon+Missile,Color=Blue",
+        ], ref)
+        await asyncio.gather(sink.write_parents([(0x101, 10.0, 7, 0x201)]),
+                             ref.pending.flush_objects(sink))
+        return conn, pool
+    conn, pool = asyncio.run(run())
+    assert [call[0] for call in conn.calls] == ['object']
+    assert pool.conn.calls == [(client.PostgresSink.set_parent_stmt,
+                                [(0x101, 10.0, 7, 0x201)])]
@@ -0,0 +1,137 @@
+"""Test Ref checkpoints and resuming sessions on reconnect."""
+import asyncio
+from datetime import datetime
+import sqlite3
+
+import numpy as np
+import pytest
+
+from dcs.tacview import client
+from dcs.tacview.checkpoint import load_checkpoint, save_checkpoint
+from dcs.tacview.sinks import SQLiteSink
+from tests import conftest
+
+HEADER = [b"FileType=text/acmi/tacview", *conftest.HEADER]
+
+
+class SessionDB:
+    """Stand in for the db connection, numbering sessions."""
+    def __init__(self):
+        self.sessions = 0
+
+    async def fetchval(self, sql, *args):
+        self.sessions += 1
+        return self.sessions
+
+    async def execute(self, sql, *args):
+        pass
+
+
+@pytest.fixture
+def ref(make_ref):
+    ref = make_ref(session_id=7, marker=b"#10.5")
+    ref.written = True
+    ref.obj_store[0x101].written = True
+    return ref
+
+
+def test_checkpoint_round_trip(tmp_path, ref):
+    path = str(tmp_path / 'ref.npz')
+    save_checkpoint(ref, path)
+
+    restored = client.Ref()
+    assert load_checkpoint(restored, path)
+    assert restored.written and restored.all_refs
+    assert restored.session_id == 7
+    assert restored.time_offset == 10.5
+    assert restored.start_time == ref.start_time
+    assert sorted(restored.obj_store) == [0x101, 0x102]
+    obj = restored.obj_store[0x101]
+    assert obj.Name == 'FA-18C' and obj.Color == 'Blue' and obj.written
+    assert not restored.obj_store[0x102].written
+    for name, col in ref.obj_store.cols.items():
+        np.testing.assert_array_equal(restored.obj_store.col(name),
+                                      col[:ref.obj_store.size])
+    # New objects are added after those restored.
+    restored.obj_store.create(0x103)
+    assert restored.obj_store.index[0x103] == 2
+    assert restored.obj_store[0x101].Name == 'FA-18C'
+
+
+def test_missing_checkpoint(tmp_path):
+    assert not load_checkpoint(client.Ref(), str(tmp_path / 'none.npz'))
+
+
+def test_same_mission(ref):
+    other = client.Ref()
+    other.lat, other.lon, other.start_time = ref.lat, ref.lon, ref.start_time
+    assert ref.same_mission(other, 12.0)
+    assert not ref.same_mission(other, 2.0)
+    other.start_time = datetime(2020, 1, 1)
+    assert not ref.same_mission(other, 12.0)
+
+
+def replay(sock, lines):
+    """Resume a socket reader from lines, rather than a server."""
+    sock.pushback.extend(lines)
+    asyncio.run(sock.resume())
+    return [bytes(line) for line in sock.pushback]
+
+
+def test_resume_keeps_same_mission(monkeypatch, ref):
+    monkeypatch.setattr(client, 'DB', SessionDB())
+    sock = client.AsyncSocketReader('127.0.0.1', 5555)
+    sock.ref = ref
+    lines = HEADER + [b"#11.0", b"101,T=0|0.02|5000"]
+    replayed = replay(sock, lines)
+    assert sock.ref is ref
+    assert sock.resumed == 1
+    assert client.DB.sessions == 0
+    # Every line read is replayed, ahead of those not yet read.
+    assert replayed == lines
+
+
+def test_resume_starts_new_mission(monkeypatch, ref):
+    monkeypatch.setattr(client, 'DB', SessionDB())
+    sock = client.AsyncSocketReader('127.0.0.1', 5555)
+    old = sock.ref = ref
+    old.event_range_secs = 60.0
+    replay(sock, [HEADER[0], b"0,RecordingTime=2019-01-02T12:12:01.5Z"]
+           + HEADER[2:] + [b"#0.0"])
+    assert sock.ref is not old
+    assert sock.ref.session_id == 1 and sock.ref.written
+    assert sock.ref.event_range_secs == 60.0
+    assert len(sock.ref.obj_store) == 0
+
+
+def test_new_mission_keeps_objects_with_same_ids(tmp_path, make_ref):
+    """Test that objects of a new mission never replace those of the last,
+    whatever their ids.
+    """
+    sink = SQLiteSink(str(tmp_path / 'dcs.db'))
+    old = make_ref(sink=sink)
+    writer = sink.writer()
+    sock = client.AsyncSocketReader('127.0.0.1', 5555)
+    sock.ref = old
+
+    async def flush(ref):
+        await ref.pending.flush_objects(sink)
+        writer.add_rows(ref.obj_store,
+                        np.arange(len(ref.obj_store), dtype=np.int64))
+        await writer.flush(ref.pending)
+    asyncio.run(flush(old))
+    replay(sock, [HEADER[0], b"0,RecordingTime=2019-01-02T12:12:01.5Z"]
+           + HEADER[2:] + [b"#0.0"])
+    new = sock.ref
+    assert new is not old and new.sink is sink
+    asyncio.run(client.frame_to_objs(
+        [b"101,T=0|0.01|4000,Type=Air+FixedWing,Name=F-16C,Color=Red"], new))
+    asyncio.run(flush(new))
+    asyncio.run(sink.close())
+
+    conn = sqlite3.connect(sink.path)
+    assert conn.execute(
+        "SELECT session_id, id, name, alt FROM object "
+        "ORDER BY session_id, id").fetchall() == [
+            (1, 0x101, 'FA-18C', 5000.0), (1, 0x102, None, 10.0),
+            (2, 0x101, 'F-16C', 4000.0)]
@@ -0,0 +1,67 @@
+"""Test dead reckoning event compression."""
+import asyncio
+
+import numpy as np
+import pytest
+
+from dcs.tacview import client
+from dcs.tacview.compress import EventCompressor, wrap_degrees
+
+
+@pytest.fixture
+def ref(make_ref):
+    return make_ref((), session_id=1, marker=b"#0.0")
+
+
+def run_frames(ref, compressor, frames):
+    """Parse each frame in turn, returning the ids written for each."""
+    written = []
+    for i, lines in enumerate(frames):
+        ref.update_time(f"#{float(i)}".encode())
+        recs = asyncio.run(client.frame_to_objs(lines, ref))
+        rows = compressor.filter(np.array([rec.row for rec in recs]))
+        written.append(ref.obj_store.col('id')[rows].tolist())
+    return written
+
+
+def test_static_objects_dropped_until_keyframe(ref):
+    compressor = EventCompressor(ref.obj_store, keyframe_secs=3.0)
+    frames = [[b"801,T=0|0|10,Type=Ground+Static,Color=Red"]]
+    frames += [[b"801,T=0|0|10"]] * 6
+    written = run_frames(ref, compressor, frames)
+    assert written == [[0x801], [], [], [0x801], [], [], [0x801]]
+    assert compressor.kept == 3
+    assert compressor.dropped == 4
+
+
+def test_linear_motion_extrapolated(ref):
+    compressor = EventCompressor(ref.obj_store, keyframe_secs=100.0,
+                                 velocity_tol=1000.0)
+    frames = [[f"101,T=0|{i * 0.001:.3f}|5000,Type=Air+FixedWing".encode()]
+              for i in range(6)]
+    # Turn sharply away from the extrapolated track.
+    frames.append([b"101,T=0.01|0.005|5000"])
+    written = run_frames(ref, compressor, frames)
+    # First row is a birth, the second sets the rate of change.
+    assert written[:2] == [[0x101], [0x101]]
+    assert written[2:6] == [[], [], [], []]
+    assert written[6] == [0x101]
+
+
+def test_attitude_and_deaths_always_checked(ref):
+    compressor = EventCompressor(ref.obj_store, attitude_tol=5.0)
+    frames = [
+        [b"201,T=0|0|10|0|0|359,Type=Sea+Watercraft,Color=Blue",
+         b"202,T=1|1|10,Type=Ground+Static,Color=Blue"],
+        [b"201,T=0|0|10|0|0|1", b"202,T=1|1|10"],
+        [b"201,T=0|0|10|0|0|20", b"-202"],
+    ]
+    written = run_frames(ref, compressor, frames)
+    # A 2 degree turn across north is within tolerance.
+    assert written[1] == []
+    assert written[2] == [0x201, 0x202]
+
+
+def test_wrap_degrees():
+    assert wrap_degrees(np.array([358.0, -358.0, 180.0, 10.0])).tolist() == [
+        -2.0, 2.0, -180.0, 10.0]
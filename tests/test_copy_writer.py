@@ -0,0 +1,221 @@
+"""Test asynchronous event COPY writer."""
+import asyncio
+from struct import calcsize
+
+import pytest
+
+from dcs.common.db import Event
+from dcs.tacview import client
+from dcs.tacview.metrics import Metrics
+
+
+class FakeConn:
+    """Stand-in for an asyncpg connection, recording calls in order."""
+    def __init__(self, log, delay=0.0):
+        self.log = log
+        self.delay = delay
+
+    def transaction(self):
+        conn = self
+
+        class Transaction:
+            async def __aenter__(self):
+                conn.log.append('begin')
+
+            async def __aexit__(self, *args):
+                conn.log.append('commit')
+                return False
+        return Transaction()
+
+    async def execute(self, sql, *args):
+        self.log.append(sql.split()[0] if not args else ('execute', args))
+
+    async def copy_to_table(self, table, source, format):
+        await asyncio.sleep(self.delay)
+        self.log.append(('copy', table, len(source)))
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.log.append(('records', table, len(records)))
+
+
+class FakePool:
+    """Stand-in for an asyncpg pool, reusing idle connections."""
+    def __init__(self, delay=0.0, init=client.AsyncBinCopyWriter.init_connection):
+        self.log = []
+        self.delay = delay
+        self.init = init
+        self.idle = []
+        self.created = 0
+        self.active = 0
+        self.max_active = 0
+
+    def acquire(self):
+        pool = self
+
+        class Acquire:
+            async def __aenter__(self):
+                pool.active += 1
+                pool.max_active = max(pool.max_active, pool.active)
+                if pool.idle:
+                    self.conn = pool.idle.pop()
+                else:
+                    self.conn = FakeConn(pool.log, pool.delay)
+                    pool.created += 1
+                    await pool.init(self.conn)
+                return self.conn
+
+            async def __aexit__(self, *args):
+                pool.active -= 1
+                pool.idle.append(self.conn)
+                return False
+        return Acquire()
+
+
+def make_rec(id_, updates=1):
+    rec = client.ObjectRec(id_, 1.0, 1.0, 1)
+    rec.lat, rec.lon, rec.u_coord, rec.v_coord = 1.0, 2.0, 3.0, 4.0
+    rec.updates = updates
+    return rec
+
+
+def test_flush_order_and_deaths_after_events():
+    async def run():
+        pool = FakePool()
+        writer = client.AsyncBinCopyWriter(Event.c, pool, min_insert_size=2)
+        pending = client.PendingWrites()
+        writer.add_data(make_rec(1))
+        pending.add_dead(1, 1)
+        assert not await writer.insert_data(pending)
+        assert pending.dead == [(1, 1)]
+
+        writer.add_data(make_rec(2))
+        assert await writer.insert_data(pending)
+        assert pending.dead == []
+        await writer.cleanup(pending)
+        return pool, writer
+
+    pool, writer = asyncio.run(run())
+    assert pool.log[:3] == ['CREATE', 'PREPARE', 'begin']
+    copy = pool.log[3]
+    assert copy[:2] == ('copy', 'event_stage')
+    assert copy[2] == (len(writer.copy_header) + 2 * calcsize(writer.fmt_str)
+                       + len(writer.copy_trailer))
+    assert pool.log[4:6] == ['EXECUTE', 'EXECUTE']
+    assert pool.log[6] == ('execute', ([1], [1]))
+    assert pool.log[7] == 'commit'
+    assert len(writer.event_times) == 1
+    assert writer.insert_count == 0
+
+
+def test_flushes_in_flight_are_bounded():
+    async def run():
+        pool = FakePool(delay=0.01)
+        writer = client.AsyncBinCopyWriter(Event.c, pool, max_in_flight=2)
+        for i in range(6):
+            writer.add_data(make_rec(i))
+            await writer.insert_data()
+        await writer.cleanup()
+        return pool, writer
+
+    pool, writer = asyncio.run(run())
+    assert pool.max_active == 2
+    assert len(writer.event_times) == 6
+    assert writer.failures == 0
+
+
+def test_full_queue_waits_and_records_wait():
+    async def run():
+        pool = FakePool(delay=0.01)
+        writer = client.AsyncBinCopyWriter(Event.c, pool, max_pending=1)
+        for i in range(4):
+            writer.add_data(make_rec(i))
+            assert await writer.insert_data()
+            assert writer.pending <= 1
+        await writer.cleanup()
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.flushes == 4
+    assert writer.buffer_wait_time > 0
+    assert writer.buffer_wait_max <= writer.buffer_wait_time
+    assert len(writer.event_times) == 4
+    # Flushed buffers are recycled, not reallocated.
+    assert len(writer.free) <= 3
+
+
+def test_full_queue_coalesces_into_current_buffer():
+    async def run():
+        pool = FakePool(delay=0.01)
+        writer = client.AsyncBinCopyWriter(Event.c, pool, max_pending=1,
+                                           overflow='coalesce')
+        pending = client.PendingWrites()
+        handed_off = []
+        for i in range(4):
+            writer.add_data(make_rec(i))
+            pending.add_dead(1, i)
+            handed_off.append(await writer.insert_data(pending))
+            # Let a worker pick up the queued buffer.
+            await asyncio.sleep(0)
+        assert handed_off == [True, True, False, False]
+        assert writer.insert_count == 2
+        assert pending.dead == [(1, 2), (1, 3)]
+        await writer.cleanup(pending)
+        return pool, writer
+
+    pool, writer = asyncio.run(run())
+    assert writer.coalesced == 2
+    assert writer.buffer_wait_time < 0.01
+    copies = [entry[2] for entry in pool.log
+              if isinstance(entry, tuple) and entry[0] == 'copy']
+    row = calcsize(writer.fmt_str)
+    assert sorted(copies)[-1] == (len(writer.copy_header) + 2 * row
+                                  + len(writer.copy_trailer))
+    deaths = [entry[1][1] for entry in pool.log
+              if isinstance(entry, tuple) and entry[0] == 'execute']
+    assert deaths == [[0], [1], [2, 3]]
+
+
+def test_invalid_overflow_policy():
+    with pytest.raises(ValueError):
+        client.AsyncBinCopyWriter(Event.c, FakePool(), overflow='drop')
+
+
+def test_staging_table_created_once_per_connection():
+    async def run():
+        pool = FakePool()
+        writer = client.AsyncBinCopyWriter(Event.c, pool)
+        for i in range(3):
+            writer.add_data(make_rec(i))
+            await writer.insert_data()
+            await writer.wait()
+        await writer.cleanup()
+        return pool, writer
+
+    pool, writer = asyncio.run(run())
+    assert pool.created == 1
+    assert pool.log.count('CREATE') == 1
+    assert pool.log.count('PREPARE') == 1
+    assert pool.log.count('EXECUTE') == 6
+    assert set(writer.phase_times) == {'connect', 'copy', 'insert', 'upsert',
+                                       'commit'}
+    assert sum(writer.phase_times.values()) <= sum(writer.event_times) + 1e-6
+
+
+def test_flush_phases_recorded_in_metrics():
+    async def run():
+        writer = client.AsyncBinCopyWriter(Event.c, FakePool(), 1)
+        writer.metrics = Metrics()
+        pending = client.PendingWrites()
+        writer.add_data(make_rec(1))
+        pending.add_dead(1, 1)
+        await writer.insert_data(pending)
+        await writer.cleanup()
+        return writer
+
+    writer = asyncio.run(run())
+    hists = writer.metrics.histograms
+    for phase in ['connect', 'copy', 'insert', 'upsert', 'dead', 'impacts',
+                  'commit']:
+        assert hists[f'flush_{phase}_seconds'].count == 1
+    assert hists['flush_seconds'].count == 1
+    assert writer.db_event_time == sum(writer.event_times) > 0
@@ -0,0 +1,61 @@
+"""Test event table partitioning."""
+import asyncio
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from dcs.common import db
+from dcs.tacview import client
+from tests.test_attribution import RecordingConn
+
+
+def test_event_partitioned_by_session():
+    sql = str(CreateTable(db.Event).compile(dialect=postgresql.dialect()))
+    assert 'PARTITION BY LIST (session_id)' in sql
+
+
+def test_session_partition_sql():
+    assert db.event_partition_sql(7) == [
+        "CREATE TABLE IF NOT EXISTS event_s7 PARTITION OF event "
+        "FOR VALUES IN (7)"]
+
+
+def test_session_time_range_partition_sql():
+    stmts = db.event_partition_sql(7, range_secs=3600, ranges=2)
+    assert stmts[0].endswith("FOR VALUES IN (7) PARTITION BY RANGE (last_seen)")
+    assert stmts[1:] == [
+        "CREATE TABLE IF NOT EXISTS event_s7_r0 PARTITION OF event_s7 "
+        "FOR VALUES FROM (0) TO (3600)",
+        "CREATE TABLE IF NOT EXISTS event_s7_r1 PARTITION OF event_s7 "
+        "FOR VALUES FROM (3600) TO (7200)",
+        "CREATE TABLE IF NOT EXISTS event_s7_default PARTITION OF event_s7 "
+        "DEFAULT",
+    ]
+
+
+def test_detach_partition_sql():
+    assert db.detach_event_partition_sql(7) == [
+        "ALTER TABLE event DETACH PARTITION event_s7"]
+    assert db.detach_event_partition_sql(7, drop=True, concurrently=True) == [
+        "ALTER TABLE event DETACH PARTITION event_s7 CONCURRENTLY",
+        "DROP TABLE event_s7"]
+
+
+def test_partition_created_with_session(monkeypatch):
+    class SessionConn(RecordingConn):
+        async def fetchval(self, sql, *args):
+            self.calls.append((sql, args))
+            return 12
+
+    conn = SessionConn()
+    monkeypatch.setattr(client, 'DB', conn, raising=False)
+    ref = client.Ref()
+    ref.event_range_secs = 600
+    for line in [b"0,ReferenceLongitude=41", b"0,ReferenceLatitude=42",
+                 b"0,RecordingTime=2019-01-01T12:12:01.5Z"]:
+        asyncio.run(ref.parse_ref_obj(line))
+
+    assert ref.session_id == 12
+    assert ref.written
+    stmts = [sql for sql, _ in conn.calls[1:]]
+    assert stmts == db.event_partition_sql(12, 600)
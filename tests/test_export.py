@@ -0,0 +1,113 @@
+"""Test rolling Parquet export of events."""
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from dcs.tacview import client
+from dcs.tacview.export import (RollingEventWriter, event_exporter,
+                                list_sessions, read_session)
+from dcs.tacview.sinks import EVENT_COLUMNS
+from dcs.tacview.store import NULL_INT
+from dcs.tacview.synthetic import SyntheticACMI
+
+pytest.importorskip('pyarrow')
+
+
+def make_columns(session_ids, start=0.0):
+    rows = len(session_ids)
+    columns = {name: np.arange(rows, dtype=np.float64) + start
+               for name in EVENT_COLUMNS}
+    for name in ['id', 'alive', 'updates']:
+        columns[name] = np.arange(rows, dtype=np.int64) + 0x100
+    columns['session_id'] = np.array(session_ids, dtype=np.int64)
+    return columns
+
+
+def test_rolling_writer_partitions_and_rotates(tmp_path):
+    root = str(tmp_path)
+    writer = RollingEventWriter(root, max_rows=2, float32=True)
+    writer.write(make_columns([1, 1, 2]))
+    assert os.listdir(os.path.join(root, 'session_id=2')) == [
+        'events-00000.parquet.part']
+    assert list(read_session(root, 1)['last_seen']) == [0.0, 1.0]
+    writer.write(make_columns([1, 1, 1], start=3.0))
+    writer.close()
+    assert list_sessions(root) == [1, 2]
+    assert writer.files_written == 3 and writer.rows_written == 6
+    assert len(os.listdir(os.path.join(root, 'session_id=1'))) == 2
+
+    frame = read_session(root, 1)
+    assert len(frame) == 5
+    assert frame['id'].dtype == np.int64
+    assert frame['roll'].dtype == np.float32
+    assert frame['lat'].dtype == np.float64
+    assert frame['last_seen'].tolist() == [0.0, 1.0, 3.0, 4.0, 5.0]
+    assert read_session(root, 1, categorical=True)['id'].dtype == 'category'
+    assert len(read_session(root, 1, columns=['id'], start=1.0, end=5.0)) == 3
+    with pytest.raises(FileNotFoundError):
+        read_session(root, 3)
+
+
+def test_rolling_writer_closes_idle_sessions(tmp_path):
+    root = str(tmp_path)
+    writer = RollingEventWriter(root, max_secs=60.0)
+    writer.write(make_columns([1, 2]))
+    writer.files[1]['opened'] -= 60.0
+    writer.write(make_columns([2]))
+    assert sorted(writer.files) == [2]
+    assert os.listdir(os.path.join(root, 'session_id=1')) == [
+        'events-00000.parquet']
+
+    writer.write(make_columns([3]))
+    assert sorted(writer.files) == [3]
+    assert len(read_session(root, 2)) == 2
+    writer.close()
+
+
+def test_rolling_writer_nulls(tmp_path):
+    columns = make_columns([1, 1])
+    columns['alive'][0] = NULL_INT
+    columns['lat'][1] = np.nan
+    writer = RollingEventWriter(str(tmp_path))
+    writer.write(columns)
+    writer.close()
+    frame = read_session(str(tmp_path), 1)
+    assert np.isnan(frame['alive'][0]) and np.isnan(frame['lat'][1])
+
+
+def test_consumer_export(tmp_path):
+    root = str(tmp_path / 'events')
+    payload = SyntheticACMI(seed=5, aircraft=5, ground=5).to_bytes(5.0)
+
+    async def run():
+        async def handle(reader, writer):
+            await reader.readline()
+            writer.write(payload)
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        await client.consumer('127.0.0.1', port, frame_mode=True,
+                              sink='null', export_dir=root)
+        server.close()
+        await server.wait_closed()
+    asyncio.run(run())
+
+    assert list_sessions(root) == [1]
+    frame = read_session(root, 1)
+    assert len(frame) > 10
+    assert frame['session_id'].unique().tolist() == [1]
+    assert frame['last_seen'].max() >= 4.0
+
+
+def test_event_exporter_batches(tmp_path, make_ref):
+    export = event_exporter(str(tmp_path), batch_rows=100)
+    ref = make_ref([b"101,T=0|0.01|5000,Type=Air+FixedWing"], session_id=1)
+    export.add_rows(ref.obj_store, np.arange(1, dtype=np.int64))
+    assert not asyncio.run(export.insert_data())
+    asyncio.run(export.cleanup())
+    asyncio.run(export.sink.close())
+    assert read_session(str(tmp_path), 1)['id'].tolist() == [0x101]
@@ -0,0 +1,65 @@
+"""Test adaptive event flush policy."""
+import asyncio
+
+import pytest
+
+from dcs.common.db import Event
+from dcs.tacview import client
+from dcs.tacview.flush import FlushPolicy
+from tests.test_copy_writer import FakePool, make_rec
+
+
+def test_flush_on_rows_bytes_or_latency():
+    policy = FlushPolicy(max_latency=1.0, target_rows=100, target_bytes=1000)
+    assert not policy.should_flush(0, 0, 0.0, 10.0)
+    assert not policy.should_flush(10, 500, 0.0, 0.5)
+    assert policy.should_flush(100, 500, 0.0, 0.5)
+    assert policy.should_flush(10, 1000, 0.0, 0.5)
+    assert policy.should_flush(1, 10, 0.0, 1.0)
+
+
+def test_target_adapts_to_throughput():
+    policy = FlushPolicy(max_latency=1.0, min_rows=10, max_rows=5000,
+                         smoothing=1.0)
+    policy.record(1000, 0.5)
+    assert policy.rows_per_sec == 2000
+    assert policy.target_rows == 1000
+    policy.record(100, 1.0)
+    assert policy.target_rows == 50
+    policy.record(1, 1.0)
+    assert policy.target_rows == 10
+    policy.record(100000, 1.0)
+    assert policy.target_rows == 5000
+
+    fixed = FlushPolicy(max_latency=1.0, target_rows=300)
+    fixed.record(1000, 0.5)
+    assert fixed.target_rows == 300
+
+
+def test_invalid_latency():
+    with pytest.raises(ValueError):
+        FlushPolicy(max_latency=0)
+
+
+def test_writer_flushes_by_policy():
+    async def run():
+        policy = FlushPolicy(max_latency=0.05, target_rows=3)
+        writer = client.AsyncBinCopyWriter(Event.c, FakePool(),
+                                           policy=policy)
+        writer.add_data(make_rec(1))
+        writer.add_data(make_rec(2))
+        assert not await writer.insert_data()
+        writer.add_data(make_rec(3))
+        assert await writer.insert_data()
+
+        writer.add_data(make_rec(4))
+        assert not await writer.insert_data()
+        await asyncio.sleep(0.05)
+        assert await writer.insert_data()
+        await writer.cleanup()
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.rows_written == 4
+    assert writer.staleness_max >= 0.05
+    assert writer.policy.rows_per_sec > 0
@@ -0,0 +1,140 @@
+"""Test frame-at-a-time tacview parser."""
+import asyncio
+import math
+
+import numpy as np
+import pytest
+
+from dcs.tacview import client
+from dcs.tacview.frame import parse_frame
+from dcs.tacview.store import ObjectStore
+
+FRAME = [
+    b"802,T=6.3596289|5.139203|342.67|||7.3|729234.25|-58312.28|,"
+    b"Type=Ground+Static+Aerodrome,Name=FARP,Color=Blue,"
+    b"Coalition=Enemies,Country=us",
+    b"4001,T=4.6361975|6.5404775|1487.59",
+    b"4002,T=1.5|2.5||0.1|0.2|0.3",
+    b"4003,T=1.5|2.5|10|-100.5|200.25",
+    b"0,Event=Destroyed",
+    b"-4004",
+]
+
+
+@pytest.fixture
+def ref():
+    ref = client.Ref()
+    ref.lat = 1.0
+    ref.lon = 2.0
+    ref.session_id = 1
+    ref.update_time(b"#1.0")
+    return ref
+
+
+def test_parse_frame_columns():
+    """Test that every transform layout lands in the right columns."""
+    frame = parse_frame(FRAME)
+    assert frame.ids.tolist() == [0x802, 0x4001, 0x4002, 0x4003]
+    assert frame.removed == [0x4004]
+
+    assert frame.lon[0] == 6.3596289
+    assert frame.yaw[0] == 7.3
+    assert frame.u[0] == 729234.25
+    assert math.isnan(frame.roll[0])
+    assert not frame.present[0, 8]
+
+    assert frame.alt[1] == 1487.59
+    assert not frame.present[1, 3:].any()
+
+    assert not frame.present[2, 2]
+    assert frame.coords[2, 3:6].tolist() == [0.1, 0.2, 0.3]
+
+    assert frame.u[3] == -100.5
+    assert frame.v[3] == 200.25
+    assert not frame.present[3, 3:6].any()
+
+    assert (0, 'Name', 'FARP') in frame.props
+    assert (0, 'Country', 'us') in frame.props
+
+
+def test_parse_empty_frame():
+    frame = parse_frame([b"0,ReferenceTime=2019-01-01T12:12:01Z"])
+    assert len(frame) == 0
+    assert frame.coords.shape == (0, 9)
+
+
+def test_frame_to_objs_updates_store(ref):
+    """Test that frame parsing updates existing records in place."""
+    lines = [b"802,T=1.0|2.0|300,Type=Ground+Static+Aerodrome,Name=FARP"]
+    recs = asyncio.run(client.frame_to_objs(lines, ref))
+    assert len(recs) == 1
+    assert recs[0].lat == 3.0
+    assert recs[0].lon == 3.0
+    assert recs[0].Name == 'FARP'
+
+    ref.update_time(b"#2.0")
+    recs = asyncio.run(client.frame_to_objs([b"802,T=||400"], ref))
+    rec = ref.obj_store[0x802]
+    assert recs[0].row == rec.row
+    assert rec.lat == 3.0
+    assert rec.alt == 400
+    assert rec.updates == 2
+    assert rec.secs_since_last_seen == 1.0
+    assert rec.velocity_kts > 0
+
+
+def test_frame_repeated_ids_count_updates(ref):
+    """Test that each line of an id counts as an update, as line by line."""
+    lines = [b"4001,T=1.0|2.0|300,Type=Air+FixedWing", b"4001,T=||400",
+             b"4001,T=||500"]
+    asyncio.run(client.frame_to_objs(lines, ref))
+    rec = ref.obj_store[0x4001]
+    assert rec.updates == 3
+    assert rec.alt == 500
+
+    ref.update_time(b"#2.0")
+    asyncio.run(client.frame_to_objs(lines[1:], ref))
+    assert rec.updates == 5
+
+
+def test_vectorized_velocity_matches_scalar():
+    """Test that batch ECEF and velocity match the per-record methods."""
+    rng = np.random.RandomState(0)
+    n_objs = 50
+    lat = rng.uniform(-80, 80, n_objs)
+    lon = rng.uniform(-180, 180, n_objs)
+    alt = rng.uniform(0, 10000, n_objs)
+
+    recs = []
+    store = ObjectStore(client.ObjectView)
+    for i in range(n_objs):
+        rec = client.ObjectRec(i, 0.0, 0.0)
+        rec.lat, rec.lon, rec.alt = lat[i], lon[i], alt[i]
+        rec.compute_velocity(0.0)
+        recs.append(rec)
+        store[i] = rec
+
+    cart = client.get_cartesian_coords(lat, lon, alt)
+    for rec, row in zip(recs, cart):
+        assert np.allclose(rec.cart_coords, row, rtol=1e-12)
+
+    secs = rng.uniform(0.1, 2.0, n_objs)
+    secs[0] = 0.0
+    for i, rec in enumerate(recs):
+        rec.update_last_seen(secs[i])
+        rec.lat += 0.01
+        rec.lon -= 0.01
+        rec.alt += 100
+        rec.compute_velocity(0.0)
+        store[i] = rec
+        store[i].cart_coords = client.get_cartesian_coord(lat[i], lon[i],
+                                                          alt[i])
+        store[i].velocity_kts = 0.0
+
+    rows = np.arange(n_objs)
+    client.compute_velocities(store, rows)
+    assert np.allclose(store.col('velocity_kts'),
+                       [rec.velocity_kts for rec in recs], rtol=1e-9)
+    assert store[0].velocity_kts == 0.0
+    assert np.allclose(store.cart_coords[:n_objs],
+                       [rec.cart_coords for rec in recs], rtol=1e-12)
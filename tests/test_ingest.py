@@ -0,0 +1,155 @@
+"""Test offline ACMI file ingest."""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import gzip
+import sqlite3
+
+import numpy as np
+import pytest
+
+from dcs.tacview import client, ingest
+from dcs.tacview.sinks import SQLiteSink
+
+HEADER = [
+    b"FileType=text/acmi/tacview",
+    b"FileVersion=2.1",
+    b"0,ReferenceTime=2019-01-01T12:12:01Z",
+    b"0,ReferenceLatitude=42",
+    b"0,ReferenceLongitude=41",
+]
+
+
+def make_acmi(n_frames: int = 40) -> bytes:
+    """Build a recording of a few moving objects, a launch and removals."""
+    lines = list(HEADER)
+    for i in range(n_frames):
+        lines.append(f"#{i * 0.5}".encode())
+        lines.append(f"101,T=0|{i * 0.001:.4f}|5000|0|0|90".encode()
+                     + (b",Type=Air+FixedWing,Name=FA-18C,Color=Blue"
+                        if i == 0 else b""))
+        lines.append(f"102,T=0.5|{i * 0.0005:.4f}|3000".encode()
+                     + (b",Type=Air+FixedWing,Name=Su-27,Color=Red"
+                        if i == 0 else b""))
+        if i == 0:
+            lines.append(b"301,T=0.1|0.1|0,Type=Ground+Static,Color=Red")
+        if i == 10:
+            lines.append(b"201,T=0|0.0101|5000,Type=Weapon+Missile,"
+                         b"Name=AIM-120C,Color=Blue")
+        if 10 < i < 20:
+            lines.append(f"201,T=0|{0.01 + (i - 10) * 0.05:.4f}|5000".encode())
+        if i == 20:
+            lines.append(b"-201")
+            lines.append(b"0,Event=Destroyed|201")
+    return b'\n'.join(lines) + b'\n'
+
+
+def apply_all(frames):
+    async def run():
+        ref = client.Ref()
+        ref.lat, ref.lon, ref.session_id = 42.0, 41.0, 1
+        async for marker, frame in frames:
+            ref.update_time(marker)
+            await client.apply_frame(frame, ref)
+        return ref
+    return asyncio.run(run())
+
+
+async def single_chunk(data: bytes):
+    _, start = ingest.split_header(data)
+    for frame in ingest.parse_chunk(data[start:]):
+        yield frame
+
+
+def assert_same_state(ref_a, ref_b):
+    store_a, store_b = ref_a.obj_store, ref_b.obj_store
+    assert store_a.index == store_b.index
+    for name in ['lat', 'lon', 'alt', 'velocity_kts', 'last_seen']:
+        assert np.allclose(store_a.col(name), store_b.col(name),
+                           equal_nan=True), name
+    for name in ['alive', 'updates', 'parent']:
+        assert store_a.col(name).tolist() == store_b.col(name).tolist(), name
+
+
+def test_split_header_and_bounds():
+    data = make_acmi()
+    header, start = ingest.split_header(data)
+    assert header == HEADER
+    assert data[start:start + 3] == b"#0."
+
+    chunks = [data[lo:hi]
+              for lo, hi in ingest.frame_bounds(data, start, 200)]
+    assert len(chunks) > 5
+    assert all(chunk.startswith(b'#') for chunk in chunks)
+    assert b''.join(chunks) == data[start:]
+
+
+@pytest.mark.parametrize('suffix', ['.txt.acmi', '.txt.acmi.gz'])
+def test_sharded_parse_matches_single_pass(tmp_path, suffix):
+    data = make_acmi()
+    path = str(tmp_path / ('test' + suffix))
+    with (gzip.open if suffix.endswith('.gz') else open)(path, 'wb') as fp_:
+        fp_.write(data)
+
+    assert ingest.read_header(path) == HEADER
+    expected = apply_all(single_chunk(data))
+    assert expected.obj_store[0x201].parent == 0x101
+    assert expected.obj_store[0x201].alive == 0
+
+    with ProcessPoolExecutor(2) as executor:
+        sharded = apply_all(ingest.read_frames(path, executor, chunk_size=300,
+                                               ahead=2))
+    assert sharded.time_offset == expected.time_offset == 19.5
+    assert_same_state(expected, sharded)
+
+
+def test_read_ahead_follows_workers(tmp_path):
+    """Test that every worker has a chunk to parse by default."""
+    path = str(tmp_path / 'test.txt.acmi')
+    with open(path, 'wb') as fp_:
+        fp_.write(make_acmi())
+    submitted = []
+
+    class CountingExecutor(ThreadPoolExecutor):
+        def submit(self, *args, **kwargs):
+            submitted.append(len(submitted))
+            return super().submit(*args, **kwargs)
+
+    async def first(executor):
+        async for _ in ingest.read_frames(path, executor, chunk_size=1):
+            return len(submitted)
+
+    with CountingExecutor(3) as executor:
+        assert asyncio.run(first(executor)) == 6
+
+
+def test_files_with_overlapping_ids_ingested_into_one_db(tmp_path):
+    """Test that objects of each file are kept apart, by session."""
+    paths = []
+    for name, title in [('a', b"First"), ('b', b"Second")]:
+        path = str(tmp_path / f"{name}.txt.acmi")
+        with open(path, 'wb') as fp_:
+            fp_.write(make_acmi().replace(
+                HEADER[-1], HEADER[-1] + b"\n0,Title=" + title
+                + b"\n0,RecordingTime=2019-01-01T12:12:01.5Z"))
+        paths.append(path)
+    sink = SQLiteSink(str(tmp_path / 'dcs.db'))
+
+    async def run():
+        with ThreadPoolExecutor(2) as executor:
+            refs = [await ingest.ingest_file(path, executor, sink)
+                    for path in paths]
+        await sink.close()
+        return refs
+    refs = asyncio.run(run())
+    assert [ref.session_id for ref in refs] == [1, 2]
+
+    conn = sqlite3.connect(sink.path)
+    rows = conn.execute("SELECT session_id, id, alive, updates FROM object "
+                        "ORDER BY session_id, id").fetchall()
+    assert [row[:2] for row in rows] == [
+        (session_id, id_) for session_id in [1, 2]
+        for id_ in [0x101, 0x102, 0x201, 0x301]]
+    for session_id in [1, 2]:
+        assert dict((row[1], row[2:]) for row in rows
+                    if row[0] == session_id) == {
+            0x101: (1, 40), 0x102: (1, 40), 0x201: (0, 11), 0x301: (1, 1)}
@@ -0,0 +1,122 @@
+"""Test the live object state served to the coord server."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+import pytest
+
+from dcs.tacview.live import LiveState, LiveStateClient, serve_live_state
+
+FRAME = [
+    b"101,T=0|0.01|5000,Type=Air+FixedWing,Name=FA-18C_hornet,"
+    b"Pilot=someone_somewhere,Color=Blue,Coalition=Enemies",
+    b"102,T=0.5|0|10,Type=Ground+Heavy+Armor+Vehicle,Name=T-72B,"
+    b"Group=Armor-1,Color=Red,Coalition=Allies",
+    b"103,T=0.6|0|10,Type=Ground+Heavy+Armor+Vehicle,Name=BMP-2,"
+    b"Color=Red,Coalition=Allies",
+]
+
+
+@pytest.fixture
+def ref(make_ref):
+    ref = make_ref(FRAME, session_id=3)
+    ref.obj_store[0x103].alive = 0
+    return ref
+
+
+def test_snapshot_of_alive_objects(ref):
+    state = LiveState(lambda: ref)
+    reply = state.respond(b"snapshot None\n")
+    version, body = reply.split(b"\n", 1)
+    assert version.split() == [str(state.version).encode(),
+                               str(len(body)).encode()]
+    snap = json.loads(body)
+    assert snap['session_id'] == 3 and snap['time_offset'] == 1.0
+    objects = {obj['id']: obj for obj in snap['objects']}
+    assert sorted(objects) == [0x101, 0x102]
+    tank = objects[0x102]
+    assert tank['name'] == tank['platform'] == 'T-72B'
+    assert tank['coalition'] == 'Allies' and tank['pilot'] == ''
+    assert tank['lat'] == 42.0 and tank['alive'] == 1
+
+
+def test_snapshot_versions(ref):
+    state = LiveState(lambda: ref)
+    state.snapshot()
+    current = f"snapshot {state.version}\n".encode()
+    assert state.respond(current) == f"{state.version} 0\n".encode()
+    state.frame()
+    assert len(state.respond(current)) > 20
+    state.respond(current)
+    assert state.builds == 2
+
+
+def test_restarted_state_never_reuses_version(ref):
+    old, new = LiveState(lambda: ref), LiveState(lambda: ref)
+    # Frames replayed faster than the clock, then a restart 3 ms later.
+    old.start, old.frames = 1000, 5
+    new.start, new.frames = 1003, 2
+    assert old.version != new.version
+    reply = new.respond(f"snapshot {old.version}\n".encode())
+    assert json.loads(reply.split(b"\n", 1)[1])['version'] == new.version
+
+
+def test_client_shared_between_threads(ref):
+    state = LiveState(lambda: ref)
+
+    async def run():
+        server = await serve_live_state(state, port=0)
+        live = LiveStateClient(port=server.sockets[0].getsockname()[1])
+        loop = asyncio.get_event_loop()
+        with ThreadPoolExecutor(4) as executor:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(executor, live.objects)
+                for _ in range(8)])
+        server.close()
+        await server.wait_closed()
+        return live, results
+
+    live, results = asyncio.run(run())
+    assert all(objects == results[0] for objects in results)
+    assert live.version == state.version and state.builds == 1
+
+
+def test_client_fetches_over_socket(ref):
+    state = LiveState(lambda: ref)
+
+    async def run():
+        server = await serve_live_state(state, port=0)
+        port = server.sockets[0].getsockname()[1]
+        live = LiveStateClient(port=port)
+        loop = asyncio.get_event_loop()
+        first = await loop.run_in_executor(None, live.objects)
+        version = live.version
+        again = await loop.run_in_executor(None, live.objects)
+        status = await loop.run_in_executor(
+            None, live.status, [0x102, 0x103, 0x999])
+        server.close()
+        await server.wait_closed()
+        return first, again, version, status
+
+    first, again, version, status = asyncio.run(run())
+    assert first == again and version == state.version
+    assert state.builds == 1 and state.requests == 3
+    assert status == {0x102: (1, 'T-72B'), 0x103: (0, 'BMP-2')}
+
+
+def test_client_raises_without_server():
+    live = LiveStateClient(port=1, timeout=0.1)
+    with pytest.raises(OSError):
+        live.objects()
+
+
+def test_select_coords_from_live_state(ref):
+    pytest.importorskip('geopy')
+    from dcs.coords import processor
+    objects = LiveState(lambda: ref).snapshot()
+    enemies, start = processor.select_coords(
+        json.loads(objects)['objects'], 'someone_somewhere')
+    assert [obj['id'] for obj in enemies] == [0x102]
+    assert start['pilot'] == 'someone_somewhere' and start['lat'] == 42.01
+    with pytest.raises(ValueError):
+        processor.select_coords([], 'nobody')
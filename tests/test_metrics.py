@@ -0,0 +1,79 @@
+"""Test consumer metrics, histograms and their endpoint."""
+import asyncio
+import json
+
+import pytest
+
+from dcs.tacview.metrics import Histogram, Metrics, render, serve_metrics
+
+
+def test_histogram_percentiles_within_precision():
+    hist = Histogram(sub_buckets=16)
+    values = [0.001 * (i + 1) for i in range(1000)]
+    for val in values:
+        hist.record(val)
+    assert hist.count == 1000
+    assert hist.max == pytest.approx(1.0)
+    assert hist.mean == pytest.approx(sum(values) / 1000)
+    for pct in [50, 90, 99]:
+        exact = values[int(1000 * pct / 100) - 1]
+        assert exact <= hist.percentile(pct) <= exact * (1 + 1 / 16)
+    assert hist.percentile(100) == pytest.approx(1.0)
+
+
+def test_histogram_out_of_range():
+    hist = Histogram(lowest=1e-3, highest=1.0)
+    hist.record(1e-9)
+    hist.record(50.0)
+    assert hist.counts[0] == 1 and hist.counts[-1] == 1
+    assert hist.percentile(100) == 50.0
+    assert Histogram().percentile(50) == 0.0
+
+
+def test_render_prometheus_text():
+    metrics = Metrics({'server': 'GAW'})
+    metrics.inc('frames', 2)
+    metrics.gauge('lines', lambda: 10)
+    metrics.observe('parse_seconds', 0.5)
+    text = render([metrics])
+    assert '# TYPE tacview_frames counter' in text
+    assert 'tacview_frames{server="GAW"} 2' in text
+    assert 'tacview_lines{server="GAW"} 10' in text
+    assert '# TYPE tacview_parse_seconds histogram' in text
+    assert 'tacview_parse_seconds_bucket{server="GAW",le="+Inf"} 1' in text
+    assert 'tacview_parse_seconds_count{server="GAW"} 1' in text
+    buckets = [line for line in text.splitlines()
+               if line.startswith('tacview_parse_seconds_bucket')]
+    counts = [int(line.split()[-1]) for line in buckets]
+    assert counts == sorted(counts)
+
+
+def test_dump_json(tmp_path):
+    metrics = Metrics()
+    metrics.observe('flush_seconds', 0.25)
+    path = str(tmp_path / 'metrics.json')
+    metrics.dump(path)
+    with open(path) as fp_:
+        data = json.load(fp_)
+    assert data['histograms']['flush_seconds']['count'] == 1
+    assert data['histograms']['flush_seconds']['max'] == 0.25
+
+
+def test_serve_metrics():
+    metrics = Metrics()
+    metrics.inc('frames')
+
+    async def run():
+        server = await serve_metrics([metrics], port=0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /metrics HTTP/1.0\r\n\r\n')
+        resp = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return resp
+
+    resp = asyncio.run(run())
+    assert resp.startswith(b'HTTP/1.0 200 OK')
+    assert b'tacview_frames 1' in resp
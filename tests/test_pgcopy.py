@@ -0,0 +1,108 @@
+"""Test binary COPY packing."""
+import struct
+
+import numpy as np
+
+from dcs.common.db import Event
+from dcs.tacview import client
+from dcs.tacview.pgcopy import COPY_HEADER, COPY_TRAILER, CopyBuffer
+
+VALUES = (0x4001, 1, 2.5, 1, 1.25, 2.25, 1000.0, 0.1, 0.2, 0.3, -100.5,
+          200.25, 90.0, 350.0, 3)
+
+
+def read_rows(data: bytes):
+    """Decode rows of Postgres binary COPY data, with None for NULLs."""
+    assert data[:len(COPY_HEADER)] == COPY_HEADER
+    assert data[-len(COPY_TRAILER):] == COPY_TRAILER
+    pos, rows = len(COPY_HEADER), []
+    while pos < len(data) - len(COPY_TRAILER):
+        ncol, = struct.unpack_from('>h', data, pos)
+        pos += 2
+        row = []
+        for _ in range(ncol):
+            size, = struct.unpack_from('>i', data, pos)
+            pos += 4
+            if size == -1:
+                row.append(None)
+                continue
+            row.append(struct.unpack_from('>i' if size == 4 else '>d',
+                                          data, pos)[0])
+            pos += size
+        rows.append(tuple(row))
+    return rows
+
+
+def test_pack_matches_struct_pack():
+    buf = CopyBuffer(Event.c)
+    buf.pack(VALUES)
+    fields = []
+    for size, val in zip(buf.sizes, VALUES):
+        fields.extend([size, val])
+    expected = struct.pack(buf.fmt_str, 15, *fields)
+    assert bytes(buf.view()) == COPY_HEADER + expected
+    assert buf.rows == 1
+
+
+def test_pack_nulls_and_growth():
+    buf = CopyBuffer(Event.c, capacity=32)
+    row = list(VALUES)
+    row[10] = row[11] = None
+    for _ in range(100):
+        buf.pack(row)
+        buf.pack(VALUES)
+    buf.finish()
+    assert len(buf.buf) >= len(buf)
+    rows = read_rows(buf.read())
+    assert rows == [tuple(row), VALUES] * 100
+    assert buf.read() == b''
+
+    buf.reset()
+    assert bytes(buf.view()) == COPY_HEADER
+    assert buf.rows == 0
+
+
+def test_pack_columns_matches_rows():
+    buf = CopyBuffer(Event.c)
+    n_rows = 50
+    values = []
+    for idx, val in enumerate(VALUES):
+        dtype = np.float64 if buf.fmts[idx] == 'd' else np.int64
+        values.append(np.full(n_rows, val, dtype=dtype) + np.arange(n_rows))
+    values[10][::3] = np.nan
+    values[11][::3] = np.nan
+    session_null = np.zeros(n_rows, dtype=bool)
+    session_null[::5] = True
+    nulls = [None] * len(values)
+    nulls[1] = session_null
+
+    assert buf.pack_columns(values, nulls) == n_rows
+    buf.finish()
+    expected = []
+    for i in range(n_rows):
+        row = [col[i].item() for col in values]
+        row = [None if val != val else val for val in row]
+        if session_null[i]:
+            row[1] = None
+        expected.append(tuple(row))
+    assert sorted(read_rows(buf.read()), key=lambda row: row[0]) == expected
+
+
+def test_writer_packs_frame_from_store():
+    store = client.ObjectStore(client.ObjectView)
+    for i in range(4):
+        rec = store.create(i, 1.0, 2.0, 1)
+        rec.lat, rec.lon = 1.0 + i, 2.0 + i
+    store[2].u_coord = 5.0
+
+    frame = client.BinCopyWriter(Event.c, None)
+    frame.add_rows(store, np.array([0, 2, 3]))
+    scalar = client.BinCopyWriter(Event.c, None)
+    for i in [0, 2, 3]:
+        scalar.add_data(store[i])
+    assert frame.insert_count == scalar.insert_count == 3
+
+    frame.insert.finish()
+    scalar.insert.finish()
+    assert (sorted(read_rows(frame.insert.read()))
+            == sorted(read_rows(scalar.insert.read())))
@@ -0,0 +1,76 @@
+"""Test the paced, multi-client replay server."""
+import asyncio
+import time
+
+from dcs.tacview.synthetic import SyntheticACMI
+from tests import serve_test_data
+
+
+def write_recording(tmp_path, seconds=2.0):
+    path = tmp_path / 'test.txt.acmi'
+    data = SyntheticACMI(seed=4, aircraft=3, ground=2, fps=10.0).to_bytes(
+        seconds)
+    path.write_bytes(data)
+    return str(path), data
+
+
+async def replay(header, frames, speed=0.0, clients=1):
+    server = serve_test_data.ReplayServer(header, frames, speed)
+    listener = await asyncio.start_server(server.handle_req, '127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+
+    async def receive():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b"handshake\n")
+        data = await reader.read()
+        writer.close()
+        return data
+
+    results = await asyncio.gather(*[receive() for _ in range(clients)])
+    listener.close()
+    await listener.wait_closed()
+    return server, results
+
+
+def test_split_frames(tmp_path):
+    path, data = write_recording(tmp_path)
+    header, frames = serve_test_data.load(path)
+    assert header.startswith(b"FileType=") and b"#" not in header
+    assert len(frames) == 20
+    assert frames[0][0] == 0.0 and frames[-1][0] == 1.9
+    assert header + b"".join(bytes(frame) for _, frame in frames) == data
+
+
+def test_serves_many_clients_one_copy(tmp_path):
+    path, data = write_recording(tmp_path)
+    header, frames = serve_test_data.load(path)
+    server, results = asyncio.run(replay(header, frames, clients=5))
+    assert results == [data] * 5
+    assert server.served == 5 and server.clients == 0
+    assert server.bytes_sent == 5 * (len(data) - len(header))
+
+
+def test_paced_by_time_markers(tmp_path):
+    path, data = write_recording(tmp_path)
+    header, frames = serve_test_data.load(path)
+    start = time.perf_counter()
+    _, results = asyncio.run(replay(header, frames, speed=10.0))
+    assert time.perf_counter() - start >= 1.9 / 10.0
+    assert results == [data]
+
+
+def test_synthesizes_to_target_lps(tmp_path):
+    path, data = write_recording(tmp_path)
+    header, frames = serve_test_data.load(path, target_lps=1000.0)
+    payload = b"".join(frame for _, frame in frames)
+    assert payload.count(b"\n") / 1.9 >= 1000.0
+    assert f"{serve_test_data.SYNTHETIC_FIRST_ID:x},".encode() in payload
+    markers = [line for line in payload.split(b"\n") if line[:1] == b"#"]
+    assert len(markers) == 20
+    _, plain = serve_test_data.load(path, target_lps=10.0)
+    assert b"".join(bytes(frame) for _, frame in plain) == data[len(header):]
+
+
+def test_no_synthesis_without_duration():
+    frames = [(1.0, b"#1.0\n101,T=0|0|10\n"), (1.0, b"#1.0\n")]
+    assert serve_test_data.add_synthetic(frames, 1000.0) == frames
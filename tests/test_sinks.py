@@ -0,0 +1,189 @@
+"""Test consumer sinks."""
+import asyncio
+import sqlite3
+
+import numpy as np
+import pytest
+
+from dcs.tacview import client
+from dcs.tacview.export import read_session
+from dcs.tacview.sinks import (NullSink, SinkWriter, SQLiteSink, latest_rows,
+                               open_sink)
+from dcs.tacview.synthetic import SyntheticACMI
+from tests import conftest
+
+HEADER = [*conftest.HEADER, b"0,Title=Sinks"]
+
+
+def test_latest_rows():
+    columns = {'id': np.array([2, 1, 2, 1, 3, 3, 1]),
+               'session_id': np.array([1, 1, 1, 1, 1, 1, 2]),
+               'updates': np.array([1, 1, 2, 3, 1, 1, 1]),
+               'last_seen': np.array([1.0, 1.0, 2.0, 3.0, 2.0, 1.0, 1.0])}
+    assert sorted(latest_rows(columns).tolist()) == [2, 3, 4, 6]
+
+
+def test_sqlite_round_trip(tmp_path, make_ref):
+    path = str(tmp_path / 'dcs.db')
+    sink = SQLiteSink(path)
+    ref = make_ref(sink=sink, header=HEADER)
+    assert ref.session_id == 1
+    pending = ref.pending
+    writer = sink.writer()
+
+    async def run():
+        store = ref.obj_store
+        await pending.flush_objects(sink)
+        writer.add_rows(store, np.arange(len(store), dtype=np.int64))
+        ref.update_time(b"#2.0")
+        await client.frame_to_objs([b"101,T=0.1|0.01|5100"], ref)
+        writer.add_rows(store, store.lookup(np.array([0x101])))
+        pending.dead.append((1, 0x102))
+        await writer.insert_data(pending)
+        await sink.write_parents([(0x101, 12.5, 1, 0x102)])
+        await sink.close()
+    asyncio.run(run())
+    assert writer.rows_written == 3 and not pending.dead
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT title FROM session").fetchall() == [
+        ('Sinks',)]
+    assert conn.execute("SELECT COUNT(*) FROM event").fetchone() == (3,)
+    rows = dict((row[0], row[1:]) for row in conn.execute(
+        "SELECT id, alive, updates, alt, name, parent, parent_dist "
+        "FROM object"))
+    assert rows[0x101] == (1, 2, 5100.0, 'FA-18C', None, None)
+    assert rows[0x102][0] == 0
+    assert rows[0x102][4:] == (0x101, 12.5)
+
+
+def test_flushes_committed_out_of_order(tmp_path, make_ref):
+    """Test that an alive row committed after its removal is ignored."""
+    sink = SQLiteSink(str(tmp_path / 'dcs.db'))
+    ref = make_ref(sink=sink, header=HEADER)
+    store, pending = ref.obj_store, ref.pending
+    older, newer = sink.writer(), sink.writer()
+
+    async def run():
+        await pending.flush_objects(sink)
+        ref.update_time(b"#2.0")
+        await client.frame_to_objs([b"101,T=0.1|0.01|5100"], ref)
+        older.add_rows(store, store.lookup(np.array([0x101])))
+        recs = await client.frame_to_objs([b"-101"], ref)
+        newer.add_rows(store, np.array([recs[0].row]))
+        await newer.insert_data(pending)
+        await older.insert_data()
+        await sink.close()
+    asyncio.run(run())
+
+    conn = sqlite3.connect(sink.path)
+    assert conn.execute("SELECT alive, updates FROM object WHERE id = ?",
+                        (0x101,)).fetchone() == (0, 3)
+
+
+def test_sink_writer_min_insert_size(make_ref):
+    writer = SinkWriter(NullSink(), min_insert_size=10)
+    ref = make_ref(sink=NullSink())
+    store = ref.obj_store
+    writer.add_rows(store, np.arange(len(store), dtype=np.int64))
+    assert not asyncio.run(writer.insert_data())
+    asyncio.run(writer.cleanup())
+    assert writer.rows_written == 2 and writer.insert_count == 0
+
+
+class FlakySink(NullSink):
+    """Sink failing the first write of events, deaths and impacts."""
+    def __init__(self):
+        super().__init__()
+        self.failed = set()
+        self.written = {}
+
+    def write(self, kind, batch):
+        if kind not in self.failed:
+            self.failed.add(kind)
+            raise RuntimeError(f"{kind} write failed")
+        self.written[kind] = batch
+
+    async def write_events(self, columns):
+        self.write('events', columns['id'].tolist())
+
+    async def mark_dead(self, ids):
+        self.write('dead', ids)
+
+    async def write_impacts(self, records):
+        self.write('impacts', records)
+
+
+def test_sink_writer_failed_write_kept(make_ref):
+    """Test that rows of a failed write are written by the next flush."""
+    sink = FlakySink()
+    writer = SinkWriter(sink)
+    ref = make_ref(sink=NullSink())
+    store, pending = ref.obj_store, ref.pending
+
+    async def run():
+        writer.add_rows(store, np.arange(len(store), dtype=np.int64))
+        pending.dead.append((1, 0x102))
+        pending.impacts.append((1, None, 0x101, 0x102, 1.0, 0.0))
+        flushed = []
+        for _ in range(4):
+            flushed.append(await writer.insert_data(pending))
+        return flushed
+    assert asyncio.run(run()) == [False, False, False, True]
+    assert writer.failures == 3 and writer.insert_count == 0
+    assert sink.written == {'events': [0x101, 0x102], 'dead': [(1, 0x102)],
+                            'impacts': [(1, None, 0x101, 0x102, 1.0, 0.0)]}
+    assert not pending.dead and not pending.impacts
+
+
+def test_open_sink(tmp_path):
+    assert isinstance(open_sink('null'), NullSink)
+    sink = open_sink(f"sqlite:{tmp_path / 'dcs.db'}")
+    assert isinstance(sink, SQLiteSink)
+    asyncio.run(sink.close())
+    with pytest.raises(ValueError):
+        open_sink('mysql')
+
+
+def test_parquet_sink(tmp_path, make_ref):
+    pq = pytest.importorskip('pyarrow.parquet')
+    sink = open_sink(f"parquet:{tmp_path}")
+    ref = make_ref(sink=sink, header=HEADER)
+    writer = sink.writer()
+
+    async def run():
+        store = ref.obj_store
+        await ref.pending.flush_objects(sink)
+        writer.add_rows(store, np.arange(len(store), dtype=np.int64))
+        await writer.cleanup()
+        await sink.close()
+    asyncio.run(run())
+    assert len(read_session(str(tmp_path / 'event'), ref.session_id)) == 2
+    assert pq.read_table(str(tmp_path / 'object.parquet')).num_rows == 2
+
+
+def test_consumer_sqlite_sink(tmp_path):
+    path = str(tmp_path / 'dcs.db')
+    payload = SyntheticACMI(seed=3, aircraft=5, ground=5).to_bytes(5.0)
+
+    async def run():
+        async def handle(reader, writer):
+            await reader.readline()
+            writer.write(payload)
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        await client.consumer('127.0.0.1', port, frame_mode=True,
+                              sink=f"sqlite:{path}")
+        server.close()
+        await server.wait_closed()
+    asyncio.run(run())
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM session").fetchone() == (1,)
+    n_objects = conn.execute("SELECT COUNT(*) FROM object").fetchone()[0]
+    assert n_objects >= 10
+    assert conn.execute("SELECT COUNT(*) FROM event").fetchone()[0] > (
+        n_objects)
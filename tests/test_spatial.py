@@ -0,0 +1,110 @@
+"""Test in-memory parent and impact attribution."""
+import asyncio
+
+import numpy as np
+import pytest
+
+from dcs.tacview import client
+from dcs.tacview.spatial import AIR, PARENT, type_flags
+
+
+def add_obj(ref, id_, type_, color, lat, lon, alt, name=None):
+    rec = ref.obj_store.create(id_, first_seen=1.0, last_seen=1.0,
+                               session_id=1)
+    rec.Type = type_
+    rec.Color = color
+    rec.Name = name or type_
+    rec.lat, rec.lon, rec.alt = lat, lon, alt
+    rec.compute_velocity(0.0)
+    return rec
+
+
+@pytest.fixture
+def ref():
+    ref = client.Ref()
+    ref.update_time(b"#1.0")
+    add_obj(ref, 1, 'Air+FixedWing', 'Blue', 42.0, 41.0, 5000, 'FA-18C')
+    add_obj(ref, 2, 'Air+FixedWing', 'Blue', 42.003, 41.0, 5000, 'F-16C')
+    add_obj(ref, 3, 'Air+FixedWing', 'Red', 42.0, 41.001, 5000, 'Su-27')
+    add_obj(ref, 4, 'Weapon+Missile', 'Blue', 42.0, 41.0, 5000)
+    add_obj(ref, 5, 'Air+FixedWing', 'Blue', 43.0, 41.0, 5000, 'F-14B')
+    return ref
+
+
+def test_type_flags():
+    assert type_flags('Air+FixedWing') == PARENT | AIR
+    assert type_flags('Weapon+Missile') == 0
+    assert type_flags('Ground+Light+Human+Air+Parachutist') & PARENT == 0
+
+
+def test_parent_is_closest_same_color(ref):
+    weapon = add_obj(ref, 6, 'Weapon+Missile', 'Blue', 42.0001, 41.0, 5000)
+    closest = client.determine_contact(weapon, ref, type='parent')
+    assert closest[0] == 1
+    assert closest[2] == 'FA-18C'
+    assert closest[1] == pytest.approx(
+        client.compute_dist(weapon.cart_coords, ref.obj_store[1].cart_coords))
+
+
+def test_violet_matches_any_color(ref):
+    weapon = add_obj(ref, 6, 'Weapon+Missile', 'Violet', 42.0, 41.0009, 5000)
+    assert client.determine_contact(weapon, ref, type='parent')[0] == 3
+
+
+def test_impacted_target(ref):
+    weapon = add_obj(ref, 6, 'Weapon+Missile', 'Blue', 42.0, 41.0012, 5010)
+    ref.update_time(b"#2.0")
+    assert client.determine_contact(weapon, ref, type='impacted')[0] == 3
+
+
+def test_no_contact_out_of_range(ref):
+    weapon = add_obj(ref, 6, 'Weapon+Missile', 'Blue', 44.0, 41.0, 5000)
+    assert client.determine_contact(weapon, ref, type='parent') is None
+
+
+def test_index_matches_brute_force(ref):
+    """Test that the grid returns every candidate within the cell size."""
+    rng = np.random.RandomState(1)
+    for i in range(200):
+        add_obj(ref, 100 + i, 'Air+FixedWing', 'Blue',
+                42.0 + rng.uniform(-0.05, 0.05),
+                41.0 + rng.uniform(-0.05, 0.05),
+                rng.uniform(0, 10000))
+    ref.spatial.stale = True
+    point = ref.obj_store[1].cart_coords
+    rows = set(ref.spatial.candidates(PARENT, ['Blue'], point).tolist())
+    cart = ref.obj_store.cart_coords[:ref.obj_store.size]
+    dist = np.sqrt(np.square(cart - np.asarray(point)).sum(axis=1))
+    colors = ref.obj_store.col('Color')
+    blue = ref.obj_store.strings.codes['Blue']
+    near = np.flatnonzero((dist <= ref.spatial.cell_size) & (colors == blue))
+    expected = {row for row in near.tolist()
+                if ref.obj_store.view(row).Type == 'Air+FixedWing'}
+    assert expected <= rows
+
+
+def test_cartesian_coord_is_ecef():
+    assert client.get_cartesian_coord(0.0, 0.0, 0.0) == pytest.approx(
+        (6378137.0, 0.0, 0.0))
+    assert client.get_cartesian_coord(90.0, 0.0, 0.0)[2] == pytest.approx(
+        6356752.314, abs=1e-3)
+
+
+@pytest.mark.parametrize('frame_mode', [False, True])
+def test_parent_new_to_the_same_frame(ref, frame_mode):
+    """Test that a weapon finds a launcher appearing earlier in its frame,
+    after the index was built for that frame.
+    """
+    ref.update_time(b"#2.0")
+    ref.lat, ref.lon, ref.session_id = 42.0, 41.0, 1
+    assert client.determine_contact(ref.obj_store[4], ref, 'parent')
+    rebuilds = ref.spatial.rebuilds
+    lines = [b"11,T=0.5|0.5|3000,Type=Air+FixedWing,Name=Su-33,Color=Red,",
+             b"12,T=0.5|0.5001|3000,Type=Weapon+Missile,Color=Red,"]
+    if frame_mode:
+        asyncio.run(client.frame_to_objs(lines, ref))
+    else:
+        for line in lines:
+            asyncio.run(client.line_to_obj(bytearray(line), ref))
+    assert ref.obj_store[0x12].parent == 0x11
+    assert ref.spatial.rebuilds == rebuilds
@@ -0,0 +1,123 @@
+"""Test columnar object store."""
+import asyncio
+import tracemalloc
+
+import pytest
+
+from dcs.tacview import client
+from dcs.tacview.store import ObjectStore
+
+
+@pytest.fixture
+def store():
+    return ObjectStore(client.ObjectView, capacity=2)
+
+
+def test_create_matches_object_rec_defaults(store):
+    view = store.create(10, first_seen=1.5, last_seen=1.5, session_id=3)
+    rec = client.ObjectRec(id_=10, first_seen=1.5, last_seen=1.5,
+                           session_id=3)
+    for name in client.ObjectRec.__slots__:
+        assert getattr(view, name) == getattr(rec, name), name
+
+
+def test_view_round_trip(store):
+    view = store.create(10)
+    view.Name = 'FARP'
+    view.Type = 'Ground+Static+Aerodrome'
+    view.lat = 1.25
+    view.parent = 42
+    view.cart_coords = (1.0, 2.0, 3.0)
+    view.written = True
+
+    view = store[10]
+    assert view.Name == 'FARP'
+    assert view.lat == 1.25
+    assert view.parent == 42
+    assert view.cart_coords == (1.0, 2.0, 3.0)
+    assert view.written is True
+
+    view.lat = None
+    view.parent = None
+    assert view.lat is None
+    assert view.parent is None
+
+
+def test_growth_and_interning(store):
+    for i in range(100):
+        view = store.create(i)
+        view.Color = 'Red' if i % 2 else 'Blue'
+        view.alt = float(i)
+    assert store.capacity >= 100
+    assert len(store) == 100
+    assert len(store.strings) == 2
+    assert [store[i].alt for i in range(100)] == list(map(float, range(100)))
+    assert store.lookup(store.col('id')[[5, 7]]).tolist() == [5, 7]
+
+
+def test_set_from_object_rec(store):
+    rec = client.ObjectRec(id_=4, first_seen=1.0, last_seen=2.0)
+    rec.Pilot = 'someone_somewhere'
+    rec.u_coord = 5.5
+    store[4] = rec
+    assert 4 in store
+    assert store[4].Pilot == 'someone_somewhere'
+    assert store[4].u_coord == 5.5
+    assert store.get(5) is None
+    with pytest.raises(KeyError):
+        store[5]
+
+
+def test_line_to_obj_uses_store():
+    ref = client.Ref()
+    ref.lat = 1.0
+    ref.lon = 1.0
+    new_string = bytearray(
+        b"4001,T=4.6361975|6.5404775|1487.59|||357.8|-347259.72|380887.44|,"
+        b"Type=Ground+Heavy+Armor+Vehicle+Tank,Name=BTR-80,"
+        b"Group=New Vehicle Group #041,Color=Red,Coalition=Enemies,Country=ru")
+    rec = asyncio.run(client.line_to_obj(new_string, ref))
+    assert isinstance(rec, client.ObjectRec)
+    assert ref.obj_store[0x4001].Name == 'BTR-80'
+    assert ref.obj_store[0x4001].grp == 'New Vehicle Group #041'
+
+
+def test_store_smaller_than_object_recs():
+    """Test that the store uses far less memory than a dict of ObjectRecs."""
+    def fill(create, keep):
+        for i in range(5000):
+            rec = create(i)
+            rec.lat, rec.lon, rec.alt = i + 0.1, i + 0.2, i + 0.3
+            rec.roll, rec.pitch, rec.yaw = i + 0.4, i + 0.5, i + 0.6
+            rec.velocity_kts = i + 0.7
+            rec.secs_since_last_seen = i + 0.8
+            rec.cart_coords = (i + 0.1, i + 0.2, i + 0.3)
+            # Strings are decoded per line by the parser, as here.
+            rec.Type = b'Misc+Shrapnel'.decode('UTF-8')
+            rec.Name = b'Shrapnel'.decode('UTF-8')
+            rec.Color = b'Red'.decode('UTF-8')
+            rec.Coalition = b'Enemies'.decode('UTF-8')
+            rec.Country = b'ru'.decode('UTF-8')
+            keep(i, rec)
+
+    def measure(func):
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        obj = func()
+        used = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        return obj, used
+
+    def fill_dict():
+        obj_store = {}
+        fill(client.ObjectRec, obj_store.__setitem__)
+        return obj_store
+
+    def fill_store():
+        obj_store = ObjectStore(client.ObjectView, capacity=5000)
+        fill(obj_store.create, lambda i, rec: None)
+        return obj_store
+
+    _, dict_bytes = measure(fill_dict)
+    _, store_bytes = measure(fill_store)
+    assert store_bytes * 3 < dict_bytes
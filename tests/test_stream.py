@@ -0,0 +1,52 @@
+"""Test chunked tacview stream reader."""
+import asyncio
+import re
+
+import pytest
+
+from dcs.tacview.stream import ChunkedStreamReader, split_lines
+
+DATA = (b"#1.0\n"
+        b"802,T=6.3596289|5.139203|342.67,Name=FARP\n"
+        b"0,Comments=first\\\nsecond\\\nthird\n"
+        b"-802\n"
+        b"#2.0\n")
+
+
+def read_all(data: bytes, chunk_size: int):
+    """Feed data to a StreamReader and read every line back."""
+    async def run():
+        stream = asyncio.StreamReader()
+        stream.feed_data(data)
+        stream.feed_eof()
+        reader = ChunkedStreamReader(stream, chunk_size)
+        out = []
+        try:
+            while True:
+                out.append(await reader.readline())
+        except asyncio.IncompleteReadError:
+            return out
+    return asyncio.run(run())
+
+
+def test_split_lines_continuation():
+    assert split_lines(b"a\nb\\\nc\nd") == [b"a", b"b\\\nc", b"d"]
+    assert split_lines(b"a\nb\n") == [b"a", b"b", b""]
+    assert split_lines(b"a\\\nb\\\n") == [b"a\\\nb\\\n"]
+    assert split_lines(DATA) == re.split(rb'(?<!\\)\n', DATA)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 16, 1024])
+def test_lines_split_across_chunks(chunk_size):
+    """Test that lines are identical regardless of chunk boundaries."""
+    lines = read_all(DATA, chunk_size)
+    assert lines == [b"#1.0",
+                     b"802,T=6.3596289|5.139203|342.67,Name=FARP",
+                     b"0,Comments=first\\\nsecond\\\nthird",
+                     b"-802",
+                     b"#2.0"]
+
+
+def test_unterminated_last_line():
+    lines = read_all(DATA + b"-4001", 1024)
+    assert b"\n".join(lines) == DATA + b"-4001"
@@ -0,0 +1,67 @@
+"""Test multi-server supervisor."""
+import asyncio
+
+from dcs.common import config
+from dcs.tacview import supervisor
+from dcs.tacview.metrics import ConsumerStats
+
+
+def test_parse_server():
+    host, port = config.presets['GAW'].split(':')
+    assert supervisor.parse_server('GAW') == ('GAW', host, int(port))
+    assert supervisor.parse_server('127.0.0.1:5555') == (
+        '127.0.0.1:5555', '127.0.0.1', 5555)
+    assert supervisor.parse_server('local=127.0.0.1:5555') == (
+        'local', '127.0.0.1', 5555)
+
+
+def test_stats_lag_and_throughput():
+    stats = ConsumerStats('local')
+    assert stats.lag == 0.0
+    stats.frame(100.0, 10, 5)
+    stats.first_frame -= 10.0
+    stats.frame(104.0, 50, 25)
+    # Ten seconds passed, but only four seconds of stream were consumed.
+    assert 5.9 < stats.lag < 6.1
+    assert stats.frames == 2
+    assert stats.lines_per_sec > 0
+    assert 'local' in stats.summary()
+
+
+def test_stats_logged(caplog):
+    stats = ConsumerStats('local')
+    stats.frame(100.0, 10, 5)
+    assert supervisor.LOG.handlers
+
+    async def run():
+        task = asyncio.ensure_future(supervisor.log_stats([stats], 0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+    asyncio.run(run())
+    assert any('local' in rec.getMessage() for rec in caplog.records
+               if rec.name == supervisor.LOG.name)
+
+
+def test_servers_share_pool_and_restart(monkeypatch):
+    calls = []
+
+    async def fake_consumer(host, port, pool=None, stats=None, **kwargs):
+        calls.append((host, port, pool, stats.name))
+        if stats.restarts == 0 and host == 'a':
+            raise ConnectionError("Lost server!")
+
+    monkeypatch.setattr(supervisor.client, 'consumer', fake_consumer)
+    pool = object()
+    servers = [('A', 'a', 1), ('B', 'b', 2)]
+    stats = [ConsumerStats(name) for name, _, _ in servers]
+
+    async def run():
+        await asyncio.gather(*[
+            supervisor.run_server(server, pool, stat, restart_delay=0,
+                                  max_iters=10)
+            for server, stat in zip(servers, stats)])
+    asyncio.run(run())
+
+    assert calls == [('a', 1, pool, 'A'), ('b', 2, pool, 'B'),
+                     ('a', 1, pool, 'A')]
+    assert [stat.restarts for stat in stats] == [1, 0]
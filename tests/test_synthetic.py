@@ -0,0 +1,46 @@
+"""Test the seeded synthetic ACMI generator."""
+import asyncio
+
+from dcs.tacview import client, ingest
+from dcs.tacview.synthetic import SyntheticACMI
+
+
+def test_same_seed_same_bytes():
+    assert SyntheticACMI(seed=3).to_bytes(5) == SyntheticACMI(seed=3).to_bytes(5)
+    assert SyntheticACMI(seed=3).to_bytes(5) != SyntheticACMI(seed=4).to_bytes(5)
+
+
+def test_counts_and_rates():
+    gen = SyntheticACMI(aircraft=10, ground=20, weapon_rate=2.0,
+                        death_rate=0.05, fps=10.0, weapon_secs=4.0)
+    frames = list(gen.frames(30))
+    assert len(frames) == 300
+    assert frames[0][0] == b"#0.00" and frames[10][0] == b"#1.00"
+    kinds = [obj['kind'] for obj in gen.objects.values()]
+    assert kinds.count('aircraft') == 10
+    assert kinds.count('ground') == 20
+    launched = sum(line.count(b'Weapon+Missile')
+                   for frame in frames for line in frame)
+    assert 30 < launched < 90
+    removed = sum(line[0:1] == b'-' for frame in frames for line in frame)
+    assert removed > launched
+
+
+def test_parses_with_parents():
+    data = SyntheticACMI(aircraft=5, ground=5, weapon_rate=1.0).to_bytes(10)
+    header, start = ingest.split_header(data)
+    ref = client.Ref()
+    for line in header:
+        asyncio.run(ref.parse_ref_obj(line, write=False))
+    assert ref.all_refs
+
+    async def run():
+        for marker, frame in ingest.parse_chunk(data[start:]):
+            ref.update_time(marker)
+            await client.apply_frame(frame, ref)
+    asyncio.run(run())
+
+    weapons = [rec for rec in ref.obj_store.values()
+               if 'Weapon' in rec.Type]
+    assert weapons
+    assert all(rec.parent for rec in weapons)